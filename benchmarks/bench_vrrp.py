@@ -0,0 +1,545 @@
+#! /usr/bin/python3
+
+# Copyright (c) 2021 AT&T Intellectual Property.
+# All rights reserved.
+# SPDX-License-Identifier: GPL-2.0-only
+
+"""
+Benchmarks for the parts of the VRRP VCI component whose cost grows with
+the number of VRRP groups configured: building the keepalived config from
+the YANG config, writing it, parsing it back into YANG, parsing the
+keepalived data and stats dumps and rendering show vrrp detail.
+
+Synthetic configs are generated for each size, spread across dataplane,
+bonding, dataplane vif and switch vif interfaces with a share of the
+groups in sync groups, tracking interfaces and using RFC compatibility.
+DBus and VCI are replaced with stand ins so nothing outside the process is
+touched.
+
+Each stage is timed on its own and then run again under tracemalloc to get
+its peak memory, the results are written one JSON object per line so runs
+from different versions can be compared:
+
+    PYTHONPATH=. python3 benchmarks/bench_vrrp.py --sizes 10,1000 \\
+        --output before.jsonl
+    PYTHONPATH=. python3 benchmarks/bench_vrrp.py --sizes 10,1000 \\
+        --baseline before.jsonl
+"""
+
+import argparse
+import copy
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Tuple
+
+DEFAULT_SIZES: str = "10,1000,10000,50000"
+# Groups configured on each interface, well under the 255 VRIDs allowed
+GROUPS_PER_INTF: int = 10
+# Every Nth group has the named feature
+SYNC_GROUP_EVERY: int = 4
+TRACK_EVERY: int = 3
+RFC_EVERY: int = 5
+VERSION_3_EVERY: int = 2
+INTF_KINDS: Tuple[str, ...] = ("dataplane", "bonding", "vif", "switch")
+
+
+def install_fake_dbus() -> None:
+    """
+    Put stand ins for pydbus and vci in sys.modules so the vyatta modules
+    can be imported and KeepalivedConfig.update can create its
+    VrrpConnection objects without a system bus.
+    """
+
+    class FakeProxy:
+
+        def __getattr__(self, name: str) -> Callable[..., None]:
+            return lambda *args, **kwargs: None
+
+        def __getitem__(self, name: str) -> "FakeProxy":
+            return self
+
+    class FakeBus(FakeProxy):
+
+        def get(self, *args, **kwargs) -> FakeProxy:
+            return FakeProxy()
+
+    pydbus: types.ModuleType = types.ModuleType("pydbus")
+    pydbus.SystemBus = FakeBus
+    pydbus.Bus = FakeBus
+    pydbus.ProxyObject = FakeProxy
+    pydbus.interface = FakeProxy
+    vci: types.ModuleType = types.ModuleType("vci")
+    vci.Client = FakeProxy
+    vci.Config = object
+    vci.State = object
+    vci.Component = FakeProxy
+    vci.Exception = Exception
+    sys.modules["pydbus"] = pydbus
+    sys.modules["vci"] = vci
+
+
+class Group(NamedTuple):
+    intf: str
+    vrid: int
+    version: int
+    priority: int
+    vip: str
+    sync_group: str
+    track: str
+    rfc: bool
+
+    @property
+    def instance_name(self) -> str:
+        return f"vyatta-{self.intf}-{self.vrid}"
+
+
+def generate_groups(size: int) -> List[Group]:
+    """
+    Describe size groups, GROUPS_PER_INTF to an interface and cycling
+    through the interface kinds one interface at a time.
+    """
+
+    groups: List[Group] = []
+    for index in range(size):
+        intf_num: int = index // GROUPS_PER_INTF
+        kind: str = INTF_KINDS[intf_num % len(INTF_KINDS)]
+        if kind == "dataplane":
+            intf = f"dp0p{intf_num}s1"
+        elif kind == "bonding":
+            intf = f"dp0bond{intf_num}"
+        elif kind == "vif":
+            intf = f"dp0p{intf_num}s2.{intf_num % 4094 + 1}"
+        else:
+            intf = f"sw0.{intf_num % 4094 + 1}"
+        vrid: int = index % GROUPS_PER_INTF + 1
+        sync_group: str = ""
+        if index % SYNC_GROUP_EVERY == 0:
+            # Pair this group with the one on the same VRID on the next
+            # interface
+            sync_group = f"SYNC{(intf_num // 2) * GROUPS_PER_INTF + vrid}"
+        track: str = ""
+        if index % TRACK_EVERY == 0:
+            track = f"dp0p{intf_num + 1}s1"
+        groups.append(Group(
+            intf=intf, vrid=vrid,
+            version=3 if index % VERSION_3_EVERY else 2,
+            priority=100 + index % 100,
+            vip=f"10.{intf_num // 256 % 256}.{intf_num % 256}.{vrid}/24",
+            sync_group=sync_group, track=track,
+            rfc=index % RFC_EVERY == 0
+        ))
+    return groups
+
+
+def _yang_group(group: Group) -> Dict:
+    yang_group: Dict = {
+        "accept": False,
+        "preempt": True,
+        "priority": group.priority,
+        "tagnode": group.vrid,
+        "version": group.version,
+        "virtual-address": [group.vip],
+    }
+    if group.sync_group:
+        yang_group["sync-group"] = group.sync_group
+    if group.track:
+        yang_group["track"] = {
+            "interface": [{
+                "name": group.track,
+                "weight": {"type": "decrement", "value": 10}
+            }]
+        }
+    if group.rfc:
+        yang_group["rfc-compatibility"] = [None]
+    return yang_group
+
+
+def generate_yang_config(groups: List[Group]) -> Dict:
+    """
+    Build the YANG config the infrastructure would pass to Config.set for
+    groups, vifs still nested under their parent interfaces.
+    """
+
+    import vyatta.vrrp_vci.keepalived.util as util
+    intfs: Dict[Tuple[str, str], Dict] = {}
+    dataplane: List[Dict] = []
+    bonding: List[Dict] = []
+    switch: List[Dict] = []
+    group: Group
+    for group in groups:
+        key: Tuple[str, str] = (group.intf, "")
+        if "." in group.intf:
+            key = tuple(group.intf.split("."))
+        if key not in intfs:
+            parent_name, vif_name = key
+            if parent_name == "sw0":
+                parent: Dict = next(
+                    (intf for intf in switch if intf["name"] == "sw0"), {})
+                if not parent:
+                    parent = {"name": "sw0", util.VIF_YANG_NAME: []}
+                    switch.append(parent)
+                vrrp_name: str = util.SWITCH_VRRP_YANG_NAME
+            else:
+                parent = {util.YANG_TAGNODE: parent_name}
+                if parent_name.startswith("dp0bond"):
+                    bonding.append(parent)
+                else:
+                    dataplane.append(parent)
+                vrrp_name = util.VRRP_YANG_NAME
+            vrrp: Dict = {util.YANG_START_DELAY: 0, util.YANG_VRRP_GROUP: []}
+            if vif_name:
+                parent.setdefault(util.VIF_YANG_NAME, []).append(
+                    {util.YANG_TAGNODE: vif_name, vrrp_name: vrrp}
+                )
+                parent.setdefault(
+                    util.VRRP_YANG_NAME, {util.YANG_START_DELAY: 0})
+            else:
+                parent[util.VRRP_YANG_NAME] = vrrp
+            intfs[key] = vrrp
+        intfs[key][util.YANG_VRRP_GROUP].append(_yang_group(group))
+    return {
+        util.INTERFACE_YANG_NAME: {
+            util.DATAPLANE_YANG_NAME: dataplane,
+            util.BONDING_YANG_NAME: bonding,
+            util.SWITCH_YANG_NAME: switch,
+        }
+    }
+
+
+def _sync_members(groups: List[Group]) -> Dict[str, List[str]]:
+    members: Dict[str, List[str]] = {}
+    group: Group
+    for group in groups:
+        if group.sync_group:
+            members.setdefault(group.sync_group, []).append(
+                group.instance_name)
+    return members
+
+
+def generate_keepalived_data(groups: List[Group]) -> str:
+    """The keepalived.data dump keepalived would write for groups"""
+
+    blocks: List[str] = ["\n------< VRRP Topology >------\n"]
+    rfc_num: int = 0
+    group: Group
+    for index, group in enumerate(groups):
+        xmit_intf: str = group.intf
+        if group.rfc:
+            rfc_num += 1
+            xmit_intf = f"dp0vrrp{rfc_num}"
+        state: str = "MASTER" if index % 2 else "BACKUP"
+        master: str = ""
+        if state == "BACKUP":
+            master = (
+                f"   Master router = {group.vip.split('/')[0]}\n"
+                f"   Master priority = {group.priority + 1}\n"
+            )
+        track: str = ""
+        if group.track:
+            track = (
+                "   Tracked interfaces = 1\n"
+                f"     name {group.track} state UP weight -10\n"
+            )
+        blocks.append(
+            f" VRRP Instance = {group.instance_name}\n"
+            f" VRRP Version = {group.version}\n"
+            f"   State = {state}\n"
+            f"{master}"
+            "   Last transition = 0 (Thur Jan 1 00:00:00 1970)\n"
+            f"   Listening device = {group.intf}\n"
+            f"   Interface = {xmit_intf}\n"
+            "   Using src_ip = 10.10.1.1\n"
+            "   Gratuitous ARP delay = 5\n"
+            "   Gratuitous ARP repeat = 5\n"
+            "   Gratuitous ARP refresh = 0\n"
+            "   Gratuitous ARP refresh repeat = 1\n"
+            "   Gratuitous ARP lower priority delay = 5\n"
+            "   Gratuitous ARP lower priority repeat = 5\n"
+            "   Send advert after receive lower priority advert = true\n"
+            f"   Virtual Router ID = {group.vrid}\n"
+            f"   Priority = {group.priority}\n"
+            f"   Effective priority = {group.priority}\n"
+            f"   Total priority = {group.priority}\n"
+            f"   Configured priority = {group.priority}\n"
+            "   Address owner = no\n"
+            "   Advert interval = 1 sec\n"
+            "   Accept = disabled\n"
+            "   Preempt = enabled\n"
+            "   Promote_secondaries = disabled\n"
+            "   Authentication type = none\n"
+            f"{track}"
+            "   Virtual IP = 1\n"
+            f"     {group.vip} dev {xmit_intf} scope global\n"
+        )
+    sync_groups: Dict[str, List[str]] = _sync_members(groups)
+    if sync_groups:
+        blocks.append("------< VRRP Sync groups >------\n")
+        sync_group: str
+        for sync_group, members in sync_groups.items():
+            instances: str = "".join(
+                f"   {member}\n" for member in members)
+            blocks.append(
+                f" VRRP Sync Group = {sync_group}, MASTER\n"
+                "  Num member fault 0, num member init 0\n"
+                "  VRRP member instances :\n"
+                f"{instances}"
+                "  sync group tracking weight set\n"
+                "  Using smtp notification = no\n"
+            )
+    blocks.append("------< Interfaces >------\n")
+    return "".join(blocks)
+
+
+def generate_keepalived_stats(groups: List[Group]) -> str:
+    """The keepalived.stats dump keepalived would write for groups"""
+
+    blocks: List[str] = ["\n"]
+    group: Group
+    for index, group in enumerate(groups):
+        blocks.append(
+            f"VRRP Instance: {group.instance_name}\n"
+            "  Advertisements:\n"
+            f"    Received: {index}\n"
+            f"    Sent: {index * 2}\n"
+            "  Became master: 1\n"
+            "  Released master: 0\n"
+            "  Packet Errors:\n"
+            "    Length: 0\n"
+            "    TTL: 0\n"
+            "    Invalid Type: 0\n"
+            "    Advertisement Interval: 0\n"
+            "    Address List: 0\n"
+            "  Authentication Errors:\n"
+            "    Invalid Type: 0\n"
+            "    Type Mismatch: 0\n"
+            "    Failure: 0\n"
+            "  Priority Zero:\n"
+            "    Received: 0\n"
+            "    Sent: 0\n"
+        )
+    return "".join(blocks)
+
+
+class Stage(NamedTuple):
+    name: str
+    # Called before every run of the stage, outside the measurement, its
+    # return value is passed to run
+    setup: Callable[[], Any]
+    run: Callable[[Any], Any]
+
+
+def build_stages(size: int, work_dir: str) -> Iterator[Stage]:
+    """
+    The stages benchmarked for a config of size groups, each one is set up
+    so it can be run repeatedly.
+    """
+
+    import vyatta.vrrp_vci.keepalived.config_file as impl_conf
+    import vyatta.vrrp_vci.keepalived.util as util
+    import vyatta.vrrp_vci.show_vrrp_cmds as vrrp_show
+
+    groups: List[Group] = generate_groups(size)
+    yang_config: Dict = generate_yang_config(groups)
+    sanitized: Dict = util.sanitize_vrrp_config(copy.deepcopy(yang_config))
+    config_path: str = os.path.join(work_dir, f"keepalived-{size}.conf")
+
+    vmac_table_path: str = os.path.join(work_dir, f"vmac-{size}.json")
+
+    def new_config() -> Any:
+        return impl_conf.KeepalivedConfig(
+            config_path, vmac_table_path=vmac_table_path)
+
+    # VrrpGroup modifies the group dictionaries it's built from so every
+    # update gets its own copy of the config
+    def update_args() -> Tuple[Any, Dict]:
+        return new_config(), copy.deepcopy(sanitized)
+
+    def updated_config() -> Any:
+        config: Any = new_config()
+        config.update(copy.deepcopy(sanitized))
+        return config
+
+    def updated_config_args() -> Tuple[Any, Dict]:
+        return updated_config(), copy.deepcopy(sanitized)
+
+    def written_config() -> Any:
+        config: Any = updated_config()
+        config.write_config()
+        return config
+
+    def remove_config_file() -> Any:
+        if os.path.exists(config_path):
+            os.unlink(config_path)
+        return updated_config()
+
+    yield Stage(
+        "sanitize_vrrp_config",
+        lambda: copy.deepcopy(yang_config), util.sanitize_vrrp_config
+    )
+    yield Stage("update", update_args, lambda args: args[0].update(args[1]))
+    yield Stage(
+        "update_unchanged", updated_config_args,
+        lambda args: args[0].update(args[1])
+    )
+    yield Stage(
+        "write_config", remove_config_file,
+        lambda config: config.write_config()
+    )
+    yield Stage(
+        "write_config_unchanged", written_config,
+        lambda config: config.write_config()
+    )
+
+    def read_config_file() -> Tuple[Any, str]:
+        config: Any = written_config()
+        return config, config.read_config()
+
+    yield Stage(
+        "convert_to_vci_format_dict", read_config_file,
+        lambda args: args[0].convert_to_vci_format_dict(args[1])
+    )
+    data: str = generate_keepalived_data(groups)
+    yield Stage(
+        "convert_data_file_to_dict", lambda: data,
+        vrrp_show.convert_data_file_to_dict
+    )
+    stats: str = generate_keepalived_stats(groups)
+    yield Stage(
+        "convert_stats_file_to_dict", lambda: stats,
+        vrrp_show.convert_stats_file_to_dict
+    )
+    data_dict: Dict = vrrp_show.convert_data_file_to_dict(data)
+    yield Stage(
+        "show_vrrp_detail", lambda: data_dict, vrrp_show.show_vrrp_detail
+    )
+
+
+def measure(stage: Stage, repeat: int) -> Dict[str, Any]:
+    """
+    Time stage repeat times without tracemalloc and keep the fastest, then
+    run it once more under tracemalloc for its peak allocation. Only memory
+    allocated while the stage runs is counted, not what setup allocated.
+    """
+
+    times: List[float] = []
+    for _ in range(repeat):
+        arg: Any = stage.setup()
+        gc.collect()
+        start: float = time.perf_counter()
+        stage.run(arg)
+        times.append(time.perf_counter() - start)
+        del arg
+    arg = stage.setup()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        stage.run(arg)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "seconds": min(times),
+        "mean_seconds": sum(times) / len(times),
+        "peak_bytes": peak,
+        "repeat": repeat,
+    }
+
+
+def run_benchmarks(
+    sizes: List[int], repeat: int, stages: List[str]
+) -> Iterator[Dict[str, Any]]:
+    with tempfile.TemporaryDirectory(prefix="bench-vrrp-") as work_dir:
+        size: int
+        for size in sizes:
+            stage: Stage
+            for stage in build_stages(size, work_dir):
+                if stages and stage.name not in stages:
+                    continue
+                result: Dict[str, Any] = {
+                    "size": size, "stage": stage.name,
+                    "python": platform.python_version(),
+                }
+                result.update(measure(stage, repeat))
+                yield result
+
+
+def load_results(file_path: str) -> Dict[Tuple[int, str], Dict]:
+    results: Dict[Tuple[int, str], Dict] = {}
+    with open(file_path) as file_obj:
+        line: str
+        for line in file_obj:
+            if line.strip():
+                result: Dict = json.loads(line)
+                results[(result["size"], result["stage"])] = result
+    return results
+
+
+def compare(result: Dict[str, Any], baseline: Dict) -> str:
+    """A line comparing result against the same stage in the baseline"""
+
+    line: str = (
+        f"{result['stage']:<28} {result['size']:>6} "
+        f"{result['seconds']:>10.4f}s {result['peak_bytes'] / 2**20:>9.2f}MiB"
+    )
+    old: Dict = baseline.get((result["size"], result["stage"]), {})
+    if old.get("seconds"):
+        line += f"  time x{result['seconds'] / old['seconds']:.2f}"
+    if old.get("peak_bytes"):
+        line += f"  mem x{result['peak_bytes'] / old['peak_bytes']:.2f}"
+    return line
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark VRRP config generation, parsing and show "
+                    "rendering")
+    parser.add_argument(
+        "--sizes", default=DEFAULT_SIZES,
+        help=f"Comma separated group counts, default {DEFAULT_SIZES}"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3,
+        help="Timed runs of each stage, the fastest is reported"
+    )
+    parser.add_argument(
+        "--stage", action="append", default=[],
+        help="Only run this stage, can be given more than once"
+    )
+    parser.add_argument(
+        "--output", help="Write the JSON lines here instead of stdout"
+    )
+    parser.add_argument(
+        "--baseline",
+        help="JSON lines from an earlier run to compare against, the "
+             "comparison is written to stderr"
+    )
+    args = parser.parse_args()
+    sizes: List[int] = [int(size) for size in args.sizes.split(",")]
+    baseline: Dict = {}
+    if args.baseline:
+        baseline = load_results(args.baseline)
+
+    install_fake_dbus()
+    output: Any = sys.stdout
+    if args.output:
+        output = open(args.output, "w")
+    try:
+        result: Dict[str, Any]
+        for result in run_benchmarks(sizes, max(args.repeat, 1), args.stage):
+            output.write(json.dumps(result, sort_keys=True) + "\n")
+            output.flush()
+            print(compare(result, baseline), file=sys.stderr)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,73 +6,40 @@
 # SPDX-License-Identifier: GPL-2.0-only
 
 import argparse
-from typing import Dict
+from typing import Dict, Optional
 
-import vyatta.vrrp_vci.abstract_vrrp_classes as abstract_impl
-import vyatta.vrrp_vci.keepalived.config_file as impl_conf
-import vyatta.vrrp_vci.keepalived.dbus.process_control as process_control
-import vyatta.vrrp_vci.keepalived.util as util
-import vyatta.vrrp_vci.show_vrrp_cmds as vrrp_show
-from vyatta.vrrp_vci.vyatta_vrrp_vci import State
+import vyatta.vrrp_vci.show_query as show_query
+
+# The rest of the vyatta modules are imported by the commands that need
+# them. These scripts are run for every show command and tab completion so
+# anything imported here is paid for on every key press.
+
+
+def get_state() -> Dict:
+    import vyatta.vrrp_vci.abstract_vrrp_classes as abstract_impl
+    import vyatta.vrrp_vci.keepalived.config_file as impl_conf
+    from vyatta.vrrp_vci.vyatta_vrrp_vci import State
+    keepalived_implementation: abstract_impl.ConfigFile \
+        = impl_conf.KeepalivedConfig(vmac_table_writable=False)
+    try:
+        keepalived_implementation.update_from_file()
+    except FileNotFoundError:
+        return {}
+    return State(keepalived_implementation).get()
 
 
 def process_arguments(command: str, intf: str, vrid: str, sync: str) -> str:
-    # Break this up into more coherent blocks, tracked via VRVDR-51299
-    show_output: str = "VRRP is not running"
-    if command == "summary":
-        keepalived_implementation: abstract_impl.ConfigFile \
-            = impl_conf.KeepalivedConfig()
-        current_state = State(keepalived_implementation)
-        state_dict = current_state.get()
-        if state_dict == {}:
-            print(show_output)
-            return show_output
-        show_output = vrrp_show.show_vrrp_summary(current_state.get())
-    else:
-        pc = process_control.ProcessControl()
-        if not pc.is_running():
-            if command == "autocomplete":
-                show_output = ""
-            print(show_output)
-            return show_output
-        file_contents: str
-        json_repr: Dict
-        if command in ["detail", "interface", "sync", "autocomplete"]:
-            keepalived_responding = pc.dump_keepalived_data()
-            if not keepalived_responding:
-                show_output = "Keepalived is not responding"
-                if command == "autocomplete":
-                    show_output = ""
-                print(show_output)
-                return show_output
-            with open(util.FILE_PATH_KEEPALIVED_DATA, "r") as file_obj:
-                file_contents = file_obj.read()
-            json_repr = vrrp_show.convert_data_file_to_dict(file_contents)
-            if command == "detail":
-                show_output = vrrp_show.show_vrrp_detail(json_repr)
-            elif command == "interface":
-                show_output = \
-                    vrrp_show.show_vrrp_interface(json_repr, intf, vrid)
-            elif command == "sync":
-                show_output = vrrp_show.show_vrrp_sync(json_repr, sync)
-            elif command == "autocomplete":
-                show_output = vrrp_show.show_autocomplete(
-                    json_repr, intf, sync
-                )
-            else:
-                print(f"Error: Unknown command:{command}")
-        else:
-            keepalived_responding = pc.dump_keepalived_stats()
-            if not keepalived_responding:
-                show_output = "Keepalived is not responding"
-                print(show_output)
-                return show_output
-            with open(util.FILE_PATH_KEEPALIVED_STATS, "r") as file_obj:
-                file_contents = file_obj.read()
-            json_repr = vrrp_show.convert_stats_file_to_dict(file_contents)
-            show_output = vrrp_show.show_vrrp_statistics_filters(
-                json_repr, intf, vrid
-            )
+    # Ask the VCI component first, it already has everything loaded. If it
+    # isn't answering do the work here.
+    show_output: Optional[str] = show_query.query(command, intf, vrid, sync)
+    if show_output is None and command == "timing":
+        # The timings are kept by the VCI component, there's nothing to
+        # report from here
+        show_output = "VRRP component is not answering"
+    elif show_output is None:
+        show_output = show_query.ShowQueries(get_state).show(
+            command, intf, vrid, sync
+        )
     print(show_output)
     return show_output
 
@@ -88,9 +55,10 @@ def main() -> str:
         stats - show vrrp statistics\n
         sync - show vrrp sync-group\n
         autocomplete - show which other filter can be applied\n
+        timing - show time spent handling config and state requests\n
         """,
                         choices=["summary", "detail", "interface", "stats",
-                                 "sync", "autocomplete"]
+                                 "sync", "autocomplete", "timing"]
                         )
     parser.add_argument(
         "--intf", help="Filter on interface", default=""
@@ -6,21 +6,70 @@
 # SPDX-License-Identifier: GPL-2.0-only
 
 import argparse
-from typing import Any, Dict, List
+import contextlib
+import json
+import os
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
 
-import vyatta.vrrp_vci.abstract_vrrp_classes as abstract_impl
-import vyatta.vrrp_vci.keepalived.config_file as impl_conf
 import vyatta.vrrp_vci.keepalived.dbus.process_control as process_control
+import vyatta.vrrp_vci.keepalived.instance_registry as instance_registry
 import vyatta.vrrp_vci.keepalived.util as util
-import vyatta.vrrp_vci.vyatta_vrrp_vci as vrrp_vci
-from vyatta.vrrp_vci.vyatta_vrrp_vci import State
 
+# The config and VCI modules pull in pydbus and vci, they're only imported
+# by the commands that need them so the rest start quickly.
 
-def bgp_async() -> None:
+
+def load_bgp_failover_states() -> Dict[str, str]:
+    try:
+        with open(util.FILE_PATH_BGP_FAILOVER_STATES, "r") as file_obj:
+            return json.load(file_obj)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def save_bgp_failover_states(states: Dict[str, str]) -> None:
+    state_dir: str = os.path.dirname(util.FILE_PATH_BGP_FAILOVER_STATES)
+    os.makedirs(state_dir, exist_ok=True)
+    fd: int
+    temp_path: str
+    fd, temp_path = tempfile.mkstemp(
+        prefix=".bgp-failover-states.json.", dir=state_dir
+    )
+    try:
+        with open(fd, "w") as file_obj:
+            json.dump(states, file_obj)
+        os.replace(temp_path, util.FILE_PATH_BGP_FAILOVER_STATES)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(temp_path)
+        raise
+
+
+def bgp_async(changed_only: bool = False) -> List[Tuple[str, bool]]:
+    """
+    Tell BGP the state of every VRRP group, all through a single vtysh
+    session. With changed_only groups whose state BGP has already been
+    told about by an earlier run are left out. A group's state is only
+    remembered once its command has succeeded so a failure is always
+    sent again.
+    """
+    import vyatta.vrrp_vci.abstract_vrrp_classes as abstract_impl
+    import vyatta.vrrp_vci.keepalived.config_file as impl_conf
+    from vyatta.vrrp_vci.vyatta_vrrp_vci import State
     keepalived_implementation: abstract_impl.ConfigFile \
-        = impl_conf.KeepalivedConfig()
+        = impl_conf.KeepalivedConfig(vmac_table_writable=False)
+    try:
+        keepalived_implementation.update_from_file()
+    except FileNotFoundError:
+        return []
     current_state = State(keepalived_implementation)
     state_dict = util.sanitize_vrrp_config(current_state.get())
+    if state_dict == {}:
+        return []
+    sent_states: Dict[str, str] = load_bgp_failover_states()
+    current_states: Dict[str, str] = {}
+    pending: Dict[str, str] = {}
     intf_list: List
     for intf_list in state_dict[util.INTERFACE_YANG_NAME].values():
         intf_dict: Dict
@@ -43,14 +92,106 @@ def bgp_async() -> None:
                 if util.YANG_INSTANCE_STATE not in vrrp_instance:
                     continue
                 group: str = vrrp_instance[util.YANG_TAGNODE]
-                state: Dict = \
+                state: str = \
                     vrrp_instance[util.YANG_INSTANCE_STATE][util.YANG_STATE]
-                cmd = f"clear ip bgp interface {intf_name} vrrp-failover " +\
+                instance_name: str = f"vyatta-{intf_name}-{group}"
+                current_states[instance_name] = state
+                if changed_only and sent_states.get(instance_name) == state:
+                    continue
+                pending[instance_name] = \
+                    f"clear ip bgp interface {intf_name} vrrp-failover " +\
                     f"vrrp-group {group} state {state}"
-                util.call_vtysh(cmd)
+    results: List[Tuple[str, bool]] = \
+        util.call_vtysh_batch(list(pending.values()))
+    instance: str
+    result: Tuple[str, bool]
+    for instance, result in zip(list(pending), results):
+        if not result[1]:
+            print(f"Failed: {result[0]}")
+            del current_states[instance]
+            if instance in sent_states:
+                # Keep the last state BGP was successfully told about
+                current_states[instance] = sent_states[instance]
+    if pending or current_states != sent_states:
+        save_bgp_failover_states(current_states)
+    return results
 
 
-def process_arguments(command: str, intf: str, vrid: str) -> None:
+def resolve_connection(intf: str, vrid: str) -> Optional[Any]:
+    """
+    The VrrpConnection for the group with vrid on intf, None if it isn't
+    configured. Only this group is looked up in the config file and only
+    its DBus object is opened, however many groups there are.
+    """
+    try:
+        af_type: Optional[int] = instance_registry.configured_af_type(
+            util.FILE_PATH_KEEPALIVED_CONFIG, intf, vrid
+        )
+    except FileNotFoundError:
+        return None
+    if af_type is None:
+        return None
+    import vyatta.vrrp_vci.keepalived.dbus.system_bus as system_bus
+    from vyatta.vrrp_vci.keepalived.dbus.vrrp_group_connection import \
+        VrrpConnection
+    return VrrpConnection(
+        intf, vrid, af_type, system_bus.get_system_bus()
+    )
+
+
+def bulk_garp(
+    intf: str, sync_group: str, rate: float = util.GARP_BULK_RATE
+) -> List[Dict[str, Any]]:
+    """
+    Send a GARP from every master group in the config file, only those on
+    intf or in sync_group if either is given, and print the result for
+    each group.
+    """
+    import vyatta.vrrp_vci.keepalived.dbus.system_bus as system_bus
+    import vyatta.vrrp_vci.vyatta_vrrp_vci as vrrp_vci
+    from vyatta.vrrp_vci.keepalived.dbus.vrrp_group_connection import \
+        VrrpConnection
+    instances: instance_registry.InstanceRegistry = \
+        instance_registry.InstanceRegistry()
+    try:
+        configured: Tuple[str, int, int]
+        for configured in instance_registry.configured_instances(
+                util.FILE_PATH_KEEPALIVED_CONFIG):
+            group_intf, group_vrid, af_type = configured
+            if intf != "" and group_intf != \
+                    instance_registry.canonical_intf_name(intf):
+                continue
+            instances.add(
+                group_intf, group_vrid, af_type, None,
+                VrrpConnection(
+                    group_intf, str(group_vrid), af_type,
+                    system_bus.get_system_bus()
+                )
+            )
+    except FileNotFoundError:
+        pass
+    if len(instances) == 0:
+        print("No VRRP groups to send GARP from")
+        return []
+    results: List[Dict[str, Any]] = vrrp_vci.garp_instances(
+        list(instances), sync_group, rate
+    )
+    result: Dict[str, Any]
+    for result in results:
+        line: str = \
+            f"{result[util.YANG_INTERFACE_CONST]} group " \
+            f"{result[util.GARP_RESULT_GROUP]}: " \
+            f"{result[util.GARP_RESULT_STATUS]}"
+        if util.GARP_RESULT_ERROR in result:
+            line += f" ({result[util.GARP_RESULT_ERROR]})"
+        print(line)
+    return results
+
+
+def process_arguments(
+    command: str, intf: str, vrid: str, sync_group: str = "",
+    rate: float = util.GARP_BULK_RATE, changed_only: bool = False
+) -> None:
     process = process_control.ProcessControl()
     if not process.is_running():
         print("VRRP not configured")
@@ -60,32 +201,31 @@ def process_arguments(command: str, intf: str, vrid: str) -> None:
     elif command == "reset":
         if intf == "" or vrid == "":
             return
-        keepalived_implementation: abstract_impl.ConfigFile \
-            = impl_conf.KeepalivedConfig()
-        file_config: str = keepalived_implementation.read_config()
-        yang_repr: Dict[str, Any] = \
-            keepalived_implementation.convert_to_vci_format_dict(
-                file_config)
-        yang_repr = util.sanitize_vrrp_config(yang_repr)
-        keepalived_implementation.update(yang_repr)
-        instance_name = f"vyatta-{intf}-{vrid}"
-        connections = keepalived_implementation.vrrp_connections
-        connections[instance_name].reset_group_state()
+        connection: Optional[Any] = resolve_connection(intf, vrid)
+        if connection is None:
+            print(f"VRRP group {vrid} doesn't exist on {intf}")
+            return
+        connection.reset_group_state()
     elif command == "add-debug":
         process.turn_on_debugs(util.DEBUG_FLAG_PER_PACKET)
     elif command == "remove-debug":
         process.turn_off_debugs(util.DEBUG_FLAG_PER_PACKET)
     elif command == "garp":
-        if intf == "" or vrid == "":
+        if vrid == "":
+            bulk_garp(intf, sync_group, rate)
             return
-        vrrp_vci.send_garp(
-            {
-                util.RPC_GARP_INTERFACE: intf,
-                util.RPC_GARP_GROUP: vrid
-            }
-        )
+        connection = resolve_connection(intf, vrid)
+        if connection is None:
+            print(f"VRRP group {vrid} doesn't exist on {intf}")
+            return
+        try:
+            connection.garp()
+        except Exception as err:
+            # pydbus doesn't export any Exceptions to catch
+            print(f"Failed to send GARP for VRRP group {vrid} on {intf}: "
+                  f"{err}")
     elif command == "bgp":
-        bgp_async()
+        bgp_async(changed_only)
     return
 
 
@@ -103,11 +243,27 @@ def main() -> None:
     parser.add_argument(
         "--vrid", help="Filter on group", default=""
     )
+    parser.add_argument(
+        "--sync", help="Filter sync group, garp only", default=""
+    )
+    parser.add_argument(
+        "--rate", help="GARPs sent per second, garp only", type=float,
+        default=util.GARP_BULK_RATE
+    )
+    parser.add_argument(
+        "--changed", action="store_true",
+        help="Only send groups whose state changed since the last run, "
+        "bgp only"
+    )
     args = parser.parse_args()
     command: str = args.clear
     filter_intf: str = args.intf
     filter_vrid: str = args.vrid
-    process_arguments(command, filter_intf, filter_vrid)
+    filter_sync: str = args.sync
+    process_arguments(
+        command, filter_intf, filter_vrid, filter_sync, args.rate,
+        args.changed
+    )
     return
 
 
@@ -14,6 +14,14 @@ from vyatta.vrrp_vci.keepalived.vrrp import VrrpGroup
 # pylint: disable=redefined-outer-name
 
 
+@pytest.fixture(autouse=True)
+def tmp_vmac_table(tmp_path, monkeypatch):
+    import vyatta.vrrp_vci.keepalived.util as util
+    monkeypatch.setattr(
+        util, "FILE_PATH_VMAC_TABLE", f"{tmp_path}/vmac-table.json")
+    return util.FILE_PATH_VMAC_TABLE
+
+
 @pytest.fixture
 def pydbus_fakes():
     class FakeGi:
@@ -60,7 +68,7 @@ def calendar_fakes(monkeypatch):
 
 
 @pytest.fixture
-def socket_fakes():
+def socket_fakes(monkeypatch):
     class FakeSocket:
 
         def __init__(self, family, sock_type):
@@ -81,7 +89,7 @@ def socket_fakes():
         def __exit__(self, exc_type, exc_value, exc_tb):
             pass
 
-    setattr(socket, "socket", FakeSocket)
+    monkeypatch.setattr(socket, "socket", FakeSocket)
 
 
 @pytest.fixture
@@ -2797,26 +2805,26 @@ def generic_group_keepalived_stats_dict():
         "tagnode": 1,
         "stats": {
             "Advertisements": {
-                "Received": "0",
-                "Sent": "615"
+                "Received": 0,
+                "Sent": 615
             },
-            "Became master": "1",
-            "Released master": "0",
+            "Became master": 1,
+            "Released master": 0,
             "Packet errors": {
-                "Length": "0",
-                "TTL": "0",
-                "Invalid type": "0",
-                "Advertisement interval": "0",
-                "Address list": "0"
+                "Length": 0,
+                "TTL": 0,
+                "Invalid type": 0,
+                "Advertisement interval": 0,
+                "Address list": 0
             },
             "Authentication errors": {
-                "Invalid type": "0",
-                "Type mismatch": "0",
-                "Failure": "0"
+                "Invalid type": 0,
+                "Type mismatch": 0,
+                "Failure": 0
             },
             "Priority zero advertisements": {
-                "Received": "0",
-                "Sent": "0"
+                "Received": 0,
+                "Sent": 0
             }
         }
     }
@@ -2887,26 +2895,26 @@ def backup_group_keepalived_stats_dict():
         "tagnode": 42,
         "stats": {
             "Advertisements": {
-                "Received": "100",
-                "Sent": "0"
+                "Received": 100,
+                "Sent": 0
             },
-            "Became master": "0",
-            "Released master": "0",
+            "Became master": 0,
+            "Released master": 0,
             "Packet errors": {
-                "Length": "0",
-                "TTL": "0",
-                "Invalid type": "0",
-                "Advertisement interval": "0",
-                "Address list": "0"
+                "Length": 0,
+                "TTL": 0,
+                "Invalid type": 0,
+                "Advertisement interval": 0,
+                "Address list": 0
             },
             "Authentication errors": {
-                "Invalid type": "0",
-                "Type mismatch": "0",
-                "Failure": "0"
+                "Invalid type": 0,
+                "Type mismatch": 0,
+                "Failure": 0
             },
             "Priority zero advertisements": {
-                "Received": "0",
-                "Sent": "0"
+                "Received": 0,
+                "Sent": 0
             }
         }
     }
@@ -3055,26 +3063,26 @@ def second_intf_keepalived_stats_dict():
         "tagnode": 2,
         "stats": {
             "Advertisements": {
-                "Received": "50",
-                "Sent": "3305"
+                "Received": 50,
+                "Sent": 3305
             },
-            "Became master": "1",
-            "Released master": "1",
+            "Became master": 1,
+            "Released master": 1,
             "Packet errors": {
-                "Length": "0",
-                "TTL": "0",
-                "Invalid type": "0",
-                "Advertisement interval": "0",
-                "Address list": "0"
+                "Length": 0,
+                "TTL": 0,
+                "Invalid type": 0,
+                "Advertisement interval": 0,
+                "Address list": 0
             },
             "Authentication errors": {
-                "Invalid type": "0",
-                "Type mismatch": "0",
-                "Failure": "0"
+                "Invalid type": 0,
+                "Type mismatch": 0,
+                "Failure": 0
             },
             "Priority zero advertisements": {
-                "Received": "0",
-                "Sent": "0"
+                "Received": 0,
+                "Sent": 0
             }
         }
     }
@@ -3294,26 +3302,26 @@ def generic_group_vif_keepalived_stats_dict():
         "tagnode": 1,
         "stats": {
             "Advertisements": {
-                "Received": "0",
-                "Sent": "615"
+                "Received": 0,
+                "Sent": 615
             },
-            "Became master": "1",
-            "Released master": "0",
+            "Became master": 1,
+            "Released master": 0,
             "Packet errors": {
-                "Length": "0",
-                "TTL": "0",
-                "Invalid type": "0",
-                "Advertisement interval": "0",
-                "Address list": "0"
+                "Length": 0,
+                "TTL": 0,
+                "Invalid type": 0,
+                "Advertisement interval": 0,
+                "Address list": 0
             },
             "Authentication errors": {
-                "Invalid type": "0",
-                "Type mismatch": "0",
-                "Failure": "0"
+                "Invalid type": 0,
+                "Type mismatch": 0,
+                "Failure": 0
             },
             "Priority zero advertisements": {
-                "Received": "0",
-                "Sent": "0"
+                "Received": 0,
+                "Sent": 0
             }
         }
     }
@@ -6398,6 +6406,7 @@ def mock_show_version_rpc_no_hypervisor():
 @pytest.fixture
 def mock_pydbus(pydbus_fakes, tmp_path):
     import pydbus
+    import vyatta.vrrp_vci.keepalived.dbus.system_bus as system_bus
 
     class SystemdProxyObject:
 
@@ -6420,7 +6429,7 @@ def mock_pydbus(pydbus_fakes, tmp_path):
         def __init__(self):
             pass
 
-        def GetAll(self, interface_name):  # noqa: N802
+        def GetAll(self, interface_name, timeout=None):  # noqa: N802
             if interface_name == "dp0p1s1":
                 return {"Name": ("vyatta-dp0p1s1-1",),
                         "SyncGroup": ("",),
@@ -6458,16 +6467,35 @@ def mock_pydbus(pydbus_fakes, tmp_path):
         def StopUnit(self, service_file, action):  # noqa: N802
             self.manager_obj.SubState = "dead"
 
+    class Subscription:
+
+        def __init__(self, signal, callback):
+            self.signal = signal
+            self.callback = callback
+
+        def disconnect(self):
+            self.signal.callbacks.remove(self.callback)
+
+    class Signal:
+
+        def __init__(self):
+            self.callbacks = []
+
+        def connect(self, callback):
+            self.callbacks.append(callback)
+            return Subscription(self, callback)
+
     class VrrpProxyObject:
 
         def __init__(self):
             self._state = "dead"
+            self.VrrpStatusChange = Signal()
 
         @property
         def SubState(self):   # noqa: N802
             return self._state
 
-        def SendGarp(self):  # noqa: N802
+        def SendGarp(self, timeout=None):  # noqa: N802
             return {}
 
         @SubState.setter
@@ -6479,6 +6507,9 @@ def mock_pydbus(pydbus_fakes, tmp_path):
                 return ("dp0p1s1", 1)
             return ("", 0)
 
+        def ReloadConfig(self):  # noqa: N802
+            return
+
         def PrintData(self):
             with open(f"{tmp_path}/keepalived.data", "w") as file_obj:
                 file_obj.write("test")
@@ -6504,16 +6535,22 @@ def mock_pydbus(pydbus_fakes, tmp_path):
             if "/org/freedesktop/systemd1" == obj_path:
                 return SystemdProxyObject()
 
-        def watch_name(self, name, name_appeared=None):
+        def watch_name(self, name, name_appeared=None,
+                       name_vanished=None):
+            return
+
+        def subscribe(self, sender=None, iface=None, signal=None,
+                      object=None, signal_fired=None):
             return
 
     setattr(pydbus, "SystemBus", MockSystemBus)
+    system_bus.reset()
     return PropertyInterface
 
 
 @pytest.fixture
 def mock_pydbus_rfc(mock_pydbus):
-    def GetAllRfc(self, interface_name):  # noqa: N802
+    def GetAllRfc(self, interface_name, timeout=None):  # noqa: N802
         return {"Name": ("vyatta-dp0p1s1-1",),
                 "SyncGroup": ("",),
                 "XmitIntf": ("dp0vrrp1",),
@@ -2,7 +2,9 @@
 # All rights reserved.
 # SPDX-License-Identifier: GPL-2.0-only
 
+import copy
 import json
+import os
 from pathlib import Path
 
 import pytest
@@ -270,6 +272,288 @@ class TestKeepalivedConfigFile:
         with pytest.raises(ValueError):
             keepalived_config.update(simple_dataplane_vif_config)
 
+    def test_update_config_reuses_unchanged_groups(
+            self, mock_pydbus, keepalived_config, simple_config,
+            interface_yang_name, dataplane_yang_name, vrrp_yang_name):
+        intf = simple_config[interface_yang_name][dataplane_yang_name][0]
+        second_group = copy.deepcopy(intf[vrrp_yang_name]["vrrp-group"][0])
+        second_group["tagnode"] = 2
+        intf[vrrp_yang_name]["vrrp-group"].append(second_group)
+        keepalived_config.update(copy.deepcopy(simple_config))
+        groups = list(keepalived_config.vrrp_instances)
+        connections = dict(keepalived_config.vrrp_connections)
+
+        keepalived_config.update(copy.deepcopy(simple_config))
+        diff = keepalived_config.last_update_diff
+
+        expected = False
+        assert diff.has_changes() == expected
+        expected = {"vyatta-dp0p1s1-1", "vyatta-dp0p1s1-2"}
+        assert diff.unchanged == expected
+        assert all(
+            new is old for new, old in
+            zip(keepalived_config.vrrp_instances, groups))
+        assert all(
+            keepalived_config.vrrp_connections[name] is conn
+            for name, conn in connections.items())
+
+    def test_update_config_rebuilds_changed_group(
+            self, mock_pydbus, keepalived_config, simple_config,
+            interface_yang_name, dataplane_yang_name, vrrp_yang_name):
+        intf = simple_config[interface_yang_name][dataplane_yang_name][0]
+        second_group = copy.deepcopy(intf[vrrp_yang_name]["vrrp-group"][0])
+        second_group["tagnode"] = 2
+        intf[vrrp_yang_name]["vrrp-group"].append(second_group)
+        keepalived_config.update(copy.deepcopy(simple_config))
+        groups = list(keepalived_config.vrrp_instances)
+        connection = keepalived_config.vrrp_connections["vyatta-dp0p1s1-2"]
+
+        second_group["priority"] = 150
+        third_group = copy.deepcopy(second_group)
+        third_group["tagnode"] = 3
+        intf[vrrp_yang_name]["vrrp-group"] = [second_group, third_group]
+        keepalived_config.update(copy.deepcopy(simple_config))
+        diff = keepalived_config.last_update_diff
+
+        assert diff.added == {"vyatta-dp0p1s1-3"}
+        assert diff.removed == {"vyatta-dp0p1s1-1"}
+        assert diff.changed == {"vyatta-dp0p1s1-2"}
+        assert diff.unchanged == set()
+        assert keepalived_config.vrrp_instances[0] is not groups[1]
+        assert "priority 150" in str(keepalived_config.vrrp_instances[0])
+        # Still the same keepalived object so the connection is kept
+        assert keepalived_config.vrrp_connections[
+            "vyatta-dp0p1s1-2"] is connection
+
+        second_group["virtual-address"] = ["2001::100/64"]
+        intf[vrrp_yang_name]["vrrp-group"] = [second_group]
+        keepalived_config.update(copy.deepcopy(simple_config))
+        assert keepalived_config.vrrp_connections[
+            "vyatta-dp0p1s1-2"] is not connection
+
+    def test_update_config_vmac_numbers_stable(
+            self, mock_pydbus, keepalived_config, simple_config,
+            tmp_vmac_table, interface_yang_name, dataplane_yang_name,
+            vrrp_yang_name):
+        intf = simple_config[interface_yang_name][dataplane_yang_name][0]
+        group = intf[vrrp_yang_name]["vrrp-group"][0]
+        group["rfc-compatibility"] = [None]
+        groups = []
+        for vrid in range(1, 4):
+            new_group = copy.deepcopy(group)
+            new_group["tagnode"] = vrid
+            groups.append(new_group)
+        intf[vrrp_yang_name]["vrrp-group"] = groups
+        keepalived_config.update(copy.deepcopy(simple_config))
+
+        # Removing the first group leaves the others on their interfaces
+        intf[vrrp_yang_name]["vrrp-group"] = groups[1:]
+        keepalived_config.update(copy.deepcopy(simple_config))
+        diff = keepalived_config.last_update_diff
+        assert diff.changed == set()
+        assert diff.unchanged == {"vyatta-dp0p1s1-2", "vyatta-dp0p1s1-3"}
+
+        # A new group takes the number freed by the removed one, and
+        # the numbers survive the process restarting
+        new_group = copy.deepcopy(group)
+        new_group["tagnode"] = 4
+        intf[vrrp_yang_name]["vrrp-group"] = groups[1:] + [new_group]
+        restarted = type(keepalived_config)()
+        restarted.update(copy.deepcopy(simple_config))
+        assert [
+            str(instance).split("use_vmac ")[1].split()[0]
+            for instance in restarted.vrrp_instances
+        ] == ["dp0vrrp2", "dp0vrrp3", "dp0vrrp1"]
+        with open(tmp_vmac_table) as file_obj:
+            assert json.load(file_obj) == {
+                "vyatta-dp0p1s1-2": 2,
+                "vyatta-dp0p1s1-3": 3,
+                "vyatta-dp0p1s1-4": 1,
+            }
+
+    def test_update_config_vmac_table_read_only(
+            self, mock_pydbus, keepalived_config, simple_config, tmp_path,
+            tmp_vmac_table, interface_yang_name, dataplane_yang_name,
+            vrrp_yang_name):
+        intf = simple_config[interface_yang_name][dataplane_yang_name][0]
+        group = intf[vrrp_yang_name]["vrrp-group"][0]
+        group["rfc-compatibility"] = [None]
+        reader = type(keepalived_config)(
+            f"{tmp_path}/keepalived.conf", vmac_table_writable=False)
+        reader.update(copy.deepcopy(simple_config))
+        assert not os.path.exists(tmp_vmac_table)
+
+        # The reader picks up the owner's numbering every update
+        with open(tmp_vmac_table, "w") as file_obj:
+            json.dump({"vyatta-dp0p1s1-1": 5}, file_obj)
+        group["priority"] = 150
+        reader.update(copy.deepcopy(simple_config))
+        assert "use_vmac dp0vrrp5" in str(reader.vrrp_instances[0])
+        reader.shutdown()
+        assert os.path.exists(tmp_vmac_table)
+
+    def test_get_rfc_mapping(
+            self, mock_pydbus, keepalived_config, simple_config,
+            interface_yang_name, dataplane_yang_name, vrrp_yang_name):
+        assert keepalived_config.get_rfc_mapping("dp0vrrp1") is None
+        intf = simple_config[interface_yang_name][dataplane_yang_name][0]
+        intf[vrrp_yang_name]["vrrp-group"][0]["rfc-compatibility"] = [None]
+        keepalived_config.update(copy.deepcopy(simple_config))
+        assert keepalived_config.get_rfc_mapping("dp0vrrp1") == \
+            ("dp0p1s1", 1)
+        assert keepalived_config.get_rfc_mapping("dp0p1s1") == ("", 0)
+
+    def test_write_config_unchanged(
+            self, mock_pydbus, tmp_file_keepalived_config_no_write,
+            simple_config):
+        keepalived = tmp_file_keepalived_config_no_write
+        keepalived.update(copy.deepcopy(simple_config))
+
+        expected = True
+        assert keepalived.write_config() == expected
+
+        keepalived.update(copy.deepcopy(simple_config))
+        expected = False
+        assert keepalived.write_config() == expected
+
+    def test_write_config_replaces_file(
+            self, mock_pydbus, tmp_path,
+            tmp_file_keepalived_config_no_write, simple_config):
+        keepalived = tmp_file_keepalived_config_no_write
+        keepalived.write_config()
+        old_inode = os.stat(keepalived.config_file).st_ino
+        keepalived.update(copy.deepcopy(simple_config))
+        assert keepalived.write_config()
+        assert os.stat(keepalived.config_file).st_ino != old_inode
+        assert os.listdir(tmp_path) == ["keepalived.conf"]
+        assert keepalived.read_config() == keepalived.render_config()
+
+    def test_write_config_unchanged_not_read(
+            self, mock_pydbus, monkeypatch,
+            tmp_file_keepalived_config_no_write, simple_config):
+        keepalived = tmp_file_keepalived_config_no_write
+        keepalived.update(copy.deepcopy(simple_config))
+        assert keepalived.write_config()
+
+        def fail(*args):
+            raise AssertionError("config file read again")
+        monkeypatch.setattr(keepalived, "read_config", fail)
+        keepalived.update(copy.deepcopy(simple_config))
+        assert not keepalived.write_config()
+
+    def test_write_config_sync_writes(
+            self, mock_pydbus, monkeypatch,
+            tmp_file_keepalived_config_no_write, simple_config):
+        keepalived = tmp_file_keepalived_config_no_write
+        synced = []
+        monkeypatch.setattr(os, "fsync", synced.append)
+        keepalived.update(copy.deepcopy(simple_config))
+        keepalived.write_config()
+        assert synced == []
+        keepalived.sync_writes = True
+        keepalived.update({})
+        keepalived.write_config()
+        assert len(synced) == 2
+
+    def test_write_config_failure_removes_temp_file(
+            self, mock_pydbus, monkeypatch, tmp_path,
+            tmp_file_keepalived_config_no_write):
+        keepalived = tmp_file_keepalived_config_no_write
+
+        def fail(*args):
+            raise OSError("rename failed")
+        monkeypatch.setattr(os, "replace", fail)
+        with pytest.raises(OSError):
+            keepalived.write_config()
+        assert os.listdir(tmp_path) == []
+
+    def test_get_vci_format_dict_served_from_model(
+            self, mock_pydbus, monkeypatch,
+            tmp_file_keepalived_config_no_write, simple_config):
+        keepalived = tmp_file_keepalived_config_no_write
+        convert = keepalived.convert_to_vci_format_dict
+        parsed = []
+
+        def count_parse(config_string):
+            parsed.append(config_string)
+            return convert(config_string)
+        monkeypatch.setattr(
+            keepalived, "convert_to_vci_format_dict", count_parse)
+        keepalived.update(copy.deepcopy(simple_config))
+        keepalived.write_config()
+        assert parsed == []
+        expected = simple_config
+        result = keepalived.get_vci_format_dict()
+        assert len(parsed) == 1
+        assert result == expected
+        result[util.INTERFACE_YANG_NAME].clear()
+        assert keepalived.get_vci_format_dict() == expected
+        assert len(parsed) == 1
+
+    def test_get_vci_format_dict_disabled_group(
+            self, mock_pydbus, tmp_file_keepalived_config_no_write,
+            disabled_vrrp_config):
+        keepalived = tmp_file_keepalived_config_no_write
+        keepalived.update(copy.deepcopy(disabled_vrrp_config))
+        keepalived.write_config()
+        assert keepalived.get_vci_format_dict() == {}
+
+    def test_get_vci_format_dict_file_replaced(
+            self, mock_pydbus, tmp_file_keepalived_config_no_write,
+            simple_config, autogeneration_string):
+        keepalived = tmp_file_keepalived_config_no_write
+        keepalived.update(copy.deepcopy(simple_config))
+        keepalived.write_config()
+        assert keepalived.get_vci_format_dict() != {}
+        replacement = f"{keepalived.config_file}.new"
+        with open(replacement, "w") as file_handle:
+            file_handle.write(autogeneration_string)
+        os.replace(replacement, keepalived.config_file)
+        assert keepalived.get_vci_format_dict() == {}
+
+    def test_get_vci_format_dict_no_file(
+            self, non_default_keepalived_config):
+        with pytest.raises(FileNotFoundError):
+            non_default_keepalived_config.get_vci_format_dict()
+
+    @pytest.mark.parametrize(
+        "change,expected",
+        [
+            (None, False),
+            ("start-delay", False),
+            ("priority", True),
+            ("new-group", True),
+            ("sync-group", True),
+            ("rfc-compatibility", True),
+        ]
+    )
+    def test_write_config_needs_reload(
+            self, mock_pydbus, tmp_file_keepalived_config_no_write,
+            simple_config, change, expected):
+        keepalived = tmp_file_keepalived_config_no_write
+        keepalived.update(copy.deepcopy(simple_config))
+        assert keepalived.write_config()
+
+        new_config = copy.deepcopy(simple_config)
+        intf_types = new_config[util.INTERFACE_YANG_NAME]
+        vrrp_conf = intf_types[util.DATAPLANE_YANG_NAME][0][
+            util.VRRP_YANG_NAME]
+        group = vrrp_conf[util.YANG_VRRP_GROUP][0]
+        if change == "start-delay":
+            vrrp_conf[util.YANG_START_DELAY] = 60
+        elif change == "priority":
+            group[util.YANG_PRIORITY] = 150
+        elif change == "new-group":
+            new_group = copy.deepcopy(group)
+            new_group[util.YANG_TAGNODE] = 2
+            vrrp_conf[util.YANG_VRRP_GROUP].append(new_group)
+        elif change == "sync-group":
+            group[util.YANG_SYNC_GROUP] = "SYNC1"
+        elif change == "rfc-compatibility":
+            group[util.YANG_RFC] = [None]
+        keepalived.update(new_config)
+        assert keepalived.write_config() == expected
+
     def test_write_config_file_exist(
             self, tmp_path, tmp_file_keepalived_config_no_write):
         file_path = Path(f"{tmp_path}/keepalived.conf")
@@ -296,6 +580,17 @@ class TestKeepalivedConfigFile:
         expected = file_path.exists()
         assert result == expected
 
+    def test_shutdown_forgets_groups(
+            self, mock_pydbus, tmp_file_keepalived_config_no_write,
+            simple_config):
+        keepalived = tmp_file_keepalived_config_no_write
+        keepalived.update(copy.deepcopy(simple_config))
+        keepalived.write_config()
+        keepalived.shutdown()
+        assert len(keepalived.instances) == 0
+        keepalived.update(copy.deepcopy(simple_config))
+        assert keepalived.last_update_diff.added == {"vyatta-dp0p1s1-1"}
+
     @pytest.mark.parametrize(
         "expected,config_block",
         [
@@ -4,6 +4,8 @@
 
 from pathlib import Path
 
+import pytest
+
 
 class TestKeepalivedDbusControl:
 
@@ -104,6 +106,32 @@ class TestKeepalivedDbusControl:
         expected = True
         assert process_control.dump_keepalived_data() == expected
 
+    @pytest.mark.parametrize(
+        "ttl,expected", [(60, 1), (0, 2)], ids=["Reused", "No TTL"])
+    def test_dump_keepalived_data_ttl(
+            self, mock_pydbus, tmp_path, monkeypatch, ttl, expected):
+        import vyatta.vrrp_vci.keepalived.dbus.process_control as process_ctrl
+        import vyatta.vrrp_vci.keepalived.util as util
+        util.FILE_PATH_KEEPALIVED_DATA = f"{tmp_path}/keepalived.data"
+        monkeypatch.setattr(util, "KEEPALIVED_DUMP_TTL", ttl)
+        process_control = process_ctrl.ProcessControl()
+        process_control.keepalived_proxy_obj.SubState = "running"
+        dumps = []
+
+        class VrrpProcess:
+            def PrintData(self):  # noqa: N802
+                dumps.append(True)
+                with open(util.FILE_PATH_KEEPALIVED_DATA, "w") as file_obj:
+                    file_obj.write("test")
+        process_control.vrrp_proxy_process = VrrpProcess()
+
+        assert process_control.dump_keepalived_data()
+        assert process_control.dump_keepalived_data()
+        assert len(dumps) == expected
+        with process_control.open_dump_file(
+                util.FILE_PATH_KEEPALIVED_DATA) as file_obj:
+            assert file_obj.read() == "test"
+
     def test_dump_keepalived_stats(
             self, mock_pydbus, tmp_path):
         import vyatta.vrrp_vci.keepalived.dbus.process_control as process_ctrl
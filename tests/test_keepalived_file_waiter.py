@@ -0,0 +1,54 @@
+# Copyright (c) 2021 AT&T Intellectual Property.
+# All rights reserved.
+# SPDX-License-Identifier: GPL-2.0-only.
+
+import threading
+import time
+
+import pytest
+
+
+def write_later(file_path, delay):
+    def write():
+        time.sleep(delay)
+        with open(file_path, "w") as file_obj:
+            file_obj.write("test")
+    thread = threading.Thread(target=write)
+    thread.start()
+    return thread
+
+
+class TestKeepalivedFileWaiter:
+
+    @pytest.mark.parametrize("inotify", [True, False],
+                             ids=["inotify", "polling"])
+    def test_wait_for_write(self, tmp_path, monkeypatch, inotify):
+        import vyatta.vrrp_vci.keepalived.file_waiter as file_waiter
+        if not inotify:
+            monkeypatch.setattr(file_waiter, "_get_libc", lambda: None)
+        file_path = f"{tmp_path}/keepalived.data"
+        with file_waiter.FileWaiter(file_path) as waiter:
+            thread = write_later(file_path, 0.05)
+            start = time.monotonic()
+            assert waiter.wait(3)
+            assert time.monotonic() - start < 1
+        thread.join()
+
+    @pytest.mark.parametrize("inotify", [True, False],
+                             ids=["inotify", "polling"])
+    def test_wait_timeout(self, tmp_path, monkeypatch, inotify):
+        import vyatta.vrrp_vci.keepalived.file_waiter as file_waiter
+        if not inotify:
+            monkeypatch.setattr(file_waiter, "_get_libc", lambda: None)
+        file_path = f"{tmp_path}/keepalived.data"
+        with file_waiter.FileWaiter(file_path) as waiter:
+            start = time.monotonic()
+            assert not waiter.wait(0.05)
+            assert time.monotonic() - start < 1
+
+    def test_wait_ignores_other_files(self, tmp_path):
+        import vyatta.vrrp_vci.keepalived.file_waiter as file_waiter
+        file_path = f"{tmp_path}/keepalived.data"
+        with file_waiter.FileWaiter(file_path) as waiter:
+            write_later(f"{tmp_path}/keepalived.stats", 0).join()
+            assert not waiter.wait(0.05)
@@ -0,0 +1,51 @@
+# Copyright (c) 2021 AT&T Intellectual Property.
+# All rights reserved.
+# SPDX-License-Identifier: GPL-2.0-only.
+
+
+class TestKeepalivedInstanceRegistry:
+
+    def test_add_and_lookup(self):
+        import vyatta.vrrp_vci.keepalived.instance_registry as registry
+        instances = registry.InstanceRegistry()
+        first = instances.add("dp0p1s1.10", "1", 4, None, "conn-1")
+        second = instances.add("dp0p1s1_10", 2, 6, None, "conn-2")
+        assert first.name == "vyatta-dp0p1s1.10-1"
+        assert second.intf == "dp0p1s1.10"
+        assert len(instances) == 2
+        assert "vyatta-dp0p1s1.10-2" in instances
+        assert instances.get("vyatta-dp0p1s1_10-1") == first
+        assert instances.find("dp0p1s1_10", "2") == second
+        assert instances.find("dp0p1s1.10", 2, 4) is None
+        assert instances.find("dp0p1s1.10", "bad") is None
+        assert instances.on_interface("dp0p1s1_10") == [first, second]
+        assert instances.connections == {
+            "vyatta-dp0p1s1.10-1": "conn-1",
+            "vyatta-dp0p1s1.10-2": "conn-2",
+        }
+
+    def test_add_replaces(self):
+        import vyatta.vrrp_vci.keepalived.instance_registry as registry
+        instances = registry.InstanceRegistry()
+        instances.add("dp0p1s1", 1, 4, None, "old")
+        new = instances.add("dp0p1s1", 1, 6, None, "new")
+        assert len(instances) == 1
+        assert instances.on_interface("dp0p1s1") == [new]
+        assert instances.find("dp0p1s1", 1).connection == "new"
+
+    def test_configured_af_type(
+            self, tmp_path, autogeneration_string,
+            dataplane_vif_group_keepalived_config,
+            generic_ipv6_group_keepalived_config):
+        import vyatta.vrrp_vci.keepalived.instance_registry as registry
+        config_file = tmp_path / "keepalived.conf"
+        config_file.write_text(
+            autogeneration_string + dataplane_vif_group_keepalived_config +
+            generic_ipv6_group_keepalived_config
+        )
+        assert registry.configured_af_type(
+            str(config_file), "dp0p1s1_10", "2") == 4
+        assert registry.configured_af_type(
+            str(config_file), "dp0p1s1", 1) == 6
+        assert registry.configured_af_type(
+            str(config_file), "dp0p1s1", 2) is None
@@ -0,0 +1,37 @@
+# Copyright (c) 2021 AT&T Intellectual Property.
+# All rights reserved.
+# SPDX-License-Identifier: GPL-2.0-only.
+
+import pytest
+
+
+class TestKeepalivedInstrumentation:
+
+    def test_timer(self, monkeypatch):
+        import vyatta.vrrp_vci.keepalived.instrumentation as instrumentation
+        clock = iter([1.0, 1.5, 2.0, 2.25])
+        monkeypatch.setattr(
+            instrumentation.time, "perf_counter", lambda: next(clock))
+        metrics = instrumentation.Instrumentation()
+        with metrics.timer("config.write"):
+            pass
+        with pytest.raises(ValueError):
+            with metrics.timer("config.write"):
+                raise ValueError
+        assert metrics.snapshot()["phases"] == {
+            "config.write": {
+                "count": 2, "total": 0.75, "last": 0.25, "max": 0.5
+            }
+        }
+
+    def test_counters_and_reset(self):
+        import vyatta.vrrp_vci.keepalived.instrumentation as instrumentation
+        metrics = instrumentation.Instrumentation()
+        metrics.count("dbus-calls")
+        metrics.count("dbus-calls", 2)
+        metrics.record("state.dbus", 0.1)
+        assert metrics.snapshot()["counters"] == {"dbus-calls": 3}
+        metrics.reset()
+        snapshot = metrics.snapshot()
+        assert snapshot["counters"] == {}
+        assert snapshot["phases"] == {}
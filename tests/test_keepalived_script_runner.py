@@ -0,0 +1,81 @@
+# Copyright (c) 2021 AT&T Intellectual Property.
+# All rights reserved.
+# SPDX-License-Identifier: GPL-2.0-only.
+
+import threading
+import types
+
+import pytest
+
+
+class TimeoutExpired(Exception):
+    pass
+
+
+@pytest.fixture
+def fake_run(monkeypatch):
+    import vyatta.vrrp_vci.keepalived.script_runner as script_runner
+    calls = []
+    release = threading.Event()
+    release.set()
+
+    def run(argv, timeout=None, **kwargs):
+        release.wait()
+        calls.append(argv)
+        if argv[0] == "slow":
+            raise TimeoutExpired()
+        if argv[0] == "missing":
+            raise OSError("No such file or directory")
+        return types.SimpleNamespace(returncode=int(argv[0] == "false"))
+
+    monkeypatch.setattr(script_runner, "subprocess", types.SimpleNamespace(
+        run=run, DEVNULL=None, TimeoutExpired=TimeoutExpired,
+        SubprocessError=Exception
+    ))
+    run.calls = calls
+    run.release = release
+    return run
+
+
+class TestKeepalivedScriptRunner:
+
+    def test_batches_run_in_order_per_key(self, fake_run):
+        from vyatta.vrrp_vci.keepalived.script_runner import ScriptRunner
+        runner = ScriptRunner(max_workers=4)
+        fake_run.release.clear()
+        for state in ("MASTER", "BACKUP", "FAULT"):
+            runner.submit("vyatta-dp0p1s1-1", [
+                ["script1", state], ["script2", state]
+            ])
+        fake_run.release.set()
+        runner.shutdown()
+
+        assert fake_run.calls == [
+            ["script1", "MASTER"], ["script2", "MASTER"],
+            ["script1", "BACKUP"], ["script2", "BACKUP"],
+            ["script1", "FAULT"], ["script2", "FAULT"],
+        ]
+        assert runner._queued == 0
+
+    def test_submit_does_not_block(self, fake_run):
+        from vyatta.vrrp_vci.keepalived.script_runner import ScriptRunner
+        runner = ScriptRunner(max_workers=1)
+        fake_run.release.clear()
+        for group in range(1, 201):
+            runner.submit(f"vyatta-dp0p1s1-{group}", [["script"]])
+        assert fake_run.calls == []
+        fake_run.release.set()
+        runner.shutdown()
+        assert len(fake_run.calls) == 200
+
+    def test_failures_logged(self, fake_run, caplog):
+        from vyatta.vrrp_vci.keepalived.script_runner import ScriptRunner
+        runner = ScriptRunner(timeout=5)
+        runner.submit("vyatta-dp0p1s1-1", [
+            ["slow"], ["missing"], ["false"], ["true"]
+        ])
+        runner.shutdown()
+        assert fake_run.calls == [["slow"], ["missing"], ["false"], ["true"]]
+        assert runner._queued == 0
+        assert "slow killed after running for 5 seconds" in caplog.text
+        assert "Failed to run missing" in caplog.text
@@ -0,0 +1,113 @@
+# Copyright (c) 2021 AT&T Intellectual Property.
+# All rights reserved.
+# SPDX-License-Identifier: GPL-2.0-only.
+
+import pytest
+
+import vyatta.vrrp_vci.keepalived.util as util
+
+
+@pytest.fixture
+def counted_get_all(mock_pydbus, monkeypatch):
+    calls = []
+    get_all = mock_pydbus.GetAll
+
+    def counting_get_all(self, interface_name, timeout=None):  # noqa: N802
+        calls.append(interface_name)
+        return get_all(self, interface_name, timeout)
+    monkeypatch.setattr(mock_pydbus, "GetAll", counting_get_all)
+    util.VRRP_INSTANCE_DBUS_INTF_NAME = "dp0p1s1"
+    return calls
+
+
+class TestKeepalivedStateCache:
+
+    def _connection(self):
+        import vyatta.vrrp_vci.keepalived.dbus.system_bus as system_bus
+        import vyatta.vrrp_vci.keepalived.dbus.vrrp_group_connection \
+            as group_conn
+        return group_conn.VrrpConnection(
+            "dp0p1s1", "1", 4, system_bus.get_system_bus()
+        )
+
+    def test_get_states_cached(self, counted_get_all, instance_state):
+        from vyatta.vrrp_vci.keepalived.dbus.state_cache import StateCache
+        cache = StateCache()
+        conn = self._connection()
+        assert cache.get_states([conn]) == [instance_state]
+        calls = len(counted_get_all)
+        assert cache.get_states([conn]) == [instance_state]
+        assert len(counted_get_all) == calls
+
+    def test_get_states_returns_copy(self, counted_get_all):
+        from vyatta.vrrp_vci.keepalived.dbus.state_cache import StateCache
+        cache = StateCache()
+        conn = self._connection()
+        cache.get_states([conn])[0][util.YANG_TAGNODE] = "2"
+        assert cache.get_states([conn])[0][util.YANG_TAGNODE] == "1"
+
+    def test_status_change_updates_group(self, counted_get_all):
+        from vyatta.vrrp_vci.keepalived.dbus.state_cache import StateCache
+        cache = StateCache()
+        conn = self._connection()
+        cache.get_states([conn])
+        calls = len(counted_get_all)
+        cache._status_changed(
+            util.KEEPALIVED_DBUS_INTF_NAME, conn.dbus_path,
+            util.VRRP_INSTANCE_DBUS_INTF_NAME,
+            util.DBUS_STATUS_CHANGE_SIGNAL, (1,)
+        )
+        state = cache.get_states([conn])[0][util.YANG_INSTANCE_STATE]
+        assert state[util.YANG_STATE] == "BACKUP"
+        assert isinstance(state[util.YANG_LAST_TRANSITION], int)
+        assert state[util.YANG_LAST_TRANSITION] > 0
+        assert len(counted_get_all) == calls
+
+        cache._status_changed(
+            util.KEEPALIVED_DBUS_INTF_NAME, conn.dbus_path,
+            util.VRRP_INSTANCE_DBUS_INTF_NAME,
+            util.DBUS_STATUS_CHANGE_SIGNAL, (99,)
+        )
+        cache.get_states([conn])
+        assert len(counted_get_all) == calls + 1
+
+    def test_status_change_unknown_group(self, counted_get_all):
+        from vyatta.vrrp_vci.keepalived.dbus.state_cache import StateCache
+        cache = StateCache()
+        cache._status_changed(
+            util.KEEPALIVED_DBUS_INTF_NAME,
+            f"{util.VRRP_INSTANCE_DBUS_PATH}/dp0p1s2/1/IPv4",
+            util.VRRP_INSTANCE_DBUS_INTF_NAME,
+            util.DBUS_STATUS_CHANGE_SIGNAL, (2,)
+        )
+        assert counted_get_all == []
+
+    def test_reload_resyncs(self, counted_get_all):
+        from vyatta.vrrp_vci.keepalived.dbus.state_cache import StateCache
+        cache = StateCache()
+        conn = self._connection()
+        cache.get_states([conn])
+        calls = len(counted_get_all)
+        cache._reloaded()
+        assert len(counted_get_all) == calls + 1
+
+    def test_resync_forgets_removed_groups(
+            self, counted_get_all, monkeypatch):
+        import vyatta.vrrp_vci.keepalived.dbus.state_cache as state_cache
+        cache = state_cache.StateCache()
+        conn = self._connection()
+        cache.get_states([conn])
+        monkeypatch.setattr(
+            state_cache, "get_instance_states",
+            lambda connections: [None] * len(connections))
+        cache._reloaded()
+        assert cache._states == {}
+        assert cache._connections == {}
+
+    def test_name_vanished_clears(self, counted_get_all):
+        from vyatta.vrrp_vci.keepalived.dbus.state_cache import StateCache
+        cache = StateCache()
+        conn = self._connection()
+        cache.get_states([conn])
+        cache._name_vanished(util.KEEPALIVED_DBUS_INTF_NAME)
+        assert cache._states == {}
@@ -0,0 +1,61 @@
+# Copyright (c) 2021 AT&T Intellectual Property.
+# All rights reserved.
+# SPDX-License-Identifier: GPL-2.0-only.
+
+import vyatta.vrrp_vci.keepalived.util as util
+
+
+class TestKeepalivedSystemBus:
+
+    def test_bus_is_shared(self, mock_pydbus):
+        import vyatta.vrrp_vci.keepalived.dbus.system_bus as system_bus
+        assert system_bus.get_system_bus() is system_bus.get_system_bus()
+        assert system_bus.get_systemd_proxy() is \
+            system_bus.get_systemd_proxy()
+
+    def test_unit_loaded_once(self, mock_pydbus):
+        import vyatta.vrrp_vci.keepalived.dbus.system_bus as system_bus
+        systemd_proxy = system_bus.get_systemd_proxy()
+        calls = []
+        load_unit = systemd_proxy.LoadUnit
+
+        def counting_load_unit(service_file):
+            calls.append(service_file)
+            return load_unit(service_file)
+        systemd_proxy.LoadUnit = counting_load_unit
+
+        first = system_bus.get_unit("keepalived.service")
+        second = system_bus.get_unit("keepalived.service")
+        assert first is second
+        assert calls == ["keepalived.service"]
+
+    def test_keepalived_proxies_dropped_on_vanish(self, mock_pydbus):
+        import vyatta.vrrp_vci.keepalived.dbus.system_bus as system_bus
+        proxy = system_bus.get_keepalived_proxy(
+            util.VRRP_PROCESS_DBUS_INTF_PATH
+        )
+        assert proxy is system_bus.get_keepalived_proxy(
+            util.VRRP_PROCESS_DBUS_INTF_PATH
+        )
+        generation = system_bus.generation()
+        system_bus._keepalived_vanished(util.KEEPALIVED_DBUS_INTF_NAME)
+        assert system_bus.generation() == generation + 1
+        assert proxy is not system_bus.get_keepalived_proxy(
+            util.VRRP_PROCESS_DBUS_INTF_PATH
+        )
+
+    def test_group_connection_reactivates_on_vanish(self, mock_pydbus):
+        import vyatta.vrrp_vci.keepalived.dbus.system_bus as system_bus
+        import vyatta.vrrp_vci.keepalived.dbus.vrrp_group_connection \
+            as group_conn
+        conn = group_conn.VrrpConnection(
+            "dp0p1s1", "1", 4, system_bus.get_system_bus()
+        )
+        util.VRRP_INSTANCE_DBUS_INTF_NAME = "dp0p1s1"
+        conn.get_instance_state()
+        proxy = conn.vrrp_group_proxy
+        conn.get_instance_state()
+        assert conn.vrrp_group_proxy is proxy
+        system_bus._keepalived_vanished(util.KEEPALIVED_DBUS_INTF_NAME)
+        conn.get_instance_state()
+        assert conn.vrrp_group_proxy is not proxy
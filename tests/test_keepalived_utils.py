@@ -249,6 +249,50 @@ class TestKeepalivedUtils:
             assert util.find_config_value(block, search_string) \
                 == expected["Value"]
 
+    @pytest.mark.parametrize(
+        "config_list",
+        [
+            pytest.lazy_fixture("autogeneration_config_block"),
+            pytest.lazy_fixture("multiple_group_keepalived_config_block"),
+            pytest.lazy_fixture("complex_keepalived_config_block"),
+            [[
+                line.strip() for line in
+                "VRRP Version = 2\n   Virtual IP = 1\nTracked routes = 1\n"
+                "Received: 0\nstate   BACKUP  \nuse_vmac\n".splitlines()
+            ]],
+        ],
+        ids=["Global defs", "Multiple instances", "Complex instance",
+             "Data file"]
+    )
+    def test_config_block_index_matches_search(self, config_list):
+        regex_chars = set(".^$*+?{}[]\\|()")
+        for block in config_list:
+            index = util.ConfigBlockIndex(block)
+            assert index == block
+            terms = {
+                line[:end] for line in block
+                for end in range(1, len(line) + 1)
+                if not regex_chars & set(line[:end])
+            }
+            terms.add("missing_key")
+            for term in terms:
+                try:
+                    expected = util.find_config_value(block, term)
+                except ValueError:
+                    with pytest.raises(ValueError):
+                        util.find_config_value(index, term)
+                else:
+                    assert util.find_config_value(index, term) == expected
+
+    def test_config_block_index_append(self):
+        index = util.ConfigBlockIndex(["priority 200", "priority 100"])
+        assert util.find_config_value(index, "priority") == "200"
+        with pytest.raises(ValueError):
+            index.find("sync_group")
+        index.append("sync_group TEST")
+        assert index.find("sync_group") == "TEST"
+        assert util.ConfigBlockIndex.from_block(index) is index
+
     @pytest.mark.parametrize(
         "config_list,search_string,expected",
         [
@@ -395,3 +439,46 @@ class TestKeepalivedUtils:
     )
     def test_elapsed_time(self, time_delta, expected):
         assert util.elapsed_time(time_delta) == expected
+
+    @pytest.mark.parametrize(
+        "failing,echo,expected_retries,expected",
+        [
+            (set(), True, [],
+             [("cmd1", True), ("cmd2", True), ("cmd3", True)]),
+            ({"cmd2"}, True, ["cmd2", "cmd3"],
+             [("cmd1", True), ("cmd2", False), ("cmd3", True)]),
+            ({"cmd2"}, False, ["cmd1", "cmd2", "cmd3"],
+             [("cmd1", True), ("cmd2", False), ("cmd3", True)]),
+        ],
+        ids=["Batch succeeds", "Batch fails", "Batch fails without echo"]
+    )
+    def test_call_vtysh_batch(
+            self, monkeypatch, failing, echo, expected_retries, expected):
+        import types
+
+        class CalledProcessError(Exception):
+            pass
+        runs = []
+
+        def run(argv, check=False, stdout=None, universal_newlines=False):
+            runs.append(argv)
+            cmds = argv[3::2] if argv[1] == "-E" else argv[2:]
+            output = []
+            for cmd in cmds:
+                if echo:
+                    output.append(f"vyatta# {cmd}")
+                if cmd in failing:
+                    if check:
+                        raise CalledProcessError()
+                    return types.SimpleNamespace(
+                        returncode=1, stdout="\n".join(output))
+            return types.SimpleNamespace(
+                returncode=0, stdout="\n".join(output))
+        monkeypatch.setattr(util, "subprocess", types.SimpleNamespace(
+            run=run, PIPE=-1, CalledProcessError=CalledProcessError,
+            CompletedProcess=types.SimpleNamespace))
+
+        assert util.call_vtysh_batch(["cmd1", "cmd2", "cmd3"]) == expected
+        assert runs[0] == [
+            util.VTYSH_PATH, "-E", "-c", "cmd1", "-c", "cmd2", "-c", "cmd3"]
+        assert [argv[2] for argv in runs[1:]] == expected_retries
@@ -2,6 +2,8 @@
 # All rights reserved.
 # SPDX-License-Identifier: GPL-2.0-only.
 
+import logging
+
 import pytest
 
 import vyatta.vrrp_vci.keepalived.util as util
@@ -40,6 +42,28 @@ class TestKeepalivedVrrpGroupControl:
 
         assert conn.garp() is None
 
+    def test_reset_group_state_backup_logged(
+            self, mock_pydbus, monkeypatch, caplog, capsys):
+        import vyatta.vrrp_vci.keepalived.dbus.vrrp_group_connection \
+            as group_conn
+        import pydbus
+
+        get_all = mock_pydbus.GetAll
+
+        def backup_get_all(self, interface_name, timeout=None):  # noqa: N802
+            state = dict(get_all(self, interface_name, timeout))
+            state["State"] = (1, "Backup")
+            return state
+        monkeypatch.setattr(mock_pydbus, "GetAll", backup_get_all)
+        util.VRRP_INSTANCE_DBUS_INTF_NAME = "dp0p1s1"
+        conn = group_conn.VrrpConnection(
+            "dp0p1s1", "1", 4, pydbus.SystemBus())
+
+        with caplog.at_level(logging.INFO, util.LOGGING_MODULE_NAME):
+            conn.reset_group_state()
+        assert "VRRP group 1 on dp0p1s1 is already in BACKUP" in caplog.text
+        assert capsys.readouterr().out == ""
+
     def test_vif_sanitizing(
             self, mock_pydbus):
         import vyatta.vrrp_vci.keepalived.dbus.vrrp_group_connection \
@@ -51,3 +75,152 @@ class TestKeepalivedVrrpGroupControl:
 
         expected = "/org/keepalived/Vrrp1/Instance/dp0p1s1_10/1/IPv4"
         assert conn.dbus_path == expected
+
+    def test_get_instance_states(self, mock_pydbus, instance_state):
+        import vyatta.vrrp_vci.keepalived.dbus.vrrp_group_connection \
+            as group_conn
+        import pydbus
+
+        class FailingConnection:
+            instance_name = "vyatta-dp0p1s2-1"
+
+            def get_instance_state(self, timeout=None):
+                raise KeyError("State")
+
+        sysbus = pydbus.SystemBus()
+        util.VRRP_INSTANCE_DBUS_INTF_NAME = "dp0p1s1"
+        connections = [
+            group_conn.VrrpConnection("dp0p1s1", "1", 4, sysbus),
+            FailingConnection(),
+            group_conn.VrrpConnection("dp0p1s1", "1", 4, sysbus),
+        ]
+
+        expected = [instance_state, None, instance_state]
+        assert group_conn.get_instance_states(connections) == expected
+
+    def test_get_instance_states_activation_timeout(
+            self, mock_pydbus, monkeypatch):
+        import vyatta.vrrp_vci.keepalived.dbus.vrrp_group_connection \
+            as group_conn
+        import pydbus
+
+        timeouts = []
+        get_all = mock_pydbus.GetAll
+
+        def timed_get_all(self, interface_name, timeout=None):  # noqa: N802
+            timeouts.append(timeout)
+            return get_all(self, interface_name, timeout)
+        monkeypatch.setattr(mock_pydbus, "GetAll", timed_get_all)
+        util.VRRP_INSTANCE_DBUS_INTF_NAME = "dp0p1s1"
+        conn = group_conn.VrrpConnection(
+            "dp0p1s1", "1", 4, pydbus.SystemBus())
+
+        group_conn.get_instance_states([conn], timeout=2)
+        # Activating the connection and reading its state
+        assert timeouts == [2, 2]
+
+    def test_get_instance_states_timeout(self, mock_pydbus):
+        import time
+        import vyatta.vrrp_vci.keepalived.dbus.vrrp_group_connection \
+            as group_conn
+
+        class StuckConnection:
+            instance_name = "vyatta-dp0p1s1-1"
+
+            def get_instance_state(self, timeout=None):
+                time.sleep(1)
+                return {}
+
+        start = time.monotonic()
+        result = group_conn.get_instance_states(
+            [StuckConnection()], timeout=0.05)
+
+        expected = [None]
+        assert result == expected
+        assert time.monotonic() - start < 0.5
+
+    def test_send_garps(self, mock_pydbus):
+        import time
+        import vyatta.vrrp_vci.keepalived.dbus.vrrp_group_connection \
+            as group_conn
+
+        sent = []
+
+        class FakeConnection:
+            def __init__(self, name, error=None):
+                self.instance_name = name
+                self.error = error
+
+            def garp(self, timeout=None):
+                sent.append((self.instance_name, time.monotonic()))
+                if self.error is not None:
+                    raise self.error
+
+        connections = [
+            FakeConnection("vyatta-dp0p1s1-1"),
+            FakeConnection("vyatta-dp0p1s1-2", KeyError("Garp")),
+            FakeConnection("vyatta-dp0p1s1-3"),
+        ]
+        result = group_conn.send_garps(connections, rate=20)
+
+        expected = [None, "'Garp'", None]
+        assert result == expected
+        sent.sort(key=lambda call: call[1])
+        assert [call[0] for call in sent] == [
+            conn.instance_name for conn in connections]
+        # Started a twentieth of a second apart
+        assert sent[-1][1] - sent[0][1] >= 0.09
+
+    def test_legacy_notify_submits_argv(self, mock_pydbus, monkeypatch):
+        import vyatta.vrrp_vci.keepalived.dbus.vrrp_group_connection \
+            as group_conn
+        import vyatta.vrrp_vci.keepalived.util as util
+        import pydbus
+
+        submitted = []
+
+        class FakeRunner:
+            def submit(self, key, commands):
+                submitted.append((key, commands))
+        monkeypatch.setattr(group_conn, "get_script_runner", FakeRunner)
+        conn = group_conn.VrrpConnection(
+            "dp0p1s1", "1", 4, pydbus.SystemBus(),
+            [util.LEGACY_NOTIFY_IPSEC]
+        )
+        conn.current_state = util.VrrpState.BACKUP.name
+        conn.legacy_notify(util.VrrpState.MASTER.value)
+        assert submitted == [(
+            "vyatta-dp0p1s1-1",
+            [[util.LEGACY_NOTIFY_IPSEC, "INSTANCE", "vyatta-dp0p1s1-1",
+              "MASTER"]]
+        )]
+
+    def test_subscribe_instances(self, mock_pydbus, monkeypatch):
+        import vyatta.vrrp_vci.keepalived.dbus.vrrp_group_connection \
+            as group_conn
+        import pydbus
+
+        notifications = []
+        util.VRRP_INSTANCE_DBUS_INTF_NAME = "dp0p1s1"
+        sysbus = pydbus.SystemBus()
+        conn = group_conn.VrrpConnection("dp0p1s1", "1", 4, sysbus)
+        missing = group_conn.VrrpConnection("dp0p1s2", "1", 4, sysbus)
+        monkeypatch.setattr(conn, "state_change", notifications.append)
+        monkeypatch.setattr(
+            missing, "get_instance_state",
+            lambda timeout=None: {}[util.YANG_STATE]
+        )
+
+        assert group_conn.subscribe_instances([conn, missing]) == [missing]
+        assert conn.signals_subscribed
+        assert not missing.signals_subscribed
+        assert notifications == [util.VrrpState.MASTER.value]
+        signal = conn.vrrp_group_proxy.VrrpStatusChange
+        assert len(signal.callbacks) == 2
+
+        assert group_conn.subscribe_instances([conn]) == []
+        assert len(signal.callbacks) == 2
+
+        conn.unsubscribe_instance_signals()
+        assert not conn.signals_subscribed
+        assert signal.callbacks == []
@@ -0,0 +1,152 @@
+# Copyright (c) 2021 AT&T Intellectual Property.
+# All rights reserved.
+# SPDX-License-Identifier: GPL-2.0-only.
+
+import importlib.util
+import os
+import sys
+import types
+
+import pytest
+
+SCRIPTS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "scripts", "bin"
+)
+
+# Modules that make an op mode command slow to start, none of them should
+# be imported until a command needs them
+HEAVY_MODULES = [
+    "gi", "pydbus", "vci",
+    "vyatta.vrrp_vci.keepalived.config_file",
+    "vyatta.vrrp_vci.keepalived.dbus.vrrp_group_connection",
+    "vyatta.vrrp_vci.vyatta_vrrp_vci",
+]
+
+
+@pytest.fixture
+def clean_modules():
+    """
+    Let a test import modules from scratch, everything is put back the way
+    it was afterwards so other tests keep the module objects they have.
+    """
+    saved = dict(sys.modules)
+    for name in list(sys.modules):
+        if name in HEAVY_MODULES or name.split(".")[0] in ("vyatta",):
+            del sys.modules[name]
+    yield
+    sys.modules.clear()
+    sys.modules.update(saved)
+
+
+def load_script(script):
+    spec = importlib.util.spec_from_file_location(
+        script[:-3], os.path.join(SCRIPTS_DIR, script)
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class TestVyattaOpScripts:
+
+    @pytest.mark.parametrize(
+        "script",
+        ["vyatta_show_vrrp.py", "vyatta_vrrp_op_commands.py"]
+    )
+    def test_import_budget(self, clean_modules, script):
+        load_script(script)
+
+        imported = [name for name in HEAVY_MODULES if name in sys.modules]
+        assert imported == []
+
+    def test_process_control_defers_dbus(self, mock_pydbus):
+        import vyatta.vrrp_vci.keepalived.dbus.process_control \
+            as process_control
+        import vyatta.vrrp_vci.keepalived.dbus.system_bus as system_bus
+
+        pc = process_control.ProcessControl()
+        assert system_bus._sysbus is None
+        assert not pc.is_running()
+        assert system_bus._sysbus is not None
+
+    def test_resolve_connection(
+            self, mock_pydbus, monkeypatch, tmp_path, autogeneration_string,
+            generic_ipv6_group_keepalived_config):
+        import vyatta.vrrp_vci.keepalived.util as util
+
+        class FakeVci:
+            class Client:
+                pass
+
+        monkeypatch.setitem(sys.modules, "vci", FakeVci)
+        op_commands = load_script("vyatta_vrrp_op_commands.py")
+        config_file = tmp_path / "keepalived.conf"
+        monkeypatch.setattr(
+            util, "FILE_PATH_KEEPALIVED_CONFIG", str(config_file))
+        assert op_commands.resolve_connection("dp0p1s1", "1") is None
+        config_file.write_text(
+            autogeneration_string + generic_ipv6_group_keepalived_config)
+        connection = op_commands.resolve_connection("dp0p1s1", "1")
+        assert connection.dbus_path == \
+            "/org/keepalived/Vrrp1/Instance/dp0p1s1/1/IPv6"
+        assert op_commands.resolve_connection("dp0p1s1", "2") is None
+
+    def test_bgp_async(self, mock_pydbus, monkeypatch, tmp_path):
+        import vyatta.vrrp_vci.keepalived.config_file as config_file
+        import vyatta.vrrp_vci.keepalived.util as util
+
+        class FakeVci:
+            class Client:
+                pass
+
+        monkeypatch.setitem(sys.modules, "vci", FakeVci)
+
+        class FakeConfig(config_file.KeepalivedConfig):
+            def update_from_file(self):
+                pass
+
+        group_states = {"1": "MASTER", "2": "BACKUP"}
+
+        class FakeState:
+            def __init__(self, config_impl):
+                pass
+
+            def get(self):
+                groups = [
+                    {util.YANG_TAGNODE: group,
+                     util.YANG_INSTANCE_STATE: {util.YANG_STATE: state}}
+                    for group, state in group_states.items()
+                ]
+                return {util.INTERFACE_YANG_NAME: {util.DATAPLANE_YANG_NAME: [
+                    {util.YANG_TAGNODE: "dp0p1s1",
+                     util.VRRP_YANG_NAME: {util.YANG_VRRP_GROUP: groups}}
+                ]}}
+
+        sent = []
+
+        def fake_vtysh_batch(commands):
+            sent.append(commands)
+            return [(command, True) for command in commands]
+
+        monkeypatch.setattr(config_file, "KeepalivedConfig", FakeConfig)
+        monkeypatch.setitem(
+            sys.modules, "vyatta.vrrp_vci.vyatta_vrrp_vci",
+            types.SimpleNamespace(State=FakeState))
+        monkeypatch.setattr(util, "call_vtysh_batch", fake_vtysh_batch)
+        state_dir = tmp_path / "run"
+        monkeypatch.setattr(
+            util, "FILE_PATH_BGP_FAILOVER_STATES",
+            str(state_dir / "bgp-failover-states.json"))
+        op_commands = load_script("vyatta_vrrp_op_commands.py")
+
+        op_commands.bgp_async()
+        op_commands.bgp_async()
+        assert [len(commands) for commands in sent] == [2, 2]
+        group_states["2"] = "MASTER"
+        op_commands.bgp_async(changed_only=True)
+        assert sent[-1] == [
+            "clear ip bgp interface dp0p1s1 vrrp-failover vrrp-group 2 "
+            "state MASTER"
+        ]
+        assert os.listdir(state_dir) == ["bgp-failover-states.json"]
@@ -0,0 +1,108 @@
+# Copyright (c) 2021 AT&T Intellectual Property.
+# All rights reserved.
+# SPDX-License-Identifier: GPL-2.0-only.
+
+import os
+
+import pytest
+
+import vyatta.vrrp_vci.keepalived.util as util
+
+
+@pytest.fixture
+def fake_process(tmp_path, generic_group_simple_keepalived_data):
+    class FakeProcessControl:
+
+        def __init__(self):
+            self.running = True
+            self.dumps = 0
+
+        def is_running(self):
+            return self.running
+
+        def dump_keepalived_data(self):
+            self.dumps += 1
+            with open(util.FILE_PATH_KEEPALIVED_DATA, "w") as file_obj:
+                file_obj.write(generic_group_simple_keepalived_data)
+            return True
+
+        def open_dump_file(self, file_path):
+            return open(file_path, "r")
+
+    util.FILE_PATH_KEEPALIVED_DATA = f"{tmp_path}/keepalived.data"
+    return FakeProcessControl()
+
+
+@pytest.fixture
+def show_queries(fake_process):
+    from vyatta.vrrp_vci.show_query import ShowQueries
+    queries = ShowQueries(lambda: {}, model_ttl=60)
+    queries._pc = fake_process
+    return queries
+
+
+class TestVyattaShowQuery:
+
+    def test_show_interface(
+            self, calendar_fakes, show_queries, generic_group_show_detail):
+        result = show_queries.show("interface", "dp0p1s1")
+        assert result == generic_group_show_detail
+
+    def test_show_reuses_data_model(
+            self, calendar_fakes, show_queries, fake_process):
+        show_queries.show("autocomplete")
+        show_queries.show("interface", "dp0p1s1")
+        assert fake_process.dumps == 1
+        show_queries.model_ttl = 0
+        show_queries.show("interface", "dp0p1s1")
+        assert fake_process.dumps == 2
+
+    @pytest.mark.parametrize(
+        "command,expected",
+        [
+            ("summary", "VRRP is not running"),
+            ("detail", "VRRP is not running"),
+            ("autocomplete", ""),
+        ]
+    )
+    def test_show_not_running(
+            self, show_queries, fake_process, command, expected):
+        fake_process.running = False
+        assert show_queries.show(command) == expected
+
+    def test_query_server(
+            self, calendar_fakes, tmp_path, show_queries,
+            generic_group_show_detail):
+        from vyatta.vrrp_vci.show_query import ShowQueryServer, query
+        socket_path = f"{tmp_path}/run/show.sock"
+        server = ShowQueryServer(show_queries, socket_path)
+        assert os.stat(socket_path).st_mode & 0o777 == 0o600
+        server.start()
+        try:
+            result = query("interface", "dp0p1s1", socket_path=socket_path)
+            assert result == generic_group_show_detail
+            assert query("unknown", socket_path=socket_path) is None
+        finally:
+            server.stop()
+        assert query("interface", socket_path=socket_path) is None
+
+    def test_show_timing(self, show_queries):
+        from vyatta.vrrp_vci.keepalived.instrumentation import (
+            get_instrumentation
+        )
+        metrics = get_instrumentation()
+        metrics.reset()
+        metrics.record("config.write", 0.0125)
+        metrics.count("bytes-written", 2048)
+        expected = (
+            "Phase                  Count    Total (ms)   Last (ms)    "
+            "Max (ms)\n"
+            "config.write               1        12.500      12.500      "
+            "12.500\n"
+            "\n"
+            "Counter                Value\n"
+            "bytes-written           2048\n"
+            "\n"
+            "Recorded over the last 0 seconds\n"
+        )
+        assert show_queries.show("timing") == expected
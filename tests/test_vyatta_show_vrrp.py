@@ -565,6 +565,37 @@ class TestVyattaShowVrrp:
         assert vyatta.vrrp_vci.show_vrrp_cmds.convert_data_file_to_dict(
             file_content) == expected
 
+    def test_convert_data_stream_to_json(
+            self, calendar_fakes, tmp_path,
+            generic_group_rfc_sync_keepalived_data):
+        import vyatta.vrrp_vci.show_vrrp_cmds as show_cmds
+        data_file = tmp_path / "keepalived.data"
+        data_file.write_text(generic_group_rfc_sync_keepalived_data)
+        with open(data_file) as file_obj:
+            assert show_cmds.convert_data_stream_to_dict(file_obj) == \
+                show_cmds.convert_data_file_to_dict(
+                    generic_group_rfc_sync_keepalived_data)
+
+    def test_iter_data_file_is_lazy(
+            self, calendar_fakes, multiple_group_simple_keepalived_data):
+        import vyatta.vrrp_vci.show_vrrp_cmds as show_cmds
+        lines = multiple_group_simple_keepalived_data.split("\n")
+        read = []
+
+        def line_reader():
+            for line in lines:
+                read.append(line)
+                yield line
+
+        groups = show_cmds.iter_data_file(line_reader())
+        kind, name, _ = next(groups)
+        assert kind == "VRRP Instance"
+        assert name == "vyatta-dp0p1s2-1"
+        # Only the first group and the line starting the second are read
+        assert "VRRP Instance = vyatta-dp0p1s2-42" in read[-1]
+        assert len(read) < len(lines)
+        assert [name for _, name, _ in groups] == ["vyatta-dp0p1s2-42"]
+
     @pytest.mark.parametrize(
         "fakes,expected,file_content",
         [
@@ -980,3 +1011,54 @@ class TestVyattaShowVrrp:
             file_contents)
         assert vyatta.vrrp_vci.show_vrrp_cmds.show_vrrp_statistics_filters(
             json_data, intf_filter, grp_filter) == expected
+
+    @pytest.mark.parametrize(
+        "intf_filter,grp_filter",
+        [("", ""), ("dp0p1s1", ""), ("dp0p1s1", "42"), ("dp0p1s1", "7"),
+         ("dp0p1s3", "")],
+        ids=["No filter", "Filtered interface",
+             "Filtered interface and group", "Missing group",
+             "Missing interface"]
+    )
+    def test_show_vrrp_statistics_streamed_filters(
+            self, calendar_fakes, multiple_intf_keepalived_stats,
+            intf_filter, grp_filter):
+        import vyatta.vrrp_vci.show_vrrp_cmds as show_cmds
+        expected = show_cmds.show_vrrp_statistics_filters(
+            show_cmds.convert_stats_file_to_dict(
+                multiple_intf_keepalived_stats),
+            intf_filter, grp_filter)
+        json_data = show_cmds.convert_stats_stream_to_dict(
+            multiple_intf_keepalived_stats.split("\n"),
+            intf_filter, grp_filter)
+        assert show_cmds.show_vrrp_statistics_filters(
+            json_data, intf_filter, grp_filter) == expected
+
+    def test_iter_stats_file_stops_after_group(
+            self, calendar_fakes, multiple_intf_keepalived_stats):
+        import vyatta.vrrp_vci.show_vrrp_cmds as show_cmds
+        lines = multiple_intf_keepalived_stats.split("\n")
+        read = []
+
+        def line_reader():
+            for line in lines:
+                read.append(line)
+                yield line
+
+        groups = list(
+            show_cmds.iter_stats_file(line_reader(), "dp0p1s1", "42"))
+        assert [name for name, _ in groups] == \
+            ["vyatta-dp0p1s1-1", "vyatta-dp0p1s1-42"]
+        assert groups[0][1] is None
+        assert groups[1][1]["stats"]["Advertisements"]["Received"] == 100
+        assert "vyatta-dp0p1s2-2" in read[-1]
+        assert len(read) < len(lines)
+
+    def test_iter_stats_file_non_numeric_group(
+            self, calendar_fakes, multiple_intf_keepalived_stats):
+        import vyatta.vrrp_vci.show_vrrp_cmds as show_cmds
+        lines = multiple_intf_keepalived_stats.split("\n")
+
+        groups = list(show_cmds.iter_stats_file(lines, "dp0p1s1", "abc"))
+        assert groups != []
+        assert all(record is None for _, record in groups)
@@ -2,6 +2,7 @@
 # All rights reserved.
 # SPDX-License-Identifier: GPL-2.0-only
 
+import copy
 import json
 import logging
 from pathlib import Path
@@ -30,23 +31,90 @@ class TestVyattaVrrpVci:
                            mock_pydbus, test_state,
                            tmp_file_keepalived_config):
         test_state._conf_obj = tmp_file_keepalived_config
+        test_state._conf_obj.update_from_file()
         test_state.pc.keepalived_proxy_obj.SubState = "running"
         util.VRRP_INSTANCE_DBUS_INTF_NAME = "dp0p1s1"
 
         expected = complete_state_yang
         assert test_state.get() == expected
 
+    def test_vci_state_get_unregistered_group(
+            self, mock_pydbus, test_state, tmp_file_keepalived_config):
+        test_state._conf_obj = tmp_file_keepalived_config
+        test_state.pc.keepalived_proxy_obj.SubState = "running"
+        util.VRRP_INSTANCE_DBUS_INTF_NAME = "dp0p1s1"
+
+        state = test_state.get()
+        group = state[util.INTERFACE_YANG_NAME][util.DATAPLANE_YANG_NAME][
+            0][util.VRRP_YANG_NAME][util.YANG_VRRP_GROUP][0]
+        assert group[util.YANG_INSTANCE_STATE][util.YANG_STATE] == "FAULT"
+        assert len(test_state._conf_obj.instances) == 0
+
     def test_vci_state_get_with_vif(
             self, complete_state_vif_yang,
             mock_pydbus, test_state_vif,
             tmp_file_keepalived_vif_config):
         test_state_vif._conf_obj = tmp_file_keepalived_vif_config
+        test_state_vif._conf_obj.update_from_file()
         test_state_vif.pc.keepalived_proxy_obj.SubState = "running"
         util.VRRP_INSTANCE_DBUS_INTF_NAME = "dp0p1s1.10"
 
         expected = complete_state_vif_yang
         assert test_state_vif.get() == expected
 
+    def test_vci_config_set_then_get_with_vif(
+            self, mock_pydbus, test_config, test_state,
+            parent_and_vif_config, dataplane_yang_name, vrrp_yang_name):
+        expected = copy.deepcopy(parent_and_vif_config)
+        test_config.set(parent_and_vif_config)
+        assert json.loads(test_config.get()) == expected
+
+        test_state.pc.keepalived_proxy_obj.SubState = "running"
+        state = test_state.get()
+        intf_types = state[util.INTERFACE_YANG_NAME]
+        assert list(intf_types) == [dataplane_yang_name]
+        vifs = intf_types[dataplane_yang_name][0][util.VIF_YANG_NAME]
+        assert [vif["tagnode"] for vif in vifs] == ["10"]
+        assert [
+            group["tagnode"]
+            for group in vifs[0][vrrp_yang_name]["vrrp-group"]
+        ] == ["2"]
+
+    def test_vci_state_get_with_state_cache(
+            self, complete_state_yang,
+            mock_pydbus, test_state,
+            tmp_file_keepalived_config):
+        from vyatta.vrrp_vci.keepalived.dbus.state_cache import StateCache
+        test_state._conf_obj = tmp_file_keepalived_config
+        test_state._conf_obj.update_from_file()
+        test_state._state_cache = StateCache()
+        test_state.pc.keepalived_proxy_obj.SubState = "running"
+        util.VRRP_INSTANCE_DBUS_INTF_NAME = "dp0p1s1"
+
+        assert test_state.get() == complete_state_yang
+        assert test_state.get() == complete_state_yang
+        assert len(test_state._state_cache._states) == 1
+
+    def test_vci_state_get_waits_for_config(
+            self, complete_state_yang, mock_pydbus, test_state, test_config,
+            tmp_file_keepalived_config):
+        import threading
+        test_state._conf_obj = tmp_file_keepalived_config
+        test_state._conf_obj.update_from_file()
+        test_state._config = test_config
+        test_state.pc.keepalived_proxy_obj.SubState = "running"
+        util.VRRP_INSTANCE_DBUS_INTF_NAME = "dp0p1s1"
+        results = []
+        reader = threading.Thread(
+            target=lambda: results.append(test_state.get()))
+
+        with test_config.locked():
+            reader.start()
+            reader.join(0.1)
+            assert results == []
+        reader.join(5)
+        assert results == [complete_state_yang]
+
     def test_vci_state_get_not_running(
             self, mock_pydbus, test_state,
             tmp_file_keepalived_config):
@@ -86,6 +154,156 @@ class TestVyattaVrrpVci:
         expected = True
         assert conf_path.exists() == expected
 
+    def test_vci_config_set_records_timings(
+            self, mock_pydbus, test_config,
+            simple_config):
+        import vyatta.vrrp_vci.keepalived.dbus.process_control as process_ctrl
+        from vyatta.vrrp_vci.keepalived.instrumentation import (
+            get_instrumentation
+        )
+        process_control = process_ctrl.ProcessControl()
+        process_control.keepalived_proxy_obj.SubState = "running"
+        get_instrumentation().reset()
+        test_config.set(simple_config)
+        metrics = get_instrumentation().snapshot()
+        for phase in ["config.set", "config.sanitize", "config.update",
+                      "config.write", "config.reload"]:
+            assert metrics["phases"][phase]["count"] == 1
+        assert metrics["counters"]["groups-processed"] == 1
+        assert metrics["counters"]["bytes-written"] == \
+            Path(test_config._conf_obj.config_file_path()).stat().st_size
+        assert metrics["counters"]["dbus-calls"] > 0
+
+    def test_vci_rfc_intf_map_from_config(
+            self, test_config, simple_config, monkeypatch,
+            interface_yang_name, dataplane_yang_name, vrrp_yang_name):
+        import vyatta.vrrp_vci.vyatta_vrrp_vci as vyatta_vrrp_vci
+
+        def no_dbus():
+            raise AssertionError("Asked keepalived over DBus")
+        monkeypatch.setattr(vyatta_vrrp_vci, "ProcessControl", no_dbus)
+        intf = simple_config[interface_yang_name][dataplane_yang_name][0]
+        intf[vrrp_yang_name]["vrrp-group"][0]["rfc-compatibility"] = [None]
+        test_config._conf_obj.update(util.sanitize_vrrp_config(
+            copy.deepcopy(simple_config)))
+        result = vyatta_vrrp_vci.rfc_intf_map(
+            {util.RPC_RFC_INTERFACE: "dp0vrrp1"}, test_config._conf_obj)
+        assert result == {util.RPC_RFC_MAPPING_RECEIVE: "dp0p1s1",
+                          util.RPC_RFC_MAPPING_GROUP: 1}
+
+    def test_vci_send_garp_from_registry(
+            self, test_config, simple_config, monkeypatch):
+        import vyatta.vrrp_vci.vyatta_vrrp_vci as vyatta_vrrp_vci
+        sent = []
+
+        class RunningProcess:
+            def is_running(self):
+                return True
+
+        monkeypatch.setattr(vyatta_vrrp_vci, "ProcessControl", RunningProcess)
+        test_config._conf_obj.update(util.sanitize_vrrp_config(
+            copy.deepcopy(simple_config)))
+        instance = test_config._conf_obj.instances.find("dp0p1s1", 1)
+        monkeypatch.setattr(
+            instance.connection, "garp", lambda: sent.append(instance.name))
+        vyatta_vrrp_vci.send_garp(
+            {util.RPC_GARP_INTERFACE: "dp0p1s1", util.RPC_GARP_GROUP: 1},
+            test_config._conf_obj)
+        vyatta_vrrp_vci.send_garp(
+            {util.RPC_GARP_INTERFACE: "dp0p1s1", util.RPC_GARP_GROUP: 2},
+            test_config._conf_obj)
+        assert sent == ["vyatta-dp0p1s1-1"]
+
+    def test_vci_garp_instances(self, monkeypatch):
+        import vyatta.vrrp_vci.vyatta_vrrp_vci as vyatta_vrrp_vci
+        from vyatta.vrrp_vci.keepalived.instance_registry import \
+            InstanceRegistry
+
+        def group_state(state, sync_group):
+            return {
+                util.YANG_INSTANCE_STATE: {
+                    util.YANG_STATE: state,
+                    util.YANG_SYNC_GROUP: sync_group,
+                }
+            }
+
+        states = {
+            "master": group_state("MASTER", "SYNC1"),
+            "backup": group_state("BACKUP", "SYNC1"),
+            "failing": group_state("MASTER", "SYNC1"),
+            "other-sync": group_state("MASTER", "SYNC2"),
+            "no-response": None,
+        }
+        sent = []
+
+        def fake_send_garps(connections, rate):
+            sent.append((connections, rate))
+            return [None if conn == "master" else "Garp failed"
+                    for conn in connections]
+
+        monkeypatch.setattr(
+            vyatta_vrrp_vci, "get_instance_states",
+            lambda connections: [states[conn] for conn in connections])
+        monkeypatch.setattr(vyatta_vrrp_vci, "send_garps", fake_send_garps)
+        registry = InstanceRegistry()
+        for vrid, connection in enumerate(states, 1):
+            registry.add("dp0p1s1", vrid, 4, None, connection)
+
+        result = vyatta_vrrp_vci.garp_instances(list(registry), "SYNC1", 10)
+        assert sent == [(["master", "failing"], 10)]
+        assert result == [
+            {"interface": "dp0p1s1", "group": 1, "status": "sent"},
+            {"interface": "dp0p1s1", "group": 2, "status": "not-master"},
+            {"interface": "dp0p1s1", "group": 3, "status": "failed",
+             "error": "Garp failed"},
+        ]
+        result = vyatta_vrrp_vci.garp_instances(list(registry)[4:])
+        assert result == [
+            {"interface": "dp0p1s1", "group": 5, "status": "failed",
+             "error": "No response from the group"},
+        ]
+
+    def test_vci_garp_instances_queued(self, monkeypatch):
+        import threading
+        import vyatta.vrrp_vci.vyatta_vrrp_vci as vyatta_vrrp_vci
+        from vyatta.vrrp_vci.keepalived.instance_registry import \
+            InstanceRegistry
+
+        states = {
+            "master": {util.YANG_INSTANCE_STATE: {
+                util.YANG_STATE: "MASTER", util.YANG_SYNC_GROUP: ""}},
+            "backup": {util.YANG_INSTANCE_STATE: {
+                util.YANG_STATE: "BACKUP", util.YANG_SYNC_GROUP: ""}},
+        }
+        sent = []
+        done = threading.Event()
+        release = threading.Event()
+
+        def fake_send_queued_garps(connections, rate):
+            release.wait(5)
+            sent.append((connections, rate))
+            done.set()
+
+        monkeypatch.setattr(
+            vyatta_vrrp_vci, "get_instance_states",
+            lambda connections: [states[conn] for conn in connections])
+        monkeypatch.setattr(
+            vyatta_vrrp_vci, "_send_queued_garps", fake_send_queued_garps)
+        registry = InstanceRegistry()
+        for vrid, connection in enumerate(states, 1):
+            registry.add("dp0p1s1", vrid, 4, None, connection)
+
+        result = vyatta_vrrp_vci.garp_instances(
+            list(registry), rate=10, wait=False)
+        assert result == [
+            {"interface": "dp0p1s1", "group": 1, "status": "queued"},
+            {"interface": "dp0p1s1", "group": 2, "status": "not-master"},
+        ]
+        assert sent == []
+        release.set()
+        assert done.wait(5)
+        assert sent == [(["master"], 10)]
+
     def test_vci_config_set_writes_correct_config(
             self, mock_pydbus, test_config,
             simple_config, simple_keepalived_config):
@@ -130,6 +348,99 @@ class TestVyattaVrrpVci:
         expected = syncgroup_keepalived_config
         assert file_contents == expected
 
+    def test_vci_config_set_unchanged_skips_reload(
+            self, mock_pydbus, test_config, simple_config):
+        reloads = []
+        test_config.pc.keepalived_proxy_obj.SubState = "running"
+        test_config.pc.systemd_manager_intf.ReloadUnit = \
+            lambda *args: reloads.append(args)
+        test_config.set(copy.deepcopy(simple_config))
+
+        expected = 1
+        assert len(reloads) == expected
+
+        test_config.set(copy.deepcopy(simple_config))
+
+        expected = 1
+        assert len(reloads) == expected
+
+    def test_vci_config_set_start_delay_skips_reload(
+            self, mock_pydbus, test_config, simple_config):
+        import vyatta.vrrp_vci.keepalived.util as util
+        reloads = []
+        test_config.pc.keepalived_proxy_obj.SubState = "running"
+        test_config.pc.systemd_manager_intf.ReloadUnit = \
+            lambda *args: reloads.append(args)
+        test_config.set(copy.deepcopy(simple_config))
+
+        new_config = copy.deepcopy(simple_config)
+        vrrp_conf = new_config[util.INTERFACE_YANG_NAME][
+            util.DATAPLANE_YANG_NAME][0][util.VRRP_YANG_NAME]
+        vrrp_conf[util.YANG_START_DELAY] = 60
+        test_config.set(copy.deepcopy(new_config))
+
+        expected = 1
+        assert len(reloads) == expected
+        assert "start_delay 60" in test_config._conf_obj.read_config()
+
+        vrrp_conf[util.YANG_VRRP_GROUP][0][util.YANG_PRIORITY] = 150
+        test_config.set(new_config)
+
+        expected = 2
+        assert len(reloads) == expected
+
+    def test_vci_config_set_coalesced(
+            self, mock_pydbus, test_config, simple_config):
+        import vyatta.vrrp_vci.keepalived.util as util
+        reloads = []
+        test_config.coalesce_window = 60
+        test_config.pc.keepalived_proxy_obj.SubState = "running"
+        test_config.pc.systemd_manager_intf.ReloadUnit = \
+            lambda *args: reloads.append(args)
+        test_config.pc.reload_process_config = lambda: reloads.append(True)
+        for priority in (110, 120, 130):
+            new_config = copy.deepcopy(simple_config)
+            new_config[util.INTERFACE_YANG_NAME][util.DATAPLANE_YANG_NAME][
+                0][util.VRRP_YANG_NAME][util.YANG_VRRP_GROUP][0][
+                    util.YANG_PRIORITY] = priority
+            test_config.set(new_config)
+
+        expected = 1
+        assert len(reloads) == expected
+        assert "priority 110" in test_config._conf_obj.read_config()
+
+        test_config.get()
+        expected = 2
+        assert len(reloads) == expected
+        assert "priority 130" in test_config._conf_obj.read_config()
+        assert test_config._pending_timer is None
+
+    def test_vci_config_set_coalesced_timer(
+            self, mock_pydbus, test_config, simple_config):
+        test_config.coalesce_window = 0.05
+        test_config.set(copy.deepcopy(simple_config))
+        test_config.set(copy.deepcopy(simple_config))
+        timer = test_config._pending_timer
+        assert timer is not None
+        timer.join()
+        assert test_config._pending_conf is None
+        assert test_config._pending_timer is None
+
+    def test_vci_config_set_coalesced_timer_error(
+            self, mock_pydbus, test_config, simple_config):
+        test_config.coalesce_window = 0.05
+        test_config.set(copy.deepcopy(simple_config))
+
+        def fail(*args):
+            raise OSError("write failed")
+        test_config._conf_obj.write_config = fail
+        test_config.set(copy.deepcopy(simple_config))
+        test_config._pending_timer.join()
+        test_config.get()
+        with pytest.raises(OSError):
+            test_config.set(copy.deepcopy(simple_config))
+        test_config.flush()
+
     def test_vci_config_check_local_address(
             self, mock_pydbus, test_config, simple_config,
             interface_yang_name,
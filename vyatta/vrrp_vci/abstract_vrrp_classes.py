@@ -11,6 +11,10 @@ class ConfigFile(ABC):
     def update(self, new_config):
         raise NotImplementedError
 
+    @abstractmethod
+    def update_from_file(self):
+        raise NotImplementedError
+
     @abstractmethod
     def write_config(self):
         raise NotImplementedError
@@ -23,6 +27,14 @@ class ConfigFile(ABC):
     def convert_to_vci_format(self, config_string):
         raise NotImplementedError
 
+    @abstractmethod
+    def get_vci_format(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_vci_format_dict(self):
+        raise NotImplementedError
+
     @abstractmethod
     def config_file_path(self):
         raise NotImplementedError
@@ -31,6 +43,15 @@ class ConfigFile(ABC):
     def impl_name(self):
         raise NotImplementedError
 
+    @property
+    @abstractmethod
+    def instances(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_rfc_mapping(self, transmit_intf):
+        raise NotImplementedError
+
     @abstractmethod
     def shutdown(self):
         raise NotImplementedError
@@ -7,20 +7,61 @@ Vyatta VCI component to configure keepalived to provide VRRP functionality
 """
 
 import contextlib
+import copy
+import hashlib
 import json
+import logging
 import os
+import re
+import tempfile
 from decimal import Decimal
 from enum import Enum
-from typing import Any, Dict, List, Union
-
-import pydbus
+from typing import Any, Dict, List, NamedTuple, Optional, Pattern, Set, \
+    Tuple, Union
 
+import vyatta.vrrp_vci.keepalived.dbus.system_bus as system_bus
 import vyatta.vrrp_vci.keepalived.util as util
 from vyatta.vrrp_vci.abstract_vrrp_classes import ConfigFile
 from vyatta.vrrp_vci.keepalived.dbus.vrrp_group_connection import (
     VrrpConnection
 )
-from vyatta.vrrp_vci.keepalived.vrrp import VrrpGroup
+from vyatta.vrrp_vci.keepalived.instance_registry import (
+    InstanceRegistry, RegisteredInstance, get_instance_name
+)
+from vyatta.vrrp_vci.keepalived.instrumentation import (
+    Instrumentation, get_instrumentation
+)
+from vyatta.vrrp_vci.keepalived.vrrp import (
+    MAX_INTF_NAME_LENGTH, VrrpGroup, vmac_intf_name
+)
+
+
+# keepalived only reads start delays when it starts, so a change to them
+# alone doesn't need a reload
+_START_DELAY_LINE: Pattern = re.compile(r"^\s*start_delay \d+$", re.MULTILINE)
+
+
+def _config_digest(config_string: str) -> str:
+    return hashlib.sha256(config_string.encode()).hexdigest()
+
+
+def _reload_digest(config_string: str) -> str:
+    """Digest of the parts of the config a reload picks up"""
+    return _config_digest(_START_DELAY_LINE.sub("", config_string))
+
+
+class ConfigDiff(NamedTuple):
+    """
+    Instance names that differ between two consecutive calls to
+    KeepalivedConfig.update()
+    """
+    added: Set[str]
+    removed: Set[str]
+    changed: Set[str]
+    unchanged: Set[str]
+
+    def has_changes(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
 
 
 class KeepalivedConfig(ConfigFile):
@@ -129,7 +170,10 @@ class KeepalivedConfig(ConfigFile):
 
     def __init__(
             self,
-            config_file_path: str = "/etc/keepalived/keepalived.conf"
+            config_file_path: str = util.FILE_PATH_KEEPALIVED_CONFIG,
+            sync_writes: bool = False,
+            vmac_table_path: Optional[str] = None,
+            vmac_table_writable: bool = True
     ) -> None:
         """
         KeepalivedConfig constructor
@@ -138,6 +182,18 @@ class KeepalivedConfig(ConfigFile):
             config_file_path (str):
                 Path to where the keepalived config file path is, defaults
                 to the standard file but can be overwritten.
+            sync_writes (bool):
+                fsync the config file and its directory every time the
+                file is replaced, defaults to False.
+            vmac_table_path (str):
+                Path to the file recording the VMAC interface number given
+                to each RFC compatible group, defaults to
+                util.FILE_PATH_VMAC_TABLE.
+            vmac_table_writable (bool):
+                Whether this object owns the VMAC table. Only the VCI
+                component writes it, everything else passes False so the
+                table is read fresh on every update and never written or
+                removed.
 
         Attributes:
             config_string (str):
@@ -170,12 +226,29 @@ global_defs {
         enable_snmp_rfc
         dynamic_interfaces allow_if_changes
 }"""
+        self.log: logging.Logger = logging.getLogger(util.LOGGING_MODULE_NAME)
         self.config_file: str = config_file_path
+        self.sync_writes: bool = sync_writes
         self.implementation_name: str = "Keepalived"
         self._vrrp_instances: List[VrrpGroup] = []
         self._sync_instances: Dict[str, List[str]] = {}
-        self._rfc_interfaces: int = 0
-        self._vrrp_connections: Dict[str, VrrpConnection] = {}
+        self.vmac_table_path: str = \
+            vmac_table_path or util.FILE_PATH_VMAC_TABLE
+        self.vmac_table_writable: bool = vmac_table_writable
+        self._vmac_table: Optional[Dict[str, int]] = None
+        # VMAC interface to its receiving interface and group, None until
+        # the first update
+        self._rfc_map: Optional[Dict[str, Tuple[str, int]]] = None
+        self._instances: InstanceRegistry = InstanceRegistry()
+        self._group_signatures: Dict[str, Dict] = {}
+        self._last_diff: ConfigDiff = ConfigDiff(set(), set(), set(), set())
+        # Stat signature of the config file as it was last written or
+        # read, the digest and YANG model are for that version of it
+        self._config_stat: Optional[Tuple[int, int, int]] = None
+        self._config_digest: Optional[str] = None
+        self._yang_model: Optional[Dict] = None
+        # _reload_digest of the config last written or found in the file
+        self._written: Optional[str] = None
 
     @property
     def vrrp_instances(self) -> List[VrrpGroup]:
@@ -187,7 +260,17 @@ global_defs {
 
     @property
     def vrrp_connections(self) -> Dict[str, VrrpConnection]:
-        return self._vrrp_connections
+        return self._instances.connections
+
+    @property
+    def instances(self) -> InstanceRegistry:
+        """Every group from the last update, with its connection"""
+        return self._instances
+
+    @property
+    def last_update_diff(self) -> ConfigDiff:
+        """Groups added, removed or changed by the last update call"""
+        return self._last_diff
 
     def config_file_path(self) -> str:
         """Path to the keepalived config file"""
@@ -206,18 +289,33 @@ global_defs {
                 A dictionary containing the new config passed from
                 the infrastructure. Used to create VRRP group objects
 
-        Create new VRRP group Objects from the config passed in
-        and replace the vrrp_instances list with the new config
+        Compare the config for each group with the config it was built
+        from on the previous call. Groups that are unchanged keep their
+        existing VrrpGroup and VrrpConnection objects, only groups that
+        have been added or changed are rebuilt. The result of the
+        comparison is available from last_update_diff.
         """
 
-        self._rfc_interfaces = 0
+        old_instances: InstanceRegistry = self._instances
+        old_signatures: Dict[str, Dict] = self._group_signatures
+        added: Set[str] = set()
+        changed: Set[str] = set()
+        unchanged: Set[str] = set()
+
         self.vrrp_instances = []
-        self._vrrp_connections = {}
+        self._instances = InstanceRegistry()
+        self._group_signatures = {}
         self._sync_instances = {}
+        self._rfc_map = {}
         if util.INTERFACE_YANG_NAME not in new_config:
+            self._last_diff = ConfigDiff(
+                set(), set(old_signatures), set(), set())
             return
         intf_types: Dict = new_config[util.INTERFACE_YANG_NAME]
 
+        # Find every group first so the VMAC interfaces can be numbered
+        # knowing which groups are going away
+        enabled_groups: List[Tuple[str, int, Dict]] = []
         intf_type: str
         for intf_type in intf_types:
             intf: Dict
@@ -238,70 +336,309 @@ global_defs {
                 group: Dict
                 for group in vrrp_conf[util.YANG_VRRP_GROUP]:
                     if util.YANG_DISABLED_GROUP not in group:
-                        first_vip: str = group[util.YANG_VIP][0]
-                        if "/" in first_vip:
-                            first_vip = first_vip.split("/")[0]
-                        if util.YANG_RFC in group:
-                            self._rfc_interfaces += 1
-                            self.vrrp_instances.append(
-                                VrrpGroup(
-                                    intf_name, start_delay, group,
-                                    self._rfc_interfaces))
-                        else:
-                            self.vrrp_instances.append(
-                                VrrpGroup(
-                                    intf_name, start_delay, group))
-
-                        notify_scripts: List[str] = \
-                            self.vrrp_instances[-1].get_notify_scripts()
-                        af_type: int = util.get_ip_version(
-                            first_vip
-                        )
-                        connection: VrrpConnection = \
-                            VrrpConnection(
-                                intf_name, group[util.YANG_TAGNODE],
-                                af_type, pydbus.SystemBus(), notify_scripts
-                            )
-                        instance_name: str = \
-                            f"vyatta-{intf_name}-{group[util.YANG_TAGNODE]}"
-                        self._vrrp_connections[instance_name] = \
-                            connection
-
-                        if util.YANG_SYNC_GROUP in group:
-                            sync_group_name: str = group[util.YANG_SYNC_GROUP]
-                            if sync_group_name not in self._sync_instances:
-                                self._sync_instances[sync_group_name] = []
-                            self._sync_instances[sync_group_name].append(
-                                self._vrrp_instances[-1].instance_name)
-
-    def write_config(self) -> None:
+                        enabled_groups.append((intf_name, start_delay, group))
+
+        vmacs: Dict[str, int] = self._allocate_vmacs([
+            get_instance_name(intf_name, group[util.YANG_TAGNODE])
+            for intf_name, _, group in enabled_groups
+            if util.YANG_RFC in group
+        ])
+        for intf_name, start_delay, group in enabled_groups:
+            name: str = get_instance_name(
+                intf_name, group[util.YANG_TAGNODE])
+            rfc_num: int = vmacs.get(name, -1)
+            if rfc_num != -1:
+                vmac_intf: str = vmac_intf_name(intf_name, rfc_num)
+                if len(vmac_intf) <= MAX_INTF_NAME_LENGTH:
+                    self._rfc_map[vmac_intf] = \
+                        (intf_name, int(group[util.YANG_TAGNODE]))
+            # VrrpGroup modifies the dictionary it's given so keep a copy
+            # of the original for the next compare
+            signature: Dict = {
+                util.CONFIG_INTF: intf_name,
+                util.CONFIG_DELAY: start_delay,
+                util.CONFIG_VMAC: rfc_num,
+                util.YANG_VRRP_GROUP: copy.deepcopy(group)
+            }
+            self._group_signatures[name] = signature
+
+            if old_signatures.get(name) == signature:
+                unchanged.add(name)
+                old: RegisteredInstance = old_instances.get(name)
+                self.vrrp_instances.append(old.group)
+                self._instances.add(
+                    old.intf, old.vrid, old.af_type, old.group,
+                    old.connection
+                )
+            else:
+                if name in old_signatures:
+                    changed.add(name)
+                else:
+                    added.add(name)
+                self._add_group(
+                    intf_name, start_delay, group, rfc_num,
+                    old_instances.get(name)
+                )
+
+            if util.YANG_SYNC_GROUP in group:
+                sync_group_name: str = group[util.YANG_SYNC_GROUP]
+                if sync_group_name not in self._sync_instances:
+                    self._sync_instances[sync_group_name] = []
+                self._sync_instances[sync_group_name].append(
+                    self._vrrp_instances[-1].instance_name)
+
+        removed: Set[str] = \
+            set(old_signatures) - set(self._group_signatures)
+        self._last_diff = ConfigDiff(added, removed, changed, unchanged)
+        metrics: Instrumentation = get_instrumentation()
+        metrics.count("groups-processed", len(self._group_signatures))
+        metrics.count("groups-rebuilt", len(added) + len(changed))
+
+    def update_from_file(self) -> None:
         """
-        Write config to the file at self.config_file
+        Update from the config file, for processes that didn't write it
+        like the notify daemon and the op mode scripts. Raises
+        FileNotFoundError if there is no config file.
+        """
+        self.update(util.sanitize_vrrp_config(self.get_vci_format_dict()))
 
-        Invoke the str method for this object and write it to the config
-        file provided at instantiation. If there is a problem writing the
-        file an error is thrown.
+    def get_rfc_mapping(
+            self, transmit_intf: str) -> Optional[Tuple[str, int]]:
         """
-        keepalived_config: str = self.config_string
+        The receiving interface and group for the VMAC interface
+        transmit_intf, from the config passed to the last update.
+
+        Return:
+            A tuple of receiving interface and group, ("", 0) if
+            transmit_intf isn't a VMAC interface for any group. None if
+            there hasn't been an update yet so only keepalived knows.
+        """
+
+        if self._rfc_map is None:
+            return None
+        return self._rfc_map.get(transmit_intf, ("", 0))
+
+    def _allocate_vmacs(self, rfc_instances: List[str]) -> Dict[str, int]:
+        """
+        Give each RFC compatible group the number of its VMAC interface.
+
+        A group keeps the number it was given before for as long as it is
+        configured, so adding or removing other groups doesn't rename its
+        interface and make keepalived recreate it. New groups get the
+        lowest number not used by any other group, reusing the numbers of
+        groups that have been removed. The allocations are kept in
+        vmac_table_path so they survive this process being restarted.
+        """
+
+        table: Dict[str, int] = self._load_vmac_table()
+        vmacs: Dict[str, int] = {
+            instance: table[instance]
+            for instance in rfc_instances if instance in table
+        }
+        used: Set[int] = set(vmacs.values())
+        next_num: int = 1
+        instance: str
+        for instance in rfc_instances:
+            if instance in vmacs:
+                continue
+            while next_num in used:
+                next_num += 1
+            vmacs[instance] = next_num
+            used.add(next_num)
+        if vmacs != table and self.vmac_table_writable:
+            self._save_vmac_table(vmacs)
+        return vmacs
+
+    def _load_vmac_table(self) -> Dict[str, int]:
+        # A reader can't tell when the owner changes the table so it
+        # always goes back to the file
+        if self._vmac_table is not None and self.vmac_table_writable:
+            return self._vmac_table
+        table: Dict[str, int] = {}
+        try:
+            with open(self.vmac_table_path, "r") as file_handle:
+                loaded: Any = json.load(file_handle)
+        except FileNotFoundError:
+            loaded = {}
+        except (OSError, ValueError) as err:
+            self.log.warning(
+                f"Ignoring unreadable VMAC table "
+                f"{self.vmac_table_path}: {err}"
+            )
+            loaded = {}
+        if isinstance(loaded, dict):
+            used: Set[int] = set()
+            instance: str
+            for instance, num in loaded.items():
+                # Drop anything that would give two groups one interface
+                if isinstance(num, int) and num > 0 and num not in used:
+                    table[instance] = num
+                    used.add(num)
+        self._vmac_table = table
+        return table
+
+    def _save_vmac_table(self, table: Dict[str, int]) -> None:
+        self._vmac_table = table
+        table_dir: str = os.path.dirname(self.vmac_table_path)
+        temp_fd: int
+        temp_path: str
+        try:
+            os.makedirs(table_dir, exist_ok=True)
+            temp_fd, temp_path = tempfile.mkstemp(
+                dir=table_dir,
+                prefix=f".{os.path.basename(self.vmac_table_path)}."
+            )
+            try:
+                with os.fdopen(temp_fd, "w") as file_handle:
+                    json.dump(table, file_handle, sort_keys=True)
+                os.replace(temp_path, self.vmac_table_path)
+            except BaseException:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(temp_path)
+                raise
+        except OSError as err:
+            # Numbering stays stable for as long as this process runs
+            self.log.warning(
+                f"Failed to save VMAC table {self.vmac_table_path}: {err}"
+            )
+
+    def _add_group(
+            self, intf_name: str, start_delay: int, group: Dict,
+            rfc_num: int, old: Optional[RegisteredInstance] = None
+    ) -> None:
+        """
+        Create the VrrpGroup and VrrpConnection objects for a group that
+        is new or has changed since the last update. A changed group
+        keeps its old VrrpConnection, and any signal subscriptions on it,
+        if it is still the same keepalived DBus object.
+        """
+
+        first_vip: str = group[util.YANG_VIP][0]
+        if "/" in first_vip:
+            first_vip = first_vip.split("/")[0]
+        if rfc_num != -1:
+            self.vrrp_instances.append(
+                VrrpGroup(intf_name, start_delay, group, rfc_num))
+        else:
+            self.vrrp_instances.append(
+                VrrpGroup(intf_name, start_delay, group))
+
+        notify_scripts: List[str] = \
+            self.vrrp_instances[-1].get_notify_scripts()
+        af_type: int = util.get_ip_version(first_vip)
+        connection: VrrpConnection
+        if old is not None and old.af_type == af_type:
+            connection = old.connection
+            connection.notify_scripts = notify_scripts
+        else:
+            connection = VrrpConnection(
+                intf_name, group[util.YANG_TAGNODE],
+                af_type, system_bus.get_system_bus(), notify_scripts
+            )
+        self._instances.add(
+            intf_name, group[util.YANG_TAGNODE], af_type,
+            self.vrrp_instances[-1], connection
+        )
+
+    def render_config(self) -> str:
+        """Render the keepalived config for the current VRRP instances"""
+        config_parts: List[str] = [self.config_string]
         sync_group: str
         for sync_group in self._sync_instances:
-            keepalived_config += f"""
+            config_parts.append(f"""
 vrrp_sync_group {sync_group} {{
-    group {{"""
+    group {{""")
             instance: str
             for instance in self._sync_instances[sync_group]:
-                keepalived_config += f"""
-        {instance}"""
-            keepalived_config += """
+                config_parts.append(f"""
+        {instance}""")
+            config_parts.append("""
     }
     sync_group_tracking_weight
 }
-"""
+""")
         group: VrrpGroup
         for group in self.vrrp_instances:
-            keepalived_config += str(group)
-        with open(self.config_file, "w") as file_handle:
-            file_handle.write(keepalived_config)
+            config_parts.append(str(group))
+        return "".join(config_parts)
+
+    def write_config(self) -> bool:
+        """
+        Write config to the file at self.config_file
+
+        Render the config for this object and compare its hash with the
+        contents of the config file provided at instantiation. If the file
+        already holds exactly the same config it is left alone, otherwise
+        the config is written to a temporary file in the same directory
+        which is then renamed over the config file. Keepalived reloading
+        at the same time will see either the old or the new file, never a
+        partially written one. If there is a problem writing the file an
+        error is thrown.
+
+        Return:
+            True if a running keepalived has to reload to pick up the
+            change. False if the file was already up to date or only start
+            delays changed, keepalived only reads those when it starts.
+        """
+        keepalived_config: str = self.render_config()
+        digest: str = _config_digest(keepalived_config)
+        reload_digest: str = _reload_digest(keepalived_config)
+        if digest == self._current_config_digest():
+            self._written = reload_digest
+            return False
+        # Without knowing what was written before, for example the first
+        # commit after this process started, always reload
+        needs_reload: bool = self._written != reload_digest
+        self._replace_config_file(keepalived_config)
+        self._written = reload_digest
+        self._remember_config_file(digest)
+        return needs_reload
+
+    def _current_config_digest(self) -> Optional[str]:
+        """
+        Hash of the config file as it is on disk, or None if there is no
+        file. The file is only read if it has changed since we last wrote
+        or parsed it.
+        """
+
+        try:
+            if self._config_digest is not None and \
+                    self._config_stat == self._config_file_stat():
+                return self._config_digest
+            digest: str = _config_digest(self.read_config())
+        except FileNotFoundError:
+            return None
+        self._remember_config_file(digest)
+        return digest
+
+    def _replace_config_file(self, keepalived_config: str) -> None:
+        config_dir: str = os.path.dirname(self.config_file) or "."
+        fd: int
+        temp_path: str
+        fd, temp_path = tempfile.mkstemp(
+            prefix=f".{os.path.basename(self.config_file)}.",
+            dir=config_dir
+        )
+        try:
+            with open(fd, "w") as file_handle:
+                file_handle.write(keepalived_config)
+                file_handle.flush()
+                os.fchmod(file_handle.fileno(), 0o644)
+                if self.sync_writes:
+                    os.fsync(file_handle.fileno())
+            os.replace(temp_path, self.config_file)
+            get_instrumentation().count(
+                "bytes-written", len(keepalived_config.encode()))
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(temp_path)
+            raise
+        if self.sync_writes:
+            dir_fd: int = os.open(config_dir, os.O_RDONLY)
+            try:
+                os.fsync(dir_fd)
+            finally:
+                os.close(dir_fd)
 
     def read_config(self) -> str:
         """Read config from file at config_file and return to caller"""
@@ -310,6 +647,57 @@ vrrp_sync_group {sync_group} {{
             config_string = file_handle.read()
         return config_string
 
+    def _config_file_stat(self) -> Tuple[int, int, int]:
+        file_stat: os.stat_result = os.stat(self.config_file)
+        return (file_stat.st_mtime_ns, file_stat.st_ino, file_stat.st_size)
+
+    def _remember_config_file(
+            self, digest: str, yang_model: Optional[Dict] = None) -> None:
+        """
+        Remember the digest of the config just read from or written to
+        the config file, and its YANG model if it has been parsed, along
+        with the stat signature of the file they came from.
+        """
+
+        self._config_stat = None
+        self._config_digest = None
+        self._yang_model = None
+        with contextlib.suppress(FileNotFoundError):
+            self._config_stat = self._config_file_stat()
+            self._config_digest = digest
+            self._yang_model = yang_model
+
+    def get_vci_format_dict(self) -> Dict:
+        """
+        Return the YANG representation of the config file as a python
+        dictionary.
+
+        The file is parsed the first time it's asked for after each
+        write_config call that changed it, and that model is served until
+        the file's mtime, inode or size no longer match, for example if
+        something else has replaced it. Callers are given a copy so they
+        are free to modify it.
+
+        If the file doesn't exist FileNotFoundError is raised, the same as
+        read_config.
+        """
+
+        if self._yang_model is None or \
+                self._config_stat != self._config_file_stat():
+            config_string: str = self.read_config()
+            self._remember_config_file(
+                _config_digest(config_string),
+                self.convert_to_vci_format_dict(config_string)
+            )
+            if self._yang_model is None:
+                # The file disappeared between reading and the stat call
+                raise FileNotFoundError(self.config_file)
+        return copy.deepcopy(self._yang_model)
+
+    def get_vci_format(self) -> str:
+        """JSON string version of get_vci_format_dict"""
+        return json.dumps(self.get_vci_format_dict())
+
     def convert_to_vci_format_dict(self, config_string: str) -> Dict:
         """
         Given a string of keepalived config convert to YANG format and
@@ -465,6 +853,7 @@ vrrp_sync_group {sync_group} {{
 
         if config_block == []:
             return {}
+        config_block = util.ConfigBlockIndex.from_block(config_block)
         config_dict: Dict = {
             util.YANG_ACCEPT: util.YANG_ACCEPT,
             util.YANG_PREEMPT: util.YANG_PREEMPT,
@@ -794,5 +1183,22 @@ vrrp_sync_group {sync_group} {{
                     = route_list
 
     def shutdown(self) -> None:
+        self._config_stat = None
+        self._config_digest = None
+        self._yang_model = None
+        self._written = None
+        # Nothing is running any more so every group is new to the next
+        # update
+        self.vrrp_instances = []
+        self._instances = InstanceRegistry()
+        self._group_signatures = {}
+        self._sync_instances = {}
+        # keepalived removes the VMAC interfaces when it stops so they can
+        # be numbered from scratch next time
+        self._vmac_table = None
+        self._rfc_map = {}
         with contextlib.suppress(FileNotFoundError):
             os.remove(self.config_file)
+        if self.vmac_table_writable:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.vmac_table_path)
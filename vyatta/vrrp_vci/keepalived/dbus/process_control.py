@@ -8,25 +8,30 @@ This file provides functionality for starting and stopping the keepalived
 process using dbus controls.
 """
 
+import contextlib
+import fcntl
 import logging
+import os
 import shutil
 import time
 from functools import wraps
 from pathlib import Path
 from os import mkdir
-from typing import Callable, Dict, Tuple
-
-import pydbus
+from typing import Any, Callable, Dict, Iterator, Optional, TextIO, Tuple
 
+import vyatta.vrrp_vci.keepalived.dbus.system_bus as system_bus
 import vyatta.vrrp_vci.keepalived.util as util
+from vyatta.vrrp_vci.keepalived.file_waiter import FileWaiter
+from vyatta.vrrp_vci.keepalived.instrumentation import (
+    Instrumentation, get_instrumentation
+)
 
 
 def get_vrrp_proxy(func) -> Callable:
     @wraps(func)
     def wrapper(inst: "ProcessControl", *args, **kwargs) -> Callable:
         if inst.vrrp_proxy_process is None:
-            inst.vrrp_proxy_process = inst.sysbus.get(
-                util.KEEPALIVED_DBUS_INTF_NAME,
+            inst.vrrp_proxy_process = system_bus.get_keepalived_proxy(
                 util.VRRP_PROCESS_DBUS_INTF_PATH
             )
         return func(inst, *args, **kwargs)
@@ -39,37 +44,55 @@ class ProcessControl:
         """
         This object models controlling the parent Keepalived process using DBus
         and systemd commands.
+
+        Nothing is asked of DBus until it's needed, so creating one of these
+        is cheap for commands that end up not needing the bus.
         """
 
         self.keepalived_service_file: str = "keepalived.service"
 
         self.log: logging.Logger = logging.getLogger(util.LOGGING_MODULE_NAME)
-        self.sysbus: pydbus.Bus = pydbus.SystemBus()
-
-        self.systemd_proxy: pydbus.ProxyObject = self.sysbus.get(
-            util.SYSTEMD_DBUS_INTF_NAME,
-            util.SYSTEMD_DBUS_PATH
-        )
-
-        self.systemd_manager_intf: pydbus.interface = self.systemd_proxy[
-            util.SYSTEMD_MANAGER_DBUS_INTF_NAME
-        ]
-        self.keepalived_unit_file_intf: pydbus.ProxyMethod = \
-            self.systemd_proxy.LoadUnit(
-                self.keepalived_service_file
-            )
-
-        self.keepalived_proxy_obj: pydbus.ProxyObject = \
-            self.sysbus.get(
-                util.SYSTEMD_DBUS_INTF_NAME,
-                self.keepalived_unit_file_intf
-            )
-        self.vrrp_proxy_process: pydbus.ProxyObject = None
+        self._systemd_manager_intf: Any = None
+        self._keepalived_unit_file_intf: Optional[str] = None
+        self._keepalived_proxy_obj: Any = None
+        self.vrrp_proxy_process: Any = None
         self.running_state: str = "UNKNOWN"
         self.systemd_default_file_path: str = "/etc/default/keepalived"
         self.snmpd_conf_file_path: str = "/etc/snmp/snmpd.conf"
 
+    @property
+    def sysbus(self) -> Any:
+        return system_bus.get_system_bus()
+
+    @property
+    def systemd_proxy(self) -> Any:
+        return system_bus.get_systemd_proxy()
+
+    @property
+    def systemd_manager_intf(self) -> Any:
+        if self._systemd_manager_intf is None:
+            self._systemd_manager_intf = self.systemd_proxy[
+                util.SYSTEMD_MANAGER_DBUS_INTF_NAME
+            ]
+        return self._systemd_manager_intf
+
+    def _load_unit(self) -> None:
+        if self._keepalived_proxy_obj is None:
+            self._keepalived_unit_file_intf, self._keepalived_proxy_obj = \
+                system_bus.get_unit(self.keepalived_service_file)
+
+    @property
+    def keepalived_unit_file_intf(self) -> str:
+        self._load_unit()
+        return self._keepalived_unit_file_intf
+
+    @property
+    def keepalived_proxy_obj(self) -> Any:
+        self._load_unit()
+        return self._keepalived_proxy_obj
+
     def refresh_unit_state(self) -> None:
+        get_instrumentation().count("dbus-calls")
         self.running_state = \
             self.keepalived_proxy_obj.SubState
 
@@ -78,6 +101,7 @@ class ProcessControl:
         return self.running_state == "running"
 
     def shutdown_process(self) -> None:
+        get_instrumentation().count("dbus-calls")
         self.systemd_manager_intf.StopUnit(
             self.keepalived_service_file, util.SYSTEMD_REPLACE)
         try:
@@ -151,14 +175,17 @@ class ProcessControl:
                 err.strerror
             )
         self.set_default_daemon_arguments()
+        get_instrumentation().count("dbus-calls")
         self.systemd_manager_intf.StartUnit(
             self.keepalived_service_file, util.SYSTEMD_REPLACE)
 
     def reload_process_config(self) -> None:
+        get_instrumentation().count("dbus-calls")
         self.systemd_manager_intf.ReloadUnit(
             self.keepalived_service_file, util.SYSTEMD_REPLACE)
 
     def restart_process(self) -> None:
+        get_instrumentation().count("dbus-calls")
         self.systemd_manager_intf.RestartUnit(
             self.keepalived_service_file, util.SYSTEMD_REPLACE)
 
@@ -174,6 +201,7 @@ class ProcessControl:
                 f"{util.RPC_RFC_MAPPING_RECEIVE}": "",
                 f"{util.RPC_RFC_MAPPING_GROUP}": 0
             }
+        get_instrumentation().count("dbus-calls")
         rfc_mapping: Tuple[str, str] = \
             self.vrrp_proxy_process.GetRfcMapping(intf)
         return {
@@ -195,18 +223,10 @@ class ProcessControl:
 
         if not self.is_running():
             return
-        data_file = Path(util.FILE_PATH_KEEPALIVED_DATA)
-        if data_file.exists():
-            data_file.unlink()
-        self.vrrp_proxy_process.PrintData()
-        data_file = Path(util.FILE_PATH_KEEPALIVED_DATA)
-        wait_for_write: int = 0
-        while wait_for_write < 3:
-            if data_file.exists():
-                break
-            time.sleep(1)
-            wait_for_write += 1
-        return data_file.exists()
+        return self._dump_keepalived_file(
+            util.FILE_PATH_KEEPALIVED_DATA,
+            self.vrrp_proxy_process.PrintData
+        )
 
     @get_vrrp_proxy
     def dump_keepalived_stats(self) -> bool:
@@ -218,18 +238,82 @@ class ProcessControl:
 
         if not self.is_running():
             return
-        stats_file = Path(util.FILE_PATH_KEEPALIVED_STATS)
-        if stats_file.exists():
-            stats_file.unlink()
-        self.vrrp_proxy_process.PrintStats()
-        stats_file = Path(util.FILE_PATH_KEEPALIVED_STATS)
-        wait_for_write: int = 0
-        while wait_for_write < 3:
-            if stats_file.exists():
-                break
-            time.sleep(1)
-            wait_for_write += 1
-        return stats_file.exists()
+        return self._dump_keepalived_file(
+            util.FILE_PATH_KEEPALIVED_STATS,
+            self.vrrp_proxy_process.PrintStats
+        )
+
+    def _dump_keepalived_file(
+        self, file_path: str, print_method: Callable
+    ) -> bool:
+        """
+        Make sure there is a complete copy of the dump file that is no
+        older than util.KEEPALIVED_DUMP_TTL seconds.
+
+        Only one process at a time asks keepalived for a dump, anyone
+        else asking at the same time waits for it to finish and then uses
+        the file it produced rather than asking again. Open the file with
+        open_dump_file so it can't be removed for the next dump while it
+        is being opened.
+        """
+
+        with self._dump_lock(file_path, fcntl.LOCK_EX):
+            if self._dump_is_fresh(file_path):
+                return True
+            dump_file = Path(file_path)
+            if dump_file.exists():
+                dump_file.unlink()
+            # The watch is set up before keepalived is asked so a fast
+            # write can't be missed.
+            metrics: Instrumentation = get_instrumentation()
+            with metrics.timer("keepalived.dump"), \
+                    FileWaiter(file_path) as waiter:
+                metrics.count("dbus-calls")
+                print_method()
+                written: bool = waiter.wait(util.KEEPALIVED_DUMP_TIMEOUT)
+        if not written:
+            self.log.debug(f"Timed out waiting for {file_path}")
+        return written
+
+    @staticmethod
+    def _dump_is_fresh(file_path: str) -> bool:
+        if util.KEEPALIVED_DUMP_TTL <= 0:
+            return False
+        try:
+            dump_stat: os.stat_result = os.stat(file_path)
+        except FileNotFoundError:
+            return False
+        return dump_stat.st_size > 0 and \
+            time.time() - dump_stat.st_mtime < util.KEEPALIVED_DUMP_TTL
+
+    @contextlib.contextmanager
+    def _dump_lock(self, file_path: str, operation: int) -> Iterator[None]:
+        """
+        Hold a lock shared by every process using file_path. If the lock
+        file can't be used carry on without it, as things were before the
+        lock existed.
+        """
+
+        try:
+            lock_file: TextIO = open(f"{file_path}.lock", "a")
+        except OSError as err:
+            self.log.debug(f"Not locking {file_path}: {err}")
+            yield
+            return
+        with lock_file:
+            fcntl.flock(lock_file.fileno(), operation)
+            yield
+
+    def open_dump_file(self, file_path: str) -> TextIO:
+        """
+        Open a dump file written by dump_keepalived_data or
+        dump_keepalived_stats. The file can't be replaced while it's being
+        opened, once open it stays readable even if a later dump replaces
+        it.
+        """
+
+        with self._dump_lock(file_path, fcntl.LOCK_SH):
+            return open(file_path, "r")
 
     @get_vrrp_proxy
     def reload_config(self) -> None:
@@ -240,6 +324,7 @@ class ProcessControl:
         """
         if not self.is_running():
             return
+        get_instrumentation().count("dbus-calls")
         self.vrrp_proxy_process.ReloadConfig()
 
     @get_vrrp_proxy
@@ -0,0 +1,180 @@
+# Copyright (c) 2021 AT&T Intellectual Property.
+# All rights reserved.
+# SPDX-License-Identifier: GPL-2.0-only
+
+"""
+Vyatta VCI component to configure keepalived to provide VRRP functionality.
+This file holds an in memory copy of the state of each VRRP group, kept up
+to date by the signals keepalived emits, so that long running processes
+can answer state requests without going back to keepalived each time.
+"""
+
+import copy
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import vyatta.vrrp_vci.keepalived.dbus.system_bus as system_bus
+import vyatta.vrrp_vci.keepalived.util as util
+from vyatta.vrrp_vci.keepalived.dbus.vrrp_group_connection import (
+    VrrpConnection, get_instance_states
+)
+
+
+class StateCache:
+
+    def __init__(self) -> None:
+        """
+        Cache of VRRP group state keyed on the group's DBus path.
+
+        A group is fetched with GetAll the first time it is asked for,
+        after that its state is taken from the status change signals
+        keepalived sends and it is only fetched again when keepalived
+        reloads or reappears on the bus. Groups that can't be fetched
+        then are forgotten. Only long running processes with a GLib main
+        loop receive the signals, so start() must be called before the
+        cache is used.
+        """
+
+        self.log: logging.Logger = logging.getLogger(util.LOGGING_MODULE_NAME)
+        self._lock: threading.Lock = threading.Lock()
+        self._states: Dict[str, Dict] = {}
+        self._connections: Dict[str, VrrpConnection] = {}
+        # Bumped on every signal, a GetAll that started before a signal
+        # arrived may have missed the change so its result isn't cached.
+        self._epoch: int = 0
+        self._subscriptions: List[Any] = []
+
+    def start(self) -> None:
+        """
+        Subscribe to the keepalived signals that keep the cache current.
+        A single match rule covers the status changes of every group.
+        """
+
+        if self._subscriptions:
+            return
+        sysbus = system_bus.get_system_bus()
+        self._subscriptions = [
+            sysbus.subscribe(
+                sender=util.KEEPALIVED_DBUS_INTF_NAME,
+                iface=util.VRRP_INSTANCE_DBUS_INTF_NAME,
+                signal=util.DBUS_STATUS_CHANGE_SIGNAL,
+                signal_fired=self._status_changed
+            ),
+            sysbus.subscribe(
+                sender=util.KEEPALIVED_DBUS_INTF_NAME,
+                iface=util.VRRP_PROCESS_DBUS_INTF_NAME,
+                signal=util.DBUS_RELOADED_SIGNAL,
+                object=util.VRRP_PROCESS_DBUS_INTF_PATH,
+                signal_fired=self._reloaded
+            ),
+            sysbus.watch_name(
+                util.KEEPALIVED_DBUS_INTF_NAME,
+                name_appeared=self._name_appeared,
+                name_vanished=self._name_vanished
+            )
+        ]
+
+    def get_states(
+        self, connections: List[VrrpConnection]
+    ) -> List[Optional[Dict]]:
+        """
+        Return the state of each group in the same form as
+        get_instance_states, groups that aren't cached yet are fetched
+        in one concurrent batch.
+        """
+
+        with self._lock:
+            results: List[Optional[Dict]] = [
+                copy.deepcopy(self._states.get(conn.dbus_path))
+                for conn in connections
+            ]
+            missing: List[int] = [
+                index for index, state in enumerate(results)
+                if state is None
+            ]
+            for index in missing:
+                conn: VrrpConnection = connections[index]
+                self._connections[conn.dbus_path] = conn
+            epoch: int = self._epoch
+        if not missing:
+            return results
+        fetched: List[Optional[Dict]] = get_instance_states(
+            [connections[index] for index in missing]
+        )
+        with self._lock:
+            store: bool = epoch == self._epoch
+            for index, state in zip(missing, fetched):
+                results[index] = state
+                if store and state is not None:
+                    self._states[connections[index].dbus_path] = \
+                        copy.deepcopy(state)
+        return results
+
+    def clear(self) -> None:
+        with self._lock:
+            self._epoch += 1
+            self._states.clear()
+
+    def _refresh(self, connections: List[VrrpConnection]) -> None:
+        if not connections:
+            return
+        states: List[Optional[Dict]] = get_instance_states(connections)
+        with self._lock:
+            for conn, state in zip(connections, states):
+                if state is None:
+                    # Normally a group removed from the config, it's
+                    # remembered again if it's asked for
+                    self._states.pop(conn.dbus_path, None)
+                    self._connections.pop(conn.dbus_path, None)
+                else:
+                    self._states[conn.dbus_path] = state
+
+    def _resync(self) -> None:
+        with self._lock:
+            self._epoch += 1
+            connections: List[VrrpConnection] = \
+                list(self._connections.values())
+        self.log.debug(f"Resyncing state of {len(connections)} VRRP groups")
+        self._refresh(connections)
+
+    def _status_changed(
+        self, sender: str, object_path: str, iface: str, signal: str,
+        params: Any
+    ) -> None:
+        """
+        Update the cached state from the signal itself, this runs on the
+        GLib loop so going back to keepalived for every signal would hold
+        up the rest during a mass failover.
+        """
+
+        status: Optional[str]
+        try:
+            status = util.VrrpState(params[0]).name
+        except (IndexError, TypeError, ValueError):
+            status = None
+        with self._lock:
+            self._epoch += 1
+            state: Optional[Dict] = self._states.get(object_path)
+            if state is None:
+                # Fetched the next time it's asked for
+                return
+            if status is None:
+                del self._states[object_path]
+                return
+            instance_state: Dict = state[util.YANG_INSTANCE_STATE]
+            instance_state[util.YANG_STATE] = status
+            # keepalived reports LastTransition as whole seconds of wall
+            # clock time, the signal is sent as it transitions so this is
+            # the same value GetAll would return to within that second
+            instance_state[util.YANG_LAST_TRANSITION] = int(time.time())
+
+    def _reloaded(self, *args) -> None:
+        self._resync()
+
+    def _name_appeared(self, *args) -> None:
+        self._resync()
+
+    def _name_vanished(self, *args) -> None:
+        self.clear()
@@ -0,0 +1,123 @@
+# Copyright (c) 2021 AT&T Intellectual Property.
+# All rights reserved.
+# SPDX-License-Identifier: GPL-2.0-only
+
+"""
+Vyatta VCI component to configure keepalived to provide VRRP functionality.
+This file holds the process wide connection to the system bus and the
+proxy objects created from it, so that every ProcessControl and
+VrrpConnection in the process shares a single bus connection and each
+DBus object is only introspected once.
+"""
+
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+import vyatta.vrrp_vci.keepalived.util as util
+
+
+_lock: threading.RLock = threading.RLock()
+_sysbus: Any = None
+_systemd_proxy: Any = None
+_unit_proxies: Dict[str, Any] = {}
+_keepalived_proxies: Dict[str, Any] = {}
+_generation: int = 0
+
+
+def get_system_bus() -> Any:
+    """
+    Return the shared system bus connection, creating it on first use.
+    """
+
+    global _sysbus
+    with _lock:
+        if _sysbus is None:
+            # Imported here so the op mode scripts only pay for pydbus, and
+            # the GLib bindings under it, if they talk to DBus
+            import pydbus
+            _sysbus = pydbus.SystemBus()
+            _sysbus.watch_name(
+                util.KEEPALIVED_DBUS_INTF_NAME,
+                name_vanished=_keepalived_vanished
+            )
+        return _sysbus
+
+
+def get_systemd_proxy() -> Any:
+    """Return the shared proxy for the systemd manager object"""
+
+    global _systemd_proxy
+    with _lock:
+        if _systemd_proxy is None:
+            _systemd_proxy = get_system_bus().get(
+                util.SYSTEMD_DBUS_INTF_NAME,
+                util.SYSTEMD_DBUS_PATH
+            )
+        return _systemd_proxy
+
+
+def get_unit(service_file: str) -> Any:
+    """
+    Return a (unit path, unit proxy) tuple for a systemd service file.
+    LoadUnit is only called the first time a service file is asked for.
+    """
+
+    with _lock:
+        if service_file not in _unit_proxies:
+            unit_path: str = get_systemd_proxy().LoadUnit(service_file)
+            _unit_proxies[service_file] = (
+                unit_path,
+                get_system_bus().get(util.SYSTEMD_DBUS_INTF_NAME, unit_path)
+            )
+        return _unit_proxies[service_file]
+
+
+def get_keepalived_proxy(dbus_path: str) -> Any:
+    """
+    Return the proxy for a keepalived DBus object, either the process
+    object or one of the VRRP group instances. Proxies are cached until
+    keepalived drops off the bus.
+    """
+
+    with _lock:
+        proxy: Optional[Any] = _keepalived_proxies.get(dbus_path)
+        if proxy is None:
+            proxy = get_system_bus().get(
+                util.KEEPALIVED_DBUS_INTF_NAME,
+                dbus_path
+            )
+            _keepalived_proxies[dbus_path] = proxy
+        return proxy
+
+
+def generation() -> int:
+    """
+    Number of times keepalived has dropped off the bus, objects holding
+    keepalived proxies can compare this to know when theirs are stale.
+    """
+
+    return _generation
+
+
+def _keepalived_vanished(*args) -> None:
+    global _generation
+    with _lock:
+        logging.getLogger(util.LOGGING_MODULE_NAME).debug(
+            f"{util.KEEPALIVED_DBUS_INTF_NAME} left the bus, dropping "
+            f"{len(_keepalived_proxies)} cached proxies"
+        )
+        _keepalived_proxies.clear()
+        _generation += 1
+
+
+def reset() -> None:
+    """Drop the bus connection and every cached proxy"""
+
+    global _sysbus, _systemd_proxy, _generation
+    with _lock:
+        _sysbus = None
+        _systemd_proxy = None
+        _unit_proxies.clear()
+        _keepalived_proxies.clear()
+        _generation = 0
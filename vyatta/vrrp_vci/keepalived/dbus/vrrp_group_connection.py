@@ -9,33 +9,60 @@ for checking state and for emitting VCI signals on DBus signals.
 """
 
 import logging
-import os
+import shlex
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from functools import wraps
-from typing import Any, Callable, Dict, List, Union
+from typing import Any, Callable, Dict, List, Optional, Union
 
 import pydbus
 
 import vci
 
+import vyatta.vrrp_vci.keepalived.dbus.system_bus as system_bus
 import vyatta.vrrp_vci.keepalived.util as util
+from vyatta.vrrp_vci.keepalived.instance_registry import (
+    canonical_intf_name, dbus_intf_name
+)
+from vyatta.vrrp_vci.keepalived.instrumentation import get_instrumentation
+from vyatta.vrrp_vci.keepalived.script_runner import get_script_runner
+
+
+def _get_all(
+    property_interface: Any, timeout: Optional[float]
+) -> Dict:
+    get_instrumentation().count("dbus-calls")
+    if timeout is None:
+        return property_interface.GetAll(util.VRRP_INSTANCE_DBUS_INTF_NAME)
+    return property_interface.GetAll(
+        util.VRRP_INSTANCE_DBUS_INTF_NAME, timeout=timeout
+    )
 
 
 def activate_connection(func) -> Callable:
+    """
+    Connect to the group's DBus object before the first call, and again
+    after the bus has been reconnected. A timeout keyword argument given
+    to the call also applies to reading the group's state here.
+    """
+
     @wraps(func)
     def wrapper(inst: "VrrpConnection", *args, **kwargs) -> Callable:
-        if not inst._activated:
+        if (not inst._activated or
+                inst._bus_generation != system_bus.generation()):
             # Prints to console when using template scripts, hiding just now
             # inst.log.info(
             #       "Activating object because " +\
             #       f"{util.KEEPALIVED_DBUS_INTF_NAME} became active")
-            inst.vrrp_group_proxy = inst.bus_object.get(
-                util.KEEPALIVED_DBUS_INTF_NAME,
+            inst._bus_generation = system_bus.generation()
+            inst.vrrp_group_proxy = system_bus.get_keepalived_proxy(
                 inst.dbus_path
             )
             inst.vrrp_property_interface =\
                 inst.vrrp_group_proxy[util.PROPERTIES_DBUS_INTF_NAME]
-            group_state = inst.vrrp_property_interface.GetAll(
-                util.VRRP_INSTANCE_DBUS_INTF_NAME
+            group_state = _get_all(
+                inst.vrrp_property_interface, kwargs.get("timeout")
             )
             inst.current_state = \
                 group_state[util.YANG_STATE.capitalize()][1].upper()
@@ -54,8 +81,7 @@ class VrrpConnection:
         This object represents the DBus interface/object to a VRRP group.
         """
 
-        if "." in intf:
-            intf = intf.replace(".", "_")
+        intf = dbus_intf_name(intf)
         self.intf: str = intf
         self.vrid: str = vrid
         self.notify_scripts: List[str] = notify
@@ -68,28 +94,31 @@ class VrrpConnection:
         self.instance_name: str = f"vyatta-{self.intf}-{self.vrid}"
         self.dbus_path: str = \
             f"{util.VRRP_INSTANCE_DBUS_PATH}/{intf}/{vrid}/{self.af_type_str}"
-        self.bus_object.watch_name(
-            util.KEEPALIVED_DBUS_INTF_NAME,
-            name_appeared=activate_connection
-        )
         self._activated: bool = False
+        self._bus_generation: int = system_bus.generation()
         self.vrrp_property_interface: pydbus.interface = None
         self.vrrp_group_proxy: pydbus.ProxyObject = None
+        self._signal_subscriptions: List[Any] = []
 
     @activate_connection
-    def get_instance_state(self) -> Dict[str, Union[str, Dict[str, str]]]:
+    def get_instance_state(
+        self, timeout: Optional[float] = None
+    ) -> Dict[str, Union[str, Dict[str, str]]]:
         """
         Query the group for the values of it's properties, as defined in the
         Dbus interface and represented in the VRRP State yang.
+
+        Arguments:
+            timeout (float):
+                Seconds to wait for the DBus call to return, the default
+                of None uses the bus' default timeout.
         """
 
         if self.vrrp_property_interface is None:
             return {}
-        group_state: Dict = self.vrrp_property_interface.GetAll(
-            util.VRRP_INSTANCE_DBUS_INTF_NAME
-        )
+        group_state: Dict = _get_all(self.vrrp_property_interface, timeout)
         rfc_intf: str = group_state[util.DBUS_XMIT_INTF_NAME][0]
-        if rfc_intf.replace(".", "_") == self.intf:
+        if dbus_intf_name(rfc_intf) == self.intf:
             rfc_intf = ""
         vrrp_state: str = group_state[util.YANG_STATE.capitalize()][1].upper()
         try:
@@ -114,14 +143,23 @@ class VrrpConnection:
         return processed_state
 
     @activate_connection
-    def garp(self) -> None:
+    def garp(self, timeout: Optional[float] = None) -> None:
         """
         Trigger the group to send a gARP packet to refresh L2 ARP tables.
+
+        Arguments:
+            timeout (float):
+                Seconds to wait for the DBus call to return, the default
+                of None uses the bus' default timeout.
         """
 
         if self.vrrp_group_proxy is None:
             return
-        self.vrrp_group_proxy.SendGarp()
+        get_instrumentation().count("dbus-calls")
+        if timeout is None:
+            self.vrrp_group_proxy.SendGarp()
+        else:
+            self.vrrp_group_proxy.SendGarp(timeout=timeout)
         return
 
     def state_change(self, status: int) -> None:
@@ -156,7 +194,7 @@ class VrrpConnection:
             util.NOTIFICATION_NAME_YANG,
             {
                 util.NOTIFICATION_INSTANCE_NAME:
-                self.instance_name.replace("_", "."),
+                canonical_intf_name(self.instance_name),
                 util.NOTIFICATION_NEW_STATE: status_str
             }
         )
@@ -170,7 +208,8 @@ class VrrpConnection:
         All services that wish to react to VRRP changes should now
         listen for the VCI notification, but this is a process and
         until such times this function should be used for BGP and
-        IPSEC notifications. This function will run the scripts
+        IPSEC notifications. This function queues the scripts to be run
+        by the shared ScriptRunner and returns without waiting for them.
         """
 
         status_str: str
@@ -188,11 +227,20 @@ class VrrpConnection:
             f"{self.instance_name} changed state to {status_str}"
             " firing legacy scripts"
         )
-        for script in self.notify_scripts:
-            os.system(
-                f"{script} INSTANCE {self.instance_name} "
-                f"{self.current_state}"
-            )
+        # Scripts are run in the background, in order for this group, so
+        # a slow script can't hold up signals for the other groups
+        get_script_runner().submit(
+            self.instance_name,
+            [
+                shlex.split(script) +
+                ["INSTANCE", self.instance_name, self.current_state]
+                for script in self.notify_scripts
+            ]
+        )
+
+    @property
+    def signals_subscribed(self) -> bool:
+        return self._signal_subscriptions != []
 
     @activate_connection
     def subscribe_instance_signals(self) -> None:
@@ -204,17 +252,36 @@ class VrrpConnection:
         if self.vrrp_group_proxy is None:
             return
         self.get_instance_state()
+        self.connect_instance_signals()
+
+    def connect_instance_signals(self) -> None:
+        """
+        Register the state change call backs and send the initial state
+        notification. current_state must already have been read from the
+        group, see subscribe_instance_signals and subscribe_instances.
+        """
+
+        if self.vrrp_group_proxy is None or self.signals_subscribed:
+            return
         self.log.debug(
             f"{self.dbus_path} current state is {self.current_state}"
         )
-        self.vrrp_group_proxy.VrrpStatusChange.connect(
-            self.state_change
-        )
-        self.vrrp_group_proxy.VrrpStatusChange.connect(
-            self.legacy_notify
-        )
+        self._signal_subscriptions = [
+            self.vrrp_group_proxy.VrrpStatusChange.connect(
+                self.state_change
+            ),
+            self.vrrp_group_proxy.VrrpStatusChange.connect(
+                self.legacy_notify
+            )
+        ]
         self.state_change(util.VrrpState[self.current_state].value)
 
+    def unsubscribe_instance_signals(self) -> None:
+        """Remove the call backs added by subscribe_instance_signals"""
+        for subscription in self._signal_subscriptions:
+            subscription.disconnect()
+        self._signal_subscriptions = []
+
     @activate_connection
     def reset_group_state(self) -> None:
         """
@@ -234,6 +301,161 @@ class VrrpConnection:
         if state == util.VrrpState.MASTER.name:
             self.vrrp_group_proxy.ResetMaster()
         else:
-            print(
+            self.log.info(
                 f"VRRP group {self.vrid} on {self.intf} is already in BACKUP"
             )
+
+
+def get_instance_states(
+    connections: List[VrrpConnection],
+    timeout: float = util.DBUS_CALL_TIMEOUT,
+    max_workers: int = util.DBUS_MAX_WORKERS
+) -> List[Optional[Dict[str, Union[str, Dict[str, str]]]]]:
+    """
+    Query the state of many VRRP groups at once.
+
+    Arguments:
+        connections (List[VrrpConnection]):
+            Groups to query the state of.
+        timeout (float):
+            Seconds each DBus call is allowed to take.
+        max_workers (int):
+            Upper bound on the number of DBus calls in flight at once.
+
+    Return:
+        A list of the same length and order as connections, each entry is
+        the result of get_instance_state for that group or None if the call
+        failed or didn't return in time.
+
+    The GetAll calls are issued from a bounded pool of worker threads so
+    the total time for a poll is roughly the time of the slowest call
+    rather than the sum of all of them. Each call is given its own DBus
+    timeout so a stuck group can only hold up its own worker.
+    """
+
+    log: logging.Logger = logging.getLogger(util.LOGGING_MODULE_NAME)
+    results: List[Optional[Dict]] = [None] * len(connections)
+    if not connections:
+        return results
+    workers: int = min(max_workers, len(connections))
+    executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=workers)
+    futures = [
+        executor.submit(conn.get_instance_state, timeout=timeout)
+        for conn in connections
+    ]
+    # Calls queue behind each other in the pool, allow for that when
+    # working out how long to wait for the last result.
+    batches: int = -(-len(connections) // workers)
+    deadline: float = time.monotonic() + timeout * batches
+    for index, future in enumerate(futures):
+        try:
+            results[index] = future.result(
+                timeout=max(deadline - time.monotonic(), 0)
+            )
+        except FutureTimeoutError:
+            future.cancel()
+            log.debug(
+                f"Timed out getting state for "
+                f"{connections[index].instance_name}"
+            )
+        except Exception as e:
+            # Horrible but pydbus doesn't actually export any Exceptions
+            log.debug(
+                f"Failed to get state for "
+                f"{connections[index].instance_name}: {e}"
+            )
+    executor.shutdown(wait=False)
+    return results
+
+
+def send_garps(
+    connections: List[VrrpConnection],
+    rate: float = util.GARP_BULK_RATE,
+    timeout: float = util.DBUS_CALL_TIMEOUT,
+    max_workers: int = util.DBUS_MAX_WORKERS
+) -> List[Optional[str]]:
+    """
+    Send a GARP from many VRRP groups at once.
+
+    Arguments:
+        connections (List[VrrpConnection]):
+            Groups to send a GARP from, in the order they should be sent.
+        rate (float):
+            GARPs started per second, so upstream switches aren't sent a
+            burst they rate limit. 0 or less starts them all at once.
+        timeout (float):
+            Seconds each DBus call is allowed to take.
+        max_workers (int):
+            Upper bound on the number of DBus calls in flight at once.
+
+    Return:
+        A list of the same length and order as connections, each entry is
+        None if the GARP was sent or why it wasn't.
+
+    Calls are started from the calling thread at the given rate and run
+    in a bounded pool of worker threads, so a slow group holds up neither
+    the pacing nor the other groups.
+    """
+
+    log: logging.Logger = logging.getLogger(util.LOGGING_MODULE_NAME)
+    results: List[Optional[str]] = ["Timed out"] * len(connections)
+    if not connections:
+        return results
+    interval: float = 1 / rate if rate > 0 else 0
+    workers: int = min(max_workers, len(connections))
+    executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=workers)
+    futures = []
+    start: float = time.monotonic()
+    index: int
+    conn: VrrpConnection
+    for index, conn in enumerate(connections):
+        delay: float = start + index * interval - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        futures.append(executor.submit(conn.garp, timeout=timeout))
+    batches: int = -(-len(connections) // workers)
+    deadline: float = time.monotonic() + timeout * batches
+    for index, future in enumerate(futures):
+        try:
+            future.result(timeout=max(deadline - time.monotonic(), 0))
+            results[index] = None
+        except FutureTimeoutError:
+            future.cancel()
+            log.debug(
+                f"Timed out sending GARP for "
+                f"{connections[index].instance_name}"
+            )
+        except Exception as e:
+            # Horrible but pydbus doesn't actually export any Exceptions
+            results[index] = str(e)
+            log.debug(
+                f"Failed to send GARP for "
+                f"{connections[index].instance_name}: {e}"
+            )
+    executor.shutdown(wait=False)
+    return results
+
+
+def subscribe_instances(
+    connections: List[VrrpConnection]
+) -> List[VrrpConnection]:
+    """
+    Subscribe to the signals of many VRRP groups at once. The current state
+    of every group is read concurrently with get_instance_states, then the
+    call backs are connected from the calling thread.
+
+    Return:
+        The connections that couldn't be subscribed, normally because
+        keepalived hasn't created the group yet.
+    """
+
+    states: List[Optional[Dict]] = get_instance_states(connections)
+    failed: List[VrrpConnection] = []
+    conn: VrrpConnection
+    state: Optional[Dict]
+    for conn, state in zip(connections, states):
+        if state is None:
+            failed.append(conn)
+            continue
+        conn.connect_instance_signals()
+    return failed
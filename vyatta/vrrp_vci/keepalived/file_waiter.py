@@ -0,0 +1,152 @@
+# Copyright (c) 2021 AT&T Intellectual Property.
+# All rights reserved.
+# SPDX-License-Identifier: GPL-2.0-only
+
+"""
+Vyatta VCI component to configure keepalived to provide VRRP functionality.
+This file provides a way to wait for keepalived to finish writing one of
+its dump files, using inotify where available and falling back to
+polling the file when it isn't.
+"""
+
+import ctypes
+import logging
+import os
+import select
+import struct
+import time
+from typing import Optional
+
+import vyatta.vrrp_vci.keepalived.util as util
+
+
+IN_CLOSE_WRITE: int = 0x00000008
+IN_MOVED_TO: int = 0x00000080
+IN_NONBLOCK: int = os.O_NONBLOCK
+IN_CLOEXEC: int = os.O_CLOEXEC
+# struct inotify_event without the trailing name
+_EVENT_HEADER: struct.Struct = struct.Struct("iIII")
+# Interval between checks when inotify can't be used, in seconds
+POLL_INTERVAL: float = 0.01
+
+_libc: Optional[ctypes.CDLL] = None
+
+
+def _get_libc() -> Optional[ctypes.CDLL]:
+    global _libc
+    if _libc is None:
+        try:
+            # libc is already mapped into the interpreter, looking it up
+            # by name with find_library would fork ldconfig
+            libc: ctypes.CDLL = ctypes.CDLL(None, use_errno=True)
+        except OSError:
+            return None
+        if not hasattr(libc, "inotify_init1"):
+            return None
+        _libc = libc
+    return _libc
+
+
+class FileWaiter:
+
+    def __init__(self, file_path: str) -> None:
+        """
+        Wait for file_path to be closed after writing.
+
+        The inotify watch is added on the directory when the context
+        manager is entered, so the caller should enter it before asking
+        keepalived to write the file. That way a write that completes
+        before wait() is called is still seen.
+
+        Arguments:
+            file_path (str):
+                The file keepalived is going to write.
+        """
+
+        self.log: logging.Logger = logging.getLogger(util.LOGGING_MODULE_NAME)
+        self.file_path: str = file_path
+        self._file_name: bytes = os.fsencode(os.path.basename(file_path))
+        self._fd: Optional[int] = None
+
+    def __enter__(self) -> "FileWaiter":
+        libc: Optional[ctypes.CDLL] = _get_libc()
+        if libc is None:
+            return self
+        fd: int = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            self.log.debug(
+                f"inotify_init1 failed: {os.strerror(ctypes.get_errno())}"
+            )
+            return self
+        watch: int = libc.inotify_add_watch(
+            fd, os.fsencode(os.path.dirname(self.file_path) or "."),
+            IN_CLOSE_WRITE | IN_MOVED_TO
+        )
+        if watch < 0:
+            self.log.debug(
+                "inotify_add_watch failed for "
+                f"{self.file_path}: {os.strerror(ctypes.get_errno())}"
+            )
+            os.close(fd)
+            return self
+        self._fd = fd
+        return self
+
+    def __exit__(self, *args) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Block until the file has been completely written or timeout
+        seconds have passed.
+
+        Return:
+            True if the file was written in time, otherwise False.
+        """
+
+        deadline: float = time.monotonic() + timeout
+        if self._fd is None:
+            return self._poll(deadline)
+        while True:
+            remaining: float = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            readable, _, _ = select.select([self._fd], [], [], remaining)
+            if not readable:
+                return False
+            if self._file_closed():
+                return True
+
+    def _file_closed(self) -> bool:
+        try:
+            events: bytes = os.read(self._fd, 4096)
+        except BlockingIOError:
+            return False
+        offset: int = 0
+        while offset + _EVENT_HEADER.size <= len(events):
+            _, mask, _, name_len = _EVENT_HEADER.unpack_from(events, offset)
+            offset += _EVENT_HEADER.size
+            name: bytes = events[offset:offset + name_len].rstrip(b"\0")
+            offset += name_len
+            if name == self._file_name and \
+                    mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                return True
+        return False
+
+    def _poll(self, deadline: float) -> bool:
+        # Without inotify the file only counts as written once it exists
+        # and its size has stopped changing between two checks.
+        last_size: Optional[int] = None
+        while True:
+            try:
+                size: Optional[int] = os.stat(self.file_path).st_size
+            except FileNotFoundError:
+                size = None
+            if size is not None and size == last_size:
+                return True
+            last_size = size
+            if time.monotonic() >= deadline:
+                return size is not None
+            time.sleep(POLL_INTERVAL)
@@ -0,0 +1,185 @@
+# Copyright (c) 2021 AT&T Intellectual Property.
+# All rights reserved.
+# SPDX-License-Identifier: GPL-2.0-only
+
+"""
+Vyatta VCI component to configure keepalived to provide VRRP functionality.
+This file indexes the VRRP groups known to a process, along with the DBus
+connection to each of them, so a group can be found by its instance name,
+by its interface and VRID or by its interface alone without building the
+instance name by hand or creating a new connection.
+"""
+
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple, \
+    Union
+
+# Line in a keepalived vrrp_instance block marking the group as IPv6
+_IPV6_KEYWORD: str = "native_ipv6"
+_INSTANCE_PREFIX: str = "vyatta-"
+
+
+def canonical_intf_name(intf: str) -> str:
+    """
+    The interface name as configured, vif interfaces use "." between the
+    parent and the vif. DBus object paths can't contain "." so keepalived
+    uses "_" instead, either form is accepted.
+    """
+    return intf.replace("_", ".")
+
+
+def dbus_intf_name(intf: str) -> str:
+    """The interface name as used in keepalived's DBus object paths"""
+    return intf.replace(".", "_")
+
+
+def get_instance_name(intf: str, vrid: Union[int, str]) -> str:
+    """The keepalived vrrp_instance name for the group"""
+    return f"{_INSTANCE_PREFIX}{canonical_intf_name(intf)}-{vrid}"
+
+
+class RegisteredInstance(NamedTuple):
+    name: str
+    intf: str
+    vrid: int
+    af_type: int
+    # The VrrpGroup is only known in a process that built the config, it
+    # is None for groups registered from state
+    group: Any
+    connection: Any
+
+
+class InstanceRegistry:
+
+    def __init__(self) -> None:
+        """
+        The VRRP groups in one set of config, indexed by canonical
+        instance name, by (interface, VRID) and by interface. Interface
+        names are normalised with canonical_intf_name so either the
+        configured or the DBus form can be used to look a group up.
+        """
+
+        self._by_name: Dict[str, RegisteredInstance] = {}
+        self._by_key: Dict[Tuple[str, int], RegisteredInstance] = {}
+        self._by_intf: Dict[str, List[RegisteredInstance]] = {}
+        self._connections: Dict[str, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self._by_name)
+
+    def __iter__(self) -> Iterator[RegisteredInstance]:
+        return iter(self._by_name.values())
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._by_name
+
+    @property
+    def connections(self) -> Dict[str, Any]:
+        """The VrrpConnection for each group keyed by instance name"""
+        return self._connections
+
+    def add(
+        self, intf: str, vrid: Union[int, str], af_type: int,
+        group: Any, connection: Any
+    ) -> RegisteredInstance:
+        """Add a group, replacing any group already on intf with vrid"""
+
+        intf = canonical_intf_name(intf)
+        instance: RegisteredInstance = RegisteredInstance(
+            get_instance_name(intf, vrid), intf, int(vrid), af_type, group,
+            connection
+        )
+        old: Optional[RegisteredInstance] = self.get(instance.name)
+        if old is not None:
+            self._by_intf[intf].remove(old)
+        self._by_name[instance.name] = instance
+        self._by_key[(intf, instance.vrid)] = instance
+        self._by_intf.setdefault(intf, []).append(instance)
+        self._connections[instance.name] = connection
+        return instance
+
+    def get(self, name: str) -> Optional[RegisteredInstance]:
+        """The group with instance name name, in either interface form"""
+        instance: Optional[RegisteredInstance] = self._by_name.get(name)
+        if instance is None and "_" in name:
+            instance = self._by_name.get(canonical_intf_name(name))
+        return instance
+
+    def find(
+        self, intf: str, vrid: Union[int, str],
+        af_type: Optional[int] = None
+    ) -> Optional[RegisteredInstance]:
+        """
+        The group with vrid on intf, None if there isn't one or it isn't
+        for address family af_type when that is given.
+        """
+
+        try:
+            key: Tuple[str, int] = (canonical_intf_name(intf), int(vrid))
+        except ValueError:
+            return None
+        instance: Optional[RegisteredInstance] = self._by_key.get(key)
+        if instance is None or (
+                af_type is not None and instance.af_type != af_type):
+            return None
+        return instance
+
+    def on_interface(self, intf: str) -> List[RegisteredInstance]:
+        """Every group on intf in the order they were added"""
+        return list(self._by_intf.get(canonical_intf_name(intf), []))
+
+
+def configured_instances(
+    config_file: str
+) -> Iterator[Tuple[str, int, int]]:
+    """
+    Each group in the keepalived config file as (interface, VRID, address
+    family), read a line at a time as the caller asks for the next one.
+    Nothing else is built so groups can be found quickly however many are
+    configured. An IPv6 group is one written with native_ipv6.
+    """
+
+    current: Optional[Tuple[str, int]] = None
+    af_type: int = 4
+    with open(config_file, "r") as file_handle:
+        line: str
+        for line in file_handle:
+            line = line.strip()
+            if not line.startswith("vrrp_"):
+                if current is not None and line == _IPV6_KEYWORD:
+                    af_type = 6
+                continue
+            # Blocks aren't nested so this is the end of the last one
+            if current is not None:
+                yield (current[0], current[1], af_type)
+            current = None
+            af_type = 4
+            words: List[str] = line.split()
+            if len(words) < 2 or words[0] != "vrrp_instance" or \
+                    not words[1].startswith(_INSTANCE_PREFIX):
+                continue
+            intf, _, vrid = \
+                words[1][len(_INSTANCE_PREFIX):].rpartition("-")
+            if intf and vrid.isdigit():
+                current = (intf, int(vrid))
+    if current is not None:
+        yield (current[0], current[1], af_type)
+
+
+def configured_af_type(
+    config_file: str, intf: str, vrid: Union[int, str]
+) -> Optional[int]:
+    """
+    The address family of the group with vrid on intf in the keepalived
+    config file, None if the group isn't in it. The file is only read as
+    far as the end of the group.
+    """
+
+    try:
+        key: Tuple[str, int] = (canonical_intf_name(intf), int(vrid))
+    except ValueError:
+        return None
+    configured: Tuple[str, int, int]
+    for configured in configured_instances(config_file):
+        if configured[:2] == key:
+            return configured[2]
+    return None
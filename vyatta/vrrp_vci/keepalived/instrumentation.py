@@ -0,0 +1,106 @@
+# Copyright (c) 2021 AT&T Intellectual Property.
+# All rights reserved.
+# SPDX-License-Identifier: GPL-2.0-only
+
+"""
+Vyatta VCI component to configure keepalived to provide VRRP functionality.
+This file keeps timings for each phase of handling config and state
+requests along with counters for the work done in them, so a slow commit
+can be put down to DBus, the disk or systemd after the fact. Recording is
+a clock read and a dictionary update under a lock so it is always on.
+"""
+
+import contextlib
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Union
+
+# Index of each value kept for a phase
+_COUNT: int = 0
+_TOTAL: int = 1
+_LAST: int = 2
+_MAX: int = 3
+
+
+class Instrumentation:
+
+    def __init__(self) -> None:
+        """
+        Per phase timers and named counters for the VCI component.
+
+        Phases are named <area>.<phase>, for example config.write, and
+        for each one the number of times it ran and the total, last and
+        longest time it took are kept. Counters are plain totals.
+        """
+
+        self._lock: threading.Lock = threading.Lock()
+        self._phases: Dict[str, List[float]] = {}
+        self._counters: Dict[str, int] = {}
+        self._since: float = time.monotonic()
+
+    @contextlib.contextmanager
+    def timer(self, phase: str) -> Iterator[None]:
+        """
+        Time the body of the with statement as a run of phase, runs that
+        raise are recorded too.
+        """
+
+        start: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, time.perf_counter() - start)
+
+    def record(self, phase: str, seconds: float) -> None:
+        with self._lock:
+            timings: Optional[List[float]] = self._phases.get(phase)
+            if timings is None:
+                self._phases[phase] = [1, seconds, seconds, seconds]
+                return
+            timings[_COUNT] += 1
+            timings[_TOTAL] += seconds
+            timings[_LAST] = seconds
+            if seconds > timings[_MAX]:
+                timings[_MAX] = seconds
+
+    def count(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + amount
+
+    def snapshot(self) -> Dict[str, Union[float, Dict]]:
+        """
+        A copy of everything recorded so far
+            since: Seconds since recording started or was last reset
+            phases: For each phase its count, and total, last and max
+                seconds
+            counters: The value of each counter
+        """
+
+        with self._lock:
+            return {
+                "since": time.monotonic() - self._since,
+                "phases": {
+                    phase: {
+                        "count": int(timings[_COUNT]),
+                        "total": timings[_TOTAL],
+                        "last": timings[_LAST],
+                        "max": timings[_MAX],
+                    }
+                    for phase, timings in self._phases.items()
+                },
+                "counters": dict(self._counters),
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._phases = {}
+            self._counters = {}
+            self._since = time.monotonic()
+
+
+_instrumentation: Instrumentation = Instrumentation()
+
+
+def get_instrumentation() -> Instrumentation:
+    """The Instrumentation shared by everything in this process"""
+    return _instrumentation
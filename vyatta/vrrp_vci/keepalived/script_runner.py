@@ -0,0 +1,122 @@
+# Copyright (c) 2021 AT&T Intellectual Property.
+# All rights reserved.
+# SPDX-License-Identifier: GPL-2.0-only
+
+"""
+Vyatta VCI component to configure keepalived to provide VRRP functionality.
+This file runs the legacy notify scripts for VRRP groups in the background
+so a slow script doesn't hold up the DBus signal callbacks that called it.
+"""
+
+import collections
+import logging
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Dict, List, Optional
+
+import vyatta.vrrp_vci.keepalived.util as util
+
+
+class ScriptRunner:
+
+    def __init__(
+        self, max_workers: int = util.NOTIFY_SCRIPT_WORKERS,
+        timeout: float = util.NOTIFY_SCRIPT_TIMEOUT
+    ) -> None:
+        """
+        Run commands without a shell on a bounded pool of worker threads.
+
+        Commands are submitted in batches against a key, normally the
+        name of the VRRP group they are for. A batch is run in order, and
+        batches for the same key are run in the order they were submitted,
+        one after the other. Batches for different keys run concurrently
+        up to max_workers at a time.
+
+        Arguments:
+            max_workers (int):
+                The most scripts that can be running at once.
+            timeout (float):
+                Seconds a script is allowed to run before it is killed.
+        """
+
+        self.log: logging.Logger = logging.getLogger(util.LOGGING_MODULE_NAME)
+        self.timeout: float = timeout
+        self._executor: ThreadPoolExecutor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="vrrp-notify-script"
+        )
+        self._lock: threading.Lock = threading.Lock()
+        # Batches waiting behind the one currently running for each key,
+        # a key is only present while it has a batch running
+        self._waiting: Dict[str, Deque[List[List[str]]]] = {}
+        # Scripts waiting to run or currently running
+        self._queued: int = 0
+
+    def submit(self, key: str, commands: List[List[str]]) -> None:
+        """
+        Queue a batch of commands, each given as an argv list, to be run
+        after anything already queued for key. Returns straight away.
+        """
+
+        if not commands:
+            return
+        with self._lock:
+            self._queued += len(commands)
+            queued: int = self._queued
+            if key in self._waiting:
+                self._waiting[key].append(commands)
+            else:
+                self._waiting[key] = collections.deque()
+                self._executor.submit(self._run_batches, key, commands)
+        self.log.debug(f"{queued} notify scripts queued or running")
+
+    def _run_batches(self, key: str, commands: List[List[str]]) -> None:
+        next_commands: Optional[List[List[str]]] = commands
+        while next_commands is not None:
+            argv: List[str]
+            for argv in next_commands:
+                self._run(argv)
+            with self._lock:
+                waiting: Deque[List[List[str]]] = self._waiting[key]
+                if waiting:
+                    next_commands = waiting.popleft()
+                else:
+                    del self._waiting[key]
+                    next_commands = None
+
+    def _run(self, argv: List[str]) -> None:
+        try:
+            result = subprocess.run(
+                argv, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL, timeout=self.timeout
+            )
+            if result.returncode != 0:
+                self.log.debug(
+                    f"{argv[0]} exited with status {result.returncode}"
+                )
+        except subprocess.TimeoutExpired:
+            self.log.warning(
+                f"{argv[0]} killed after running for {self.timeout} seconds"
+            )
+        except (OSError, subprocess.SubprocessError) as err:
+            self.log.warning(f"Failed to run {argv[0]}: {err}")
+        finally:
+            with self._lock:
+                self._queued -= 1
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+
+_runner: Optional[ScriptRunner] = None
+_runner_lock: threading.Lock = threading.Lock()
+
+
+def get_script_runner() -> ScriptRunner:
+    """The ScriptRunner shared by every VRRP group in this process"""
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = ScriptRunner()
+        return _runner
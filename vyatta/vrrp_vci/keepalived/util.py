@@ -60,6 +60,7 @@ SYSTEMD_REPLACE: str = "replace"
 
 # DBus paths and interfaces for VRRP group instance and Keepalived process
 KEEPALIVED_DBUS_INTF_NAME: str = "org.keepalived.Vrrp1"
+VRRP_PROCESS_DBUS_INTF_NAME: str = f"{KEEPALIVED_DBUS_INTF_NAME}.Vrrp"
 VRRP_PROCESS_DBUS_INTF_PATH: str = \
     f"/{KEEPALIVED_DBUS_INTF_NAME.replace('.', '/')}/Vrrp"
 VRRP_INSTANCE_DBUS_INTF_NAME: str = f"{KEEPALIVED_DBUS_INTF_NAME}.Instance"
@@ -79,6 +80,10 @@ DBUS_LAST_TRANSITION_NAME: str = "LastTransition"
 DBUS_SYNC_GROUP_NAME: str = "SyncGroup"
 DBUS_XMIT_INTF_NAME: str = "XmitIntf"
 
+# DBus signal names
+DBUS_RELOADED_SIGNAL: str = "VrrpReloaded"
+DBUS_STATUS_CHANGE_SIGNAL: str = "VrrpStatusChange"
+
 # YANG keys and constants
 YANG_INSTANCE_STATE: str = "instance-state"
 YANG_TAGNODE: str = "tagnode"
@@ -164,6 +169,17 @@ RPC_RFC_MAPPING_RECEIVE: str = f"{VRRP_NAMESPACE}:receive"
 RPC_RFC_MAPPING_GROUP: str = f"{VRRP_NAMESPACE}:group"
 RPC_GARP_INTERFACE: str = f"{VRRP_NAMESPACE}:{YANG_INTERFACE_CONST}"
 RPC_GARP_GROUP: str = f"{VRRP_NAMESPACE}:group"
+RPC_GARP_SYNC_GROUP: str = f"{VRRP_NAMESPACE}:sync-group"
+RPC_GARP_RATE: str = f"{VRRP_NAMESPACE}:rate"
+RPC_GARP_RESULT: str = f"{VRRP_NAMESPACE}:result"
+# Leaves of each bulk GARP result and the status a group can be given
+GARP_RESULT_GROUP: str = "group"
+GARP_RESULT_STATUS: str = "status"
+GARP_RESULT_ERROR: str = "error"
+GARP_STATUS_SENT: str = "sent"
+GARP_STATUS_FAILED: str = "failed"
+GARP_STATUS_NOT_MASTER: str = "not-master"
+GARP_STATUS_QUEUED: str = "queued"
 RPC_RFC_INTERFACE: str = f"{VRRP_NAMESPACE}:transmit"
 
 # Notification name and keys
@@ -270,18 +286,53 @@ STATS_PZERO_KEY: str = \
 DEBUG_FLAG_PER_PACKET = 1
 
 # Keepalived file paths
+FILE_PATH_KEEPALIVED_CONFIG = "/etc/keepalived/keepalived.conf"
 FILE_PATH_KEEPALIVED_DIR = "/run/keepalived"
 FILE_PATH_KEEPALIVED_DATA = f"{FILE_PATH_KEEPALIVED_DIR}/keepalived.data"
 FILE_PATH_KEEPALIVED_STATS = f"{FILE_PATH_KEEPALIVED_DIR}/keepalived.stats"
+FILE_PATH_VRRP_RUN_DIR = "/run/vyatta-vrrp"
+# Group states last sent to BGP by the clear vrrp bgp op command
+FILE_PATH_BGP_FAILOVER_STATES = \
+    f"{FILE_PATH_VRRP_RUN_DIR}/bgp-failover-states.json"
+VTYSH_PATH = "/usr/bin/vtysh"
+# Socket the VCI component answers show vrrp queries on
+FILE_PATH_SHOW_QUERY_SOCKET = f"{FILE_PATH_VRRP_RUN_DIR}/show.sock"
+# VMAC interface number given to each RFC compatible group
+FILE_PATH_VMAC_TABLE = f"{FILE_PATH_VRRP_RUN_DIR}/vmac-table.json"
 
 # Legacy notification script paths
 LEGACY_NOTIFY_BGP = "/opt/vyatta/sbin/notify-bgp"
 LEGACY_NOTIFY_IPSEC = "/opt/vyatta/sbin/vyatta-ipsec-notify.sh"
+# Legacy notify scripts that can run at once, and seconds each may run for
+NOTIFY_SCRIPT_WORKERS: int = 8
+NOTIFY_SCRIPT_TIMEOUT: float = 30
 
 # Misc string constants
 LOGGING_MODULE_NAME: str = "vyatta-vrrp-vci"
 AGENTX_STRING: str = "tcp:localhost:705:1"
 
+# Limits for concurrent DBus calls to VRRP group objects, timeout in seconds
+DBUS_CALL_TIMEOUT: float = 5
+DBUS_MAX_WORKERS: int = 16
+
+# GARPs sent per second by the bulk GARP RPC when it isn't given a rate
+GARP_BULK_RATE: int = 100
+
+# Seconds to wait for keepalived to write its data or stats file
+KEEPALIVED_DUMP_TIMEOUT: float = 3
+# Seconds a dump file is reused for by the next caller before keepalived is
+# asked to write it again, 0 always asks for a new one
+KEEPALIVED_DUMP_TTL: float = 1
+
+# Seconds an op mode command waits for the VCI component to answer a show
+# query, and seconds the component reuses parsed keepalived dumps for
+SHOW_QUERY_TIMEOUT: float = 10
+SHOW_QUERY_MODEL_TTL: float = 1
+
+# Seconds over which config commits arriving in quick succession are merged
+# into a single write and reload, 0 applies every commit straight away
+CONFIG_COALESCE_WINDOW: float = 0
+
 # Set Logger
 log: logging.Logger = logging.getLogger(LOGGING_MODULE_NAME)
 
@@ -550,10 +601,78 @@ def get_config_blocks(
         end: Optional[int] = None
         if idx + 1 < len(indexes_list):
             end = indexes_list[idx + 1]
-        group_list.append(stripped_list[start:end])
+        group_list.append(ConfigBlockIndex(stripped_list[start:end]))
     return group_list
 
 
+# Characters that can end a key at the start of a config line
+_CONFIG_KEY_BOUNDARY = re.compile(r"[\s:]")
+
+
+class ConfigBlockIndex(list):
+    """
+    The lines of a single block of config along with an index of every key
+    that can be found at the start of a line. The index is built once so
+    looking up a key with find_config_value doesn't scan the block.
+
+    A key is any prefix of a line that is followed by whitespace, a colon
+    or the end of the line, matching the search done by
+    find_config_value. The first line a key is found on wins. Lines added
+    with append or extend are indexed, other changes to the list aren't.
+
+    Example:
+        block = ConfigBlockIndex(["vrrp_instance dp0p1s1", "priority 200",
+            "use_vmac"])
+        block.find("priority")  # "200"
+        block.find("use_vmac")  # [None]
+        block.find("preempt")  # raise ValueError
+    """
+
+    def __init__(self, config_list: List[str]) -> None:
+        super().__init__()
+        self._keys: Dict[str, Union[List, str]] = {}
+        self.extend(config_list)
+
+    @classmethod
+    def from_block(cls, config_list: List[str]) -> "ConfigBlockIndex":
+        """Index a block of config unless it already is"""
+
+        if isinstance(config_list, cls):
+            return config_list
+        return cls(config_list)
+
+    def append(self, line: str) -> None:
+        super().append(line)
+        self._index_line(line)
+
+    def extend(self, lines: List[str]) -> None:
+        for line in lines:
+            self.append(line)
+
+    def find(self, search_term: str) -> Union[List, str]:
+        try:
+            return self._keys[search_term]
+        except KeyError:
+            raise ValueError(
+                f"Value {search_term} not found in config") from None
+
+    def _index_line(self, line: str) -> None:
+        for boundary in _CONFIG_KEY_BOUNDARY.finditer(line):
+            self._add_key(line, boundary.start())
+        self._add_key(line, len(line))
+
+    def _add_key(self, line: str, end: int) -> None:
+        key: str = line[:end]
+        if end == 0 or key in self._keys:
+            return
+        if end < len(line) and line[end].isspace():
+            self._keys[key] = line[end:].lstrip()
+        else:
+            # Yang JSON representation has single key with no value as
+            # <key>: [null]
+            self._keys[key] = [None]
+
+
 def find_config_value(
         config_list: List[str],
         search_term: str
@@ -587,8 +706,13 @@ def find_config_value(
 
         _find_config_value(config_block, "priority")
         # "200"
+
+    Blocks from get_config_blocks are a ConfigBlockIndex, for those the
+    index is used instead of searching the lines.
     """
 
+    if isinstance(config_list, ConfigBlockIndex):
+        return config_list.find(search_term)
     line: str
     for line in config_list:
         regex_search: Optional[Match[str]] = \
@@ -766,7 +890,55 @@ def get_namespace(
 
 def call_vtysh(cmd) -> None:
     try:
-        subprocess.run(["/usr/bin/vtysh", "-c", cmd], check=True)
+        subprocess.run([VTYSH_PATH, "-c", cmd], check=True)
     except subprocess.CalledProcessError as err:
         log.error(f"Tried to call vtysh with {cmd} and got error {err}")
     return
+
+
+def call_vtysh_batch(cmds: List[str]) -> List[Tuple[str, bool]]:
+    """
+    Run all of cmds through a single vtysh process, one -c per command,
+    and return whether each of them succeeded.
+
+    vtysh stops at the first command that fails and only gives one exit
+    status for the whole session. It's asked to echo each command before
+    running it so the commands before the failing one are known to have
+    succeeded and aren't run again, only the failing command and the
+    ones after it are retried one at a time. If nothing was echoed the
+    first command is taken as the failing one.
+    """
+
+    if not cmds:
+        return []
+    argv: List[str] = [VTYSH_PATH, "-E"]
+    cmd: str
+    for cmd in cmds:
+        argv += ["-c", cmd]
+    batch: subprocess.CompletedProcess = subprocess.run(
+        argv, stdout=subprocess.PIPE, universal_newlines=True
+    )
+    if batch.returncode == 0:
+        return [(cmd, True) for cmd in cmds]
+    # Each echoed line is the prompt followed by the command
+    ran: int = 0
+    line: str
+    for line in (batch.stdout or "").splitlines():
+        if ran < len(cmds) and line.rstrip().endswith(cmds[ran]):
+            ran += 1
+    failed: int = max(ran - 1, 0)
+    log.debug(
+        f"Batch of {len(cmds)} vtysh commands failed at command "
+        f"{failed + 1} with status {batch.returncode}, retrying the rest "
+        f"one at a time"
+    )
+    results: List[Tuple[str, bool]] = [(cmd, True) for cmd in cmds[:failed]]
+    for cmd in cmds[failed:]:
+        try:
+            subprocess.run([VTYSH_PATH, "-c", cmd], check=True)
+        except subprocess.CalledProcessError as err:
+            log.error(f"Tried to call vtysh with {cmd} and got error {err}")
+            results.append((cmd, False))
+        else:
+            results.append((cmd, True))
+    return results
@@ -9,6 +9,17 @@ from typing import Dict, List
 
 import vyatta.vrrp_vci.keepalived.util as util
 
+# Linux limit on interface name length
+MAX_INTF_NAME_LENGTH: int = 15
+
+
+def vmac_intf_name(name: str, rfc_num: int) -> str:
+    """
+    Name of the VMAC interface keepalived creates for an RFC compatible
+    group on interface name.
+    """
+    return f"{name[:3]}vrrp{rfc_num}"
+
 
 class VrrpGroup:
     """
@@ -106,8 +117,10 @@ vrrp_instance {instance} {{
             self._template += "\n    nopreempt"
 
         if util.YANG_RFC in self._group_config:
-            self._group_config[util.CONFIG_VMAC] = f"{name[:3]}vrrp{rfc_num}"
-            if len(self._group_config[util.CONFIG_VMAC]) > 15:
+            self._group_config[util.CONFIG_VMAC] = \
+                vmac_intf_name(name, rfc_num)
+            if len(self._group_config[util.CONFIG_VMAC]) > \
+                    MAX_INTF_NAME_LENGTH:
                 self.log.warning(
                     "generated interface name is longer than 15 characters"
                 )
@@ -0,0 +1,271 @@
+# Copyright (c) 2021 AT&T Intellectual Property.
+# All rights reserved.
+# SPDX-License-Identifier: GPL-2.0-only
+
+"""
+Vyatta VCI component to configure keepalived to provide VRRP functionality.
+This file produces the output for the show vrrp op mode commands. The VCI
+component answers these over a Unix socket so the op mode scripts can ask
+it for the output instead of starting up, connecting to DBus and parsing a
+keepalived dump themselves on every call. Only the standard library and
+util are imported at the top of this file as the op mode scripts import it
+for query().
+"""
+
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import vyatta.vrrp_vci.keepalived.util as util
+
+
+SHOW_COMMANDS: Tuple[str, ...] = (
+    "summary", "detail", "interface", "stats", "sync", "autocomplete",
+    "timing"
+)
+_MAX_REQUEST_SIZE: int = 4096
+
+
+class ShowQueries:
+
+    def __init__(
+        self, get_state: Callable[[], Dict], model_ttl: float = 0
+    ) -> None:
+        """
+        Produce the output for the show vrrp commands.
+
+        Arguments:
+            get_state:
+                Returns the VRRP state tree, as from State.get, used by the
+                summary command.
+            model_ttl (float):
+                Seconds the parsed keepalived data and stats are reused for
+                before keepalived is asked to dump them again. The default
+                of 0 asks keepalived every time and lets the stats parse
+                stop as soon as the filtered group has been read.
+        """
+
+        self.log: logging.Logger = logging.getLogger(util.LOGGING_MODULE_NAME)
+        self.get_state: Callable[[], Dict] = get_state
+        self.model_ttl: float = model_ttl
+        self._pc: Any = None
+        self._lock: threading.Lock = threading.Lock()
+        self._models: Dict[str, Tuple[float, Dict]] = {}
+
+    @property
+    def pc(self) -> Any:
+        if self._pc is None:
+            import vyatta.vrrp_vci.keepalived.dbus.process_control \
+                as process_control
+            self._pc = process_control.ProcessControl()
+        return self._pc
+
+    def _cached_model(self, kind: str) -> Optional[Dict]:
+        if self.model_ttl <= 0 or kind not in self._models:
+            return None
+        created, model = self._models[kind]
+        if time.monotonic() - created >= self.model_ttl:
+            del self._models[kind]
+            return None
+        return model
+
+    def data_model(self) -> Optional[Dict]:
+        """
+        The parsed keepalived.data file, None if keepalived didn't write
+        it in time.
+        """
+
+        import vyatta.vrrp_vci.show_vrrp_cmds as vrrp_show
+        with self._lock:
+            model: Optional[Dict] = self._cached_model("data")
+            if model is not None:
+                return model
+            if not self.pc.dump_keepalived_data():
+                return None
+            with self.pc.open_dump_file(
+                    util.FILE_PATH_KEEPALIVED_DATA) as file_obj:
+                model = vrrp_show.convert_data_stream_to_dict(file_obj)
+            if self.model_ttl > 0:
+                self._models["data"] = (time.monotonic(), model)
+            return model
+
+    def stats_model(self, intf: str, vrid: str) -> Optional[Dict]:
+        """
+        The parsed keepalived.stats file, None if keepalived didn't write
+        it in time. Without caching only the groups matching the filters
+        are parsed, the show output filters the model either way.
+        """
+
+        import vyatta.vrrp_vci.show_vrrp_cmds as vrrp_show
+        with self._lock:
+            model: Optional[Dict] = self._cached_model("stats")
+            if model is not None:
+                return model
+            if not self.pc.dump_keepalived_stats():
+                return None
+            if self.model_ttl > 0:
+                intf = vrid = ""
+            with self.pc.open_dump_file(
+                    util.FILE_PATH_KEEPALIVED_STATS) as file_obj:
+                model = vrrp_show.convert_stats_stream_to_dict(
+                    file_obj, intf, vrid
+                )
+            if self.model_ttl > 0:
+                self._models["stats"] = (time.monotonic(), model)
+            return model
+
+    def show(
+        self, command: str, intf: str = "", vrid: str = "", sync: str = ""
+    ) -> str:
+        """Return the output of show vrrp <command> with the given filters"""
+
+        import vyatta.vrrp_vci.show_vrrp_cmds as vrrp_show
+        show_output: str = "VRRP is not running"
+        if command == "summary":
+            state_dict: Dict = self.get_state()
+            if state_dict == {}:
+                return show_output
+            return vrrp_show.show_vrrp_summary(state_dict)
+        if command == "timing":
+            # Only means anything in the VCI component, the op mode
+            # scripts don't ask it when the component isn't answering
+            import vyatta.vrrp_vci.keepalived.instrumentation \
+                as instrumentation
+            return vrrp_show.show_vrrp_timing(
+                instrumentation.get_instrumentation().snapshot())
+        if not self.pc.is_running():
+            if command == "autocomplete":
+                show_output = ""
+            return show_output
+        json_repr: Optional[Dict]
+        if command in ["detail", "interface", "sync", "autocomplete"]:
+            json_repr = self.data_model()
+            if json_repr is None:
+                show_output = "Keepalived is not responding"
+                if command == "autocomplete":
+                    show_output = ""
+                return show_output
+            if command == "detail":
+                show_output = vrrp_show.show_vrrp_detail(json_repr)
+            elif command == "interface":
+                show_output = \
+                    vrrp_show.show_vrrp_interface(json_repr, intf, vrid)
+            elif command == "sync":
+                show_output = vrrp_show.show_vrrp_sync(json_repr, sync)
+            else:
+                show_output = vrrp_show.show_autocomplete(
+                    json_repr, intf, sync
+                )
+        elif command == "stats":
+            json_repr = self.stats_model(intf, vrid)
+            if json_repr is None:
+                return "Keepalived is not responding"
+            show_output = vrrp_show.show_vrrp_statistics_filters(
+                json_repr, intf, vrid
+            )
+        else:
+            show_output = f"Error: Unknown command:{command}"
+        return show_output
+
+
+class _ShowRequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self) -> None:
+        log: logging.Logger = logging.getLogger(util.LOGGING_MODULE_NAME)
+        response: Dict[str, str]
+        try:
+            request: Dict = json.loads(
+                self.rfile.readline(_MAX_REQUEST_SIZE)
+            )
+            command: str = request["command"]
+            if command not in SHOW_COMMANDS:
+                raise ValueError(f"Unknown command {command}")
+            response = {
+                "output": self.server.queries.show(
+                    command, str(request.get("intf", "")),
+                    str(request.get("vrid", "")),
+                    str(request.get("sync", ""))
+                )
+            }
+        except Exception as err:
+            log.debug(f"Failed to answer show query: {err}")
+            response = {"error": str(err)}
+        self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+class ShowQueryServer(socketserver.ThreadingMixIn,
+                      socketserver.UnixStreamServer):
+
+    daemon_threads: bool = True
+
+    def __init__(
+        self, queries: ShowQueries,
+        socket_path: str = util.FILE_PATH_SHOW_QUERY_SOCKET
+    ) -> None:
+        """
+        Answer show vrrp queries from the op mode scripts on a Unix socket.
+
+        Each request is a single line of JSON with the command and filters
+        as given to vyatta_show_vrrp.py, the reply is a single line of JSON
+        holding either the output or an error.
+        """
+
+        self.queries: ShowQueries = queries
+        self.socket_path: str = socket_path
+        self._thread: Optional[threading.Thread] = None
+        os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        # The show vrrp commands are privileged so only root may connect,
+        # the socket is created that way rather than changed after bind
+        # so there's no window where anyone else can
+        old_umask: int = os.umask(0o177)
+        try:
+            super().__init__(socket_path, _ShowRequestHandler)
+        finally:
+            os.umask(old_umask)
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self.serve_forever, name="vrrp-show-query", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+
+def query(
+    command: str, intf: str = "", vrid: str = "", sync: str = "",
+    socket_path: str = util.FILE_PATH_SHOW_QUERY_SOCKET,
+    timeout: float = util.SHOW_QUERY_TIMEOUT
+) -> Optional[str]:
+    """
+    Ask the VCI component for the output of a show command.
+
+    Return:
+        The output, or None if the component isn't answering queries so
+        the caller should work it out itself.
+    """
+
+    request: bytes = json.dumps({
+        "command": command, "intf": intf, "vrid": vrid, "sync": sync
+    }).encode() + b"\n"
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(socket_path)
+            sock.sendall(request)
+            with sock.makefile("rb") as reply:
+                response: Dict = json.loads(reply.readline())
+    except (OSError, ValueError):
+        return None
+    return response.get("output")
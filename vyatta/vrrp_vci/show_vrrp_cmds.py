@@ -2,8 +2,9 @@
 # All rights reserved.
 # SPDX-License-Identifier: GPL-2.0-only
 
+import io
 import time
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 
 import vyatta.vrrp_vci.keepalived.util as util
 
@@ -45,7 +46,7 @@ def show_detail_group_name(group: str) -> str:
 
 
 def show_detail_line_format(line: List[str]) -> str:
-    return f"  {line[0]:<30s}{line[1]:<s}\n"
+    return f"  {line[0]:<30s}{line[1]}\n"
 
 
 def show_detail_tracked_format(line: List[str]) -> str:
@@ -72,11 +73,11 @@ def show_stats_header_format(line: List[str]) -> str:
 
 
 def show_stats_header_and_value_format(line: List[str]) -> str:
-    return f"  {line[0]:<30s}{line[1]:<s}\n"
+    return f"  {line[0]:<30s}{line[1]}\n"
 
 
 def show_stats_line_format(line: List[str]) -> str:
-    return f"    {line[0]:<28s}{line[1]:<s}\n"
+    return f"    {line[0]:<28s}{line[1]}\n"
 
 
 """ Show VRRP sync helpers """
@@ -97,6 +98,21 @@ def show_sync_group_members_format(line: List[str]) -> str:
     return f"    Interface: {line[0]}, Group: {line[1]}\n"
 
 
+""" Show VRRP timing helpers. """
+SHOW_TIMING_HEADER: List[str] = (
+    ["Phase", "Count", "Total (ms)", "Last (ms)", "Max (ms)"])
+SHOW_TIMING_COUNTER_HEADER: List[str] = ["Counter", "Value"]
+
+
+def show_timing_line_format(values: List[str]) -> str:
+    return (f"{values[0]:<20s}{values[1]:>8s}{values[2]:>14s}"
+            f"{values[3]:>12s}{values[4]:>12s}\n")
+
+
+def show_timing_counter_format(values: List[str]) -> str:
+    return f"{values[0]:<20s}{values[1]:>8s}\n"
+
+
 """ Functions to convert JSON/yang into show output. """
 
 
@@ -845,9 +861,39 @@ def show_vrrp_statistics_filters(
     return output
 
 
+def show_vrrp_timing(metrics: Dict) -> str:
+    """
+    Convert a snapshot from the VCI component's instrumentation into the
+    "show vrrp timing" string representation, one line per phase followed
+    by one line per counter.
+    """
+
+    output: str = show_timing_line_format(SHOW_TIMING_HEADER)
+    phase: str
+    for phase in sorted(metrics["phases"]):
+        timings: Dict = metrics["phases"][phase]
+        output += show_timing_line_format([
+            phase, str(timings["count"]),
+            f"{timings['total'] * 1000:.3f}",
+            f"{timings['last'] * 1000:.3f}",
+            f"{timings['max'] * 1000:.3f}"
+        ])
+    output += "\n" + show_timing_counter_format(SHOW_TIMING_COUNTER_HEADER)
+    counter: str
+    for counter in sorted(metrics["counters"]):
+        output += show_timing_counter_format(
+            [counter, str(metrics["counters"][counter])])
+    output += f"\nRecorded over the last {int(metrics['since'])} seconds\n"
+    return output
+
+
 """ Functions to convert files to JSON"""
 
 
+# Lines starting with this open a new section of the data file
+DATA_SECTION_START: str = "------<"
+
+
 def _convert_track_block_to_yang(config_block: List[str]) -> Dict[str, str]:
     """
     Given a list of strings that maps to a single tracked object convert it
@@ -1014,8 +1060,9 @@ def _convert_keepalived_data_to_yang(
     util.find_config_value() that takes the current dictionary value for the
     key and attempts to find that in the list of strings. If it's found the
     value of that data item overwrites the value in the dictionary for that
-    key. Tracked objects are their own special cases that are dealt with
-    elsewhere in this file.
+    key. The block is indexed once with util.ConfigBlockIndex so each of
+    these lookups is a dictionary access. Tracked objects are their own
+    special cases that are dealt with elsewhere in this file.
     """
 
     instance_dict: Dict = {}
@@ -1027,6 +1074,7 @@ def _convert_keepalived_data_to_yang(
     if config_block == []:
         return instance_dict
 
+    config_block = util.ConfigBlockIndex.from_block(config_block)
     instance_name = config_block[0].split("-")
     intf = instance_name[1]
     vrid = instance_name[2]
@@ -1321,234 +1369,391 @@ def convert_data_file_to_dict(data_string: str) -> Dict:
             }
         }
 
+    The string is handed to convert_data_stream_to_dict() as a stream of
+    lines, see there for how the conversion is done.
+    """
+
+    return convert_data_stream_to_dict(io.StringIO(data_string))
+
+
+def _insert_instance_into_yang(
+    yang_representation: Dict[str, Dict],
+    instance_name: str,
+    instance_dict: Optional[Dict]
+) -> bool:
+    """
+    Add the dictionary for a single VRRP group to the interface it belongs
+    to in the yang representation, creating the interface if needed.
+
+    Arguments:
+        yang_representation: The representation being built up.
+        instance_name: The keepalived name of the group,
+            vyatta-<interface>-<vrid>.
+        instance_dict: The dictionary for the group, None only creates
+            the interface.
+    Returns:
+        False if the group couldn't be placed on an interface.
+    """
+
+    intf_name: str = instance_name.split("-")[1]
+    vif_number: str = ""
+    if "." in intf_name:
+        vif_sep: List[str] = intf_name.split(".")
+        intf_name = vif_sep[0]
+        vif_number = vif_sep[1]
+    interface_types: Dict[Any, Any] = \
+        yang_representation[util.INTERFACE_YANG_NAME]
+    interface_list: List[Dict]
+    # Find the interface type for the interface name, right now this
+    # is just a guess, there might be a better method of doing this
+    # than regexes
+    intf_type: str = util.intf_name_to_type(intf_name)[0]
+    if intf_type not in interface_types:
+        interface_types[intf_type] = []
+    interface_list = interface_types[intf_type]
+
+    # Hackery to find the reference to the interface this VRRP
+    # group should be added to.
+    insertion_point: List[Dict] = util.find_interface_in_yang_repr(
+        intf_name, vif_number, interface_list)
+
+    current_vrrp_namespace: str = util.get_namespace(
+        insertion_point, util.VRRP_YANG_NAMESPACES
+    )
+    if current_vrrp_namespace == "":
+        return False
+    if instance_dict is not None:
+        insertion_point[current_vrrp_namespace][
+            util.YANG_VRRP_GROUP].append(instance_dict)
+    if util.YANG_START_DELAY in insertion_point[current_vrrp_namespace]:
+        del insertion_point[current_vrrp_namespace][util.YANG_START_DELAY]
+    return True
+
+
+def _iter_data_file_blocks(
+    lines: Iterable[str]
+) -> Iterator[Tuple[str, List[str]]]:
+    """
+    Split the lines of a data file into the blocks of lines that relate
+    to a single VRRP group or sync-group in a single pass.
+
+    Arguments:
+        lines: Any iterable of lines, normally the open data file.
+    Yields:
+        A tuple of the kind of block, either util.DATA_INSTANCE_START or
+        util.DATA_SG_INSTANCE_START, and the stripped lines in the block.
+
+    A block runs until the start of the next block or the next top level
+    section header. The NIC header used for tracked interfaces is part of
+    the VRRP group block it is found in.
+    """
+
+    kind: Optional[str] = None
+    block: List[str] = []
+    line: str
+    for line in lines:
+        line = line.strip()
+        if util.DATA_INSTANCE_START in line:
+            next_kind: Optional[str] = util.DATA_INSTANCE_START
+        elif util.DATA_SG_INSTANCE_START in line:
+            next_kind = util.DATA_SG_INSTANCE_START
+        elif (line.startswith(DATA_SECTION_START) and
+                line != util.DATA_TRACK_INTF_DELIMINATOR):
+            next_kind = None
+        else:
+            if kind is not None:
+                block.append(line)
+            continue
+        if kind is not None:
+            yield kind, block
+        kind = next_kind
+        block = [line] if kind is not None else []
+    if kind is not None:
+        yield kind, block
+
+
+def _convert_sync_group_block_to_yang(
+    sync_group: List[str]
+) -> Optional[Dict[str, Union[str, List[str]]]]:
+    """
+    Given the lines for a single sync-group convert them to the dictionary
+    used by "show vrrp sync", returns None if the block has no name.
+    """
+
+    sync_group_show_dict: Dict[str, Union[str, List[str]]] = {}
+    group_name_exists: Union[List, str]
+    try:
+        group_name_exists = \
+            util.find_config_value(
+                sync_group, util.DATA_SG_INSTANCE_START)
+    except ValueError:
+        return None
+    group_tokens: List[str] = group_name_exists.split()
+    sync_group_show_dict[util.YANG_NAME] = group_tokens[1][:-1]
+    sync_group_show_dict[util.YANG_STATE] = group_tokens[-1]
+    members: List[str] = []
+    for instance in sync_group[1:]:
+        if util.DATA_VYATTA_CONST not in instance:
+            continue
+        members.append(instance.split()[-1])
+    sync_group_show_dict[util.YANG_SG_MEMBER] = members
+    return sync_group_show_dict
+
+
+def iter_data_file(
+    lines: Iterable[str]
+) -> Iterator[Tuple[str, str, Dict]]:
+    """
+    Parse a data file one VRRP group or sync-group at a time.
+
+    Arguments:
+        lines: Any iterable of lines, normally the open data file.
+    Yields:
+        A tuple of the kind of block (util.DATA_INSTANCE_START or
+        util.DATA_SG_INSTANCE_START), the name of the group and its
+        dictionary representation.
+
+    Keepalived writes the sync-groups after the VRRP groups so a group
+    yielded here always has an empty sync-group, callers that need it
+    fill it in from the sync-groups that follow.
+    """
+
+    kind: str
+    block: List[str]
+    for kind, block in _iter_data_file_blocks(lines):
+        if kind == util.DATA_INSTANCE_START:
+            yield (kind, block[0].split()[-1],
+                   _convert_keepalived_data_to_yang(block, ""))
+            continue
+        sync_group_show_dict: Optional[Dict] = \
+            _convert_sync_group_block_to_yang(block)
+        if sync_group_show_dict is not None:
+            yield (kind, sync_group_show_dict[util.YANG_NAME],
+                   sync_group_show_dict)
+
+
+def convert_data_stream_to_dict(lines: Iterable[str]) -> Dict:
+    """
+    Convert the lines of the data file into the full yang representation
+    required for show outputs of "show vrrp detail", "show vrrp interfaces",
+    and "show vrrp sync". See convert_data_file_to_dict() for an example of
+    the input and output.
+
+    Arguments:
+        lines: Any iterable of lines, normally the open data file so that
+            it is never held in memory in full.
+    Returns:
+        A python dictionary in a similar format to the YANG representation of
+        VRRP groups.
+
     This function follows a similar flow as convert_to_vci_format_dict() from
     vyatta/keepalived/config_file.py. Builds up a python dictionary from a
     text file by:
-        1) Create a list of strings by splitting the file string on newlines
-            (data_list).
-        2) Finds every index of "VRRP Instance" in the list of strings
-            (config_indexes).
-        3) Using these indexes creates List of strings that logically relate
-            to a single VRRP group (config_blocks).
-        4) Determines if there are any sync-groups in the config by:
-            a) Searches for instances of "VRRP Sync Group" in the data_list.
-            b) Processes any of these groups adding a dictionary of them to the
-               representation for the "show vrrp sync" output.
-            c) Stores the name of sync-group in a dictionary with the VRRP
-                instance name as the key.
-        5) Processes individual blocks of config from config_blocks converting
-            them from a list of strings to a dictionary format. If the name of
-            the VRRP instance in the config block is found in the sync-group
-            dictionary this is passed to the conversion function as well.
-        6) Inserts the data dictionary into the yang representation.
-        7) Returns the full representation.
+        1) Reading the lines once and splitting them into the blocks of
+            lines that relate to a single VRRP group or sync-group
+            (iter_data_file).
+        2) Converting each VRRP group block to a dictionary as soon as it
+            has been read and inserting it into the yang representation.
+        3) Converting each sync-group block to a dictionary for the "show
+            vrrp sync" output, and setting the sync-group of the member
+            VRRP groups already inserted.
+        4) Returns the full representation.
     """
 
-    config_indexes: List[int]
-    config_blocks: List[List[str]]
-    data_list: List[str]
-
     yang_representation: Dict[str, Dict] = {
         util.INTERFACE_YANG_NAME: {}
     }
-    data_list = data_string.split("\n")
-    config_indexes = util.get_config_indexes(
-        data_list, util.DATA_INSTANCE_START)
-    config_blocks = util.get_config_blocks(data_list, config_indexes)
-
-    sync_group_start_indexes: List[int] = util.get_config_indexes(
-        data_list, util.DATA_SG_INSTANCE_START)
-    sync_group_instances: Dict = {}
-    if sync_group_start_indexes != []:
-        yang_representation[util.VRRP_YANG_NAME] = \
-            {f"{util.YANG_SYNC_GROUP}s": []}
-        sync_group_end_index: int = util.get_config_indexes(
-            data_list, util.DATA_INTF_DELIMINATOR
-        )[0]
-        sync_group_data_list = data_list[
-            sync_group_start_indexes[0]:sync_group_end_index
-        ]
-        sync_group_start_indexes = util.get_config_indexes(
-            sync_group_data_list, util.DATA_SG_INSTANCE_START)
-        sync_group_config: List[str] = util.get_config_blocks(
-            sync_group_data_list,
-            sync_group_start_indexes
-        )
-
-        sync_group: str
-        for sync_group in sync_group_config:
-            sync_group_show_dict: Dict[str, Union[str, List[str]]] = {}
-            group_name_exists: Union[List, str]
-            group_tokens: List[str]
-            try:
-                group_name_exists = \
-                    util.find_config_value(
-                        sync_group, util.DATA_SG_INSTANCE_START)
-            except ValueError:
-                continue
-            else:
-                group_tokens = group_name_exists.split()
-            group_name: str = group_tokens[1][:-1]
-            sync_group_show_dict[util.YANG_NAME] = group_name
-            sync_group_show_dict[util.YANG_STATE] = group_tokens[-1]
-            sync_group_show_dict[util.YANG_SG_MEMBER] = []
-            for instance in sync_group[1:]:
-                if util.DATA_VYATTA_CONST not in instance:
-                    continue
-                tokens = instance.split()
-                sync_group_instances[tokens[-1]] = group_name
-                if isinstance(sync_group_show_dict[util.YANG_SG_MEMBER], list):
-                    sync_group_show_dict[util.YANG_SG_MEMBER].append(
-                        tokens[-1]
-                    )
+    instance_states: Dict[str, List[Dict]] = {}
+
+    kind: str
+    name: str
+    block_dict: Dict
+    for kind, name, block_dict in iter_data_file(lines):
+        if kind == util.DATA_SG_INSTANCE_START:
+            if util.VRRP_YANG_NAME not in yang_representation:
+                yang_representation[util.VRRP_YANG_NAME] = \
+                    {f"{util.YANG_SYNC_GROUP}s": []}
             vrrp_group: Dict = yang_representation[util.VRRP_YANG_NAME]
-            vrrp_group[f"{util.YANG_SYNC_GROUP}s"].append(
-                sync_group_show_dict
-            )
+            vrrp_group[f"{util.YANG_SYNC_GROUP}s"].append(block_dict)
+            for member in block_dict[util.YANG_SG_MEMBER]:
+                for state in instance_states.get(member, []):
+                    state[util.YANG_SYNC_GROUP] = name
+            continue
 
-    for block in config_blocks:
-        instance_tokens: List[str] = block[0].split()
-        instance_name: str = instance_tokens[-1]
-        sync: str = ""
-        if instance_name in sync_group_instances:
-            sync = sync_group_instances[instance_name]
-        else:
-            sync = ""
-        instance_dict = _convert_keepalived_data_to_yang(block, sync)
-
-        intf_name: str = instance_name.split("-")[1]
-        vif_number: str = ""
-        if "." in intf_name:
-            vif_sep: List[str] = intf_name.split(".")
-            intf_name = vif_sep[0]
-            vif_number = vif_sep[1]
-        interface_types: Dict[Any, Any] = \
-            yang_representation[util.INTERFACE_YANG_NAME]
-        interface_list: List[Dict]
-        # Find the interface type for the interface name, right now this
-        # is just a guess, there might be a better method of doing this
-        # than regexes
-        intf_type: str = util.intf_name_to_type(intf_name)[0]
-        if intf_type not in interface_types:
-            interface_types[intf_type] = []
-        interface_list = interface_types[intf_type]
-
-        # Hackery to find the reference to the interface this VRRP
-        # group should be added to.
-        insertion_point: List[Dict] = util.find_interface_in_yang_repr(
-            intf_name, vif_number, interface_list)
-
-        current_vrrp_namespace: str = util.get_namespace(
-            insertion_point, util.VRRP_YANG_NAMESPACES
-        )
-        if current_vrrp_namespace == "":
+        if not _insert_instance_into_yang(
+                yang_representation, name, block_dict):
             continue
-        insertion_point[current_vrrp_namespace][util.YANG_VRRP_GROUP].append(
-            instance_dict
-        )
-        if util.YANG_START_DELAY in insertion_point[current_vrrp_namespace]:
-            del insertion_point[current_vrrp_namespace][util.YANG_START_DELAY]
+        if util.YANG_INSTANCE_STATE in block_dict:
+            instance_states.setdefault(name, []).append(
+                block_dict[util.YANG_INSTANCE_STATE])
 
     return yang_representation
 
 
-def _convert_keepalived_stats_to_yang(
-    config_block: List[str]
+# Order of the counters in a group's stats record. Each entry is the
+# section of the stats file and the counters keepalived writes under it,
+# or None for a section that is a single counter.
+STATS_LAYOUT: Tuple[Tuple[str, Optional[Tuple[str, ...]]], ...] = (
+    (util.STATS_ADVERT_KEY, (util.STATS_RECV_KEY, util.STATS_SENT_KEY)),
+    (util.STATS_BECOME_KEY, None),
+    (util.STATS_RELEASE_KEY, None),
+    (util.STATS_PACKET_KEY, (
+        util.STATS_LENGTH_KEY, util.STATS_TTL_KEY,
+        util.STATS_INVALID_TYPE_KEY, util.STATS_ADVERT_INTERVAL_KEY,
+        util.STATS_ADDRESS_LIST_KEY
+    )),
+    (util.STATS_AUTH_ERROR_KEY, (
+        util.STATS_INVALID_TYPE_KEY, util.STATS_TYPE_MISMATCH_KEY,
+        util.STATS_FAILURE_KEY
+    )),
+    (util.STATS_PZERO_KEY, (util.STATS_RECV_KEY, util.STATS_SENT_KEY)),
+)
+
+
+def _stats_sections() -> Tuple[List[Tuple[str, int, int]], int]:
+    """
+    Work out the text that identifies each section's line in the stats
+    file, the position of the section's first counter in a record and
+    how many counter lines follow it. Also returns the record size.
+    """
+
+    sections: List[Tuple[str, int, int]] = []
+    slot: int = 0
+    for section, counters in STATS_LAYOUT:
+        search: str = util.STATS_PZERO_SEARCH_STR \
+            if section == util.STATS_PZERO_KEY else section
+        count: int = len(counters) if counters is not None else 0
+        sections.append((search.casefold(), slot, count))
+        slot += max(count, 1)
+    return sections, slot
+
+
+STATS_SECTIONS: List[Tuple[str, int, int]]
+STATS_RECORD_SIZE: int
+STATS_SECTIONS, STATS_RECORD_SIZE = _stats_sections()
+
+
+def _stats_counter(line: str) -> Union[int, str]:
+    tokens: List[str] = line.split()
+    value: str = tokens[-1] if tokens else ""
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+def _convert_stats_record_to_yang(
+    instance_name: str, record: List[Union[int, str]]
 ) -> Dict:
     """
-    Given a list of strings representing the statistics of a VRRP group
-    convert this information into a dictionary to be added to a yang
-    representation.
+    Given the counters read for a single VRRP group build the dictionary
+    added to the yang representation.
 
     Arguments:
-        config_block: A list of strings denoting the stats for a single
-                      VRRP group.
+        instance_name: The keepalived name of the group.
+        record: The group's counters in STATS_LAYOUT order.
 
     Returns:
         instance_dict:
             Formatted values from the stats file for a single VRRP group.
     """
 
-    instance_dict: Dict = {}
-    key: str
-    vrid: str
+    stats: Dict = {}
+    slot: int = 0
+    for section, counters in STATS_LAYOUT:
+        if counters is None:
+            stats[section] = record[slot]
+            slot += 1
+            continue
+        stats[section] = {
+            counter: record[slot + index]
+            for index, counter in enumerate(counters)
+        }
+        slot += len(counters)
+    return {"stats": stats,
+            util.YANG_TAGNODE: int(instance_name.split("-")[2])}
 
-    if config_block == []:
-        return instance_dict
 
-    instance_name = config_block[0].split("-")
-    vrid = instance_name[2]
+def iter_stats_file(
+    lines: Iterable[str], filter_intf: str = "", filter_grp: str = ""
+) -> Iterator[Tuple[str, Optional[Dict]]]:
+    """
+    Parse the stats file line by line, one VRRP group at a time.
 
-    instance_dict = \
-        {
-            util.STATS_ADVERT_KEY: {
-                util.STATS_RECV_KEY: "",
-                util.STATS_SENT_KEY: ""
-            },
-            util.STATS_BECOME_KEY: "",
-            util.STATS_RELEASE_KEY: "",
-            util.STATS_PACKET_KEY: {
-                util.STATS_LENGTH_KEY: "",
-                util.STATS_TTL_KEY: "",
-                util.STATS_INVALID_TYPE_KEY: "",
-                util.STATS_ADVERT_INTERVAL_KEY: "",
-                util.STATS_ADDRESS_LIST_KEY: ""
-            },
-            util.STATS_AUTH_ERROR_KEY: {
-                util.STATS_INVALID_TYPE_KEY: "",
-                util.STATS_TYPE_MISMATCH_KEY: "",
-                util.STATS_FAILURE_KEY: 0
-            },
-            util.STATS_PZERO_KEY: {
-                util.STATS_RECV_KEY: "",
-                util.STATS_SENT_KEY: ""
-            }
-        }
+    Arguments:
+        lines: Any iterable of lines, normally the open stats file.
+        filter_intf: Only yield groups on this interface.
+        filter_grp: Only yield this group, with filter_intf reading stops
+            as soon as the group has been read.
+    Yields:
+        A tuple of the keepalived name of the group and its dictionary
+        representation, counters are integers. Other groups on filter_intf
+        are yielded with None in place of the dictionary so that callers
+        can tell the interface exists.
+
+    Counters follow their section line in the order given by STATS_LAYOUT,
+    only the counters of groups that pass the filters are kept.
+    """
 
-    # Single line config code
-    config_index: int = 0
-    value: List[str]
-    while config_index < len(config_block):
-        line: str = config_block[config_index].casefold()
-        if util.STATS_ADVERT_KEY.casefold() in line:
-            for key in instance_dict[util.STATS_ADVERT_KEY]:
-                config_index += 1
-                value = config_block[config_index].split()
-                instance_dict[util.STATS_ADVERT_KEY][key] = value[-1]
-        elif util.STATS_BECOME_KEY.casefold() in line:
-            value = config_block[config_index].split()
-            instance_dict[util.STATS_BECOME_KEY] = value[-1]
-        elif util.STATS_RELEASE_KEY.casefold() in line:
-            value = config_block[config_index].split()
-            instance_dict[util.STATS_RELEASE_KEY] = value[-1]
-        elif util.STATS_PACKET_KEY.casefold() in line:
-            for key in instance_dict[util.STATS_PACKET_KEY]:
-                config_index += 1
-                value = config_block[config_index].split()
-                instance_dict[util.STATS_PACKET_KEY][key] = value[-1]
-        elif util.STATS_AUTH_ERROR_KEY.casefold() in line:
-            for key in instance_dict[util.STATS_AUTH_ERROR_KEY]:
-                config_index += 1
-                value = config_block[config_index].split()
-                instance_dict[util.STATS_AUTH_ERROR_KEY][key] = value[-1]
-        elif util.STATS_PZERO_SEARCH_STR.casefold() in line:
-            for key in instance_dict[util.STATS_PZERO_KEY]:
-                config_index += 1
-                value = config_block[config_index].split()
-                instance_dict[util.STATS_PZERO_KEY][key] = value[-1]
-        config_index += 1
-
-    return {"stats": instance_dict, util.YANG_TAGNODE: int(vrid)}
+    filter_vrid: int = -1
+    if filter_grp != "":
+        try:
+            filter_vrid = int(filter_grp)
+        except ValueError:
+            # Not a group number so no group matches
+            pass
+    instance_name: Optional[str] = None
+    record: Optional[List[Union[int, str]]] = None
+    pending_slot: int = 0
+    pending_count: int = 0
+    line: str
+    for line in lines:
+        if util.DATA_INSTANCE_START in line:
+            if record is not None:
+                yield (instance_name,
+                       _convert_stats_record_to_yang(instance_name, record))
+                if filter_intf != "" and filter_grp != "":
+                    return
+            instance_name = line.split()[-1]
+            record = None
+            pending_count = 0
+            name_tokens: List[str] = instance_name.split("-")
+            if filter_intf != "" and name_tokens[1] != filter_intf:
+                continue
+            if filter_grp != "" and int(name_tokens[2]) != filter_vrid:
+                yield instance_name, None
+                continue
+            record = [0] * STATS_RECORD_SIZE
+            continue
+        if record is None:
+            continue
+        if pending_count > 0:
+            record[pending_slot] = _stats_counter(line)
+            pending_slot += 1
+            pending_count -= 1
+            continue
+        casefold_line: str = line.casefold()
+        for search, slot, count in STATS_SECTIONS:
+            if search not in casefold_line:
+                continue
+            if count == 0:
+                record[slot] = _stats_counter(line)
+            else:
+                pending_slot = slot
+                pending_count = count
+            break
+    if record is not None:
+        yield instance_name, _convert_stats_record_to_yang(
+            instance_name, record)
 
 
 def convert_stats_file_to_dict(data_string: str) -> Dict:
     """
-    Convert a string from the data file into the full yang representation
-    required for show outputs of "show vrrp detail", "show vrrp interfaces",
-    and "show vrrp sync"
+    Convert a string from the stats file into the full yang representation
+    required for the "show vrrp statistics" output.
 
     Arguments:
-        data_string: A string obtained from /tmp/keepalived.data
+        data_string: A string obtained from /run/keepalived/keepalived.stats
     Returns:
         A python dictionary in a similar format to the YANG representation of
         VRRP groups.
@@ -1588,26 +1793,26 @@ VRRP Instance: vyatta-dp0p1s1-1
                                     "tagnode": 1,
                                     "stats": {
                                         "Advertisements": {
-                                            "Received": "0",
-                                            "Sent": "615"
+                                            "Received": 0,
+                                            "Sent": 615
                                         },
-                                        "Became master": "1",
-                                        "Released master": "0",
+                                        "Became master": 1,
+                                        "Released master": 0,
                                         "Packet errors": {
-                                            "Length": "0",
-                                            "TTL": "0",
-                                            "Invalid type": "0",
-                                            "Advertisement interval": "0",
-                                            "Address list": "0"
+                                            "Length": 0,
+                                            "TTL": 0,
+                                            "Invalid type": 0,
+                                            "Advertisement interval": 0,
+                                            "Address list": 0
                                         },
                                         "Authentication errors": {
-                                            "Invalid type": "0",
-                                            "Type mismatch": "0",
-                                            "Failure": "0"
+                                            "Invalid type": 0,
+                                            "Type mismatch": 0,
+                                            "Failure": 0
                                         },
                                         "Priority zero advertisements": {
-                                            "Received": "0",
-                                            "Sent": "0"
+                                            "Received": 0,
+                                            "Sent": 0
                                         }
                                     }
                                 }
@@ -1618,73 +1823,43 @@ VRRP Instance: vyatta-dp0p1s1-1
             }
         }
 
-    This function follows a similar flow as convert_to_vci_format_dict() from
-    vyatta/keepalived/config_file.py. Builds up a python dictionary from a
-    text file by:
-        1) Create a list of strings by splitting the file string on
-            newlines (data_list).
-        2) Finds every index of "VRRP Instance" in the list of strings
-            (config_indexes).
-        3) Using these indexes creates List of strings that logically relate
-            to a single VRRP group (config_blocks).
-        4) Processes individual blocks of stats from config_blocks converting
-            them from a list of strings to a dictionary format.
-        5) Inserts the data dictionary into the yang representation.
-        6) Returns the full representation.
+    The string is handed to convert_stats_stream_to_dict() as a stream of
+    lines, see there for how the conversion is done.
     """
 
-    data_dict: dict
-    config_indexes: List[int]
-    config_blocks: List[List[str]]
-    data_list: List[str]
+    return convert_stats_stream_to_dict(io.StringIO(data_string))
+
+
+def convert_stats_stream_to_dict(
+    lines: Iterable[str], filter_intf: str = "", filter_grp: str = ""
+) -> Dict:
+    """
+    Convert the lines of the stats file into the full yang representation
+    required for the "show vrrp statistics" output. See
+    convert_stats_file_to_dict() for an example of the input and output.
+
+    Arguments:
+        lines: Any iterable of lines, normally the open stats file.
+        filter_intf: Only include groups on this interface.
+        filter_grp: Only include this group on filter_intf, the rest of the
+            file isn't read once it has been found.
+    Returns:
+        A python dictionary in a similar format to the YANG representation of
+        VRRP groups.
+
+    Only one group's counters are held while the file is read, each is
+    added to the yang representation as soon as it is complete.
+    """
 
     yang_representation: Dict[str, Dict] = {
         util.INTERFACE_YANG_NAME: {}
     }
-    data_list = data_string.split("\n")
-    config_indexes = util.get_config_indexes(
-        data_list, util.DATA_INSTANCE_START)
-    config_blocks = util.get_config_blocks(data_list, config_indexes)
-
-    for block in config_blocks:
-        instance_tokens: List[str] = block[0].split()
-        instance_name: str = instance_tokens[-1]
-
-        instance_dict = _convert_keepalived_stats_to_yang(block)
-
-        intf_name: str = instance_name.split("-")[1]
-        vif_number: str = ""
-        if "." in intf_name:
-            vif_sep: List[str] = intf_name.split(".")
-            intf_name = vif_sep[0]
-            vif_number = vif_sep[1]
-        interface_types: Dict[Any, Any] = \
-            yang_representation[util.INTERFACE_YANG_NAME]
-        interface_list: List[Dict]
-        # Find the interface type for the interface name, right now this
-        # is just a guess, there might be a better method of doing this
-        # than regexes
-        intf_type: str = util.intf_name_to_type(intf_name)[0]
-        if intf_type not in interface_types:
-            interface_types[intf_type] = []
-        interface_list = interface_types[intf_type]
-
-        # Hackery to find the reference to the interface this VRRP
-        # group should be added to.
-        insertion_point: List[Dict] = util.find_interface_in_yang_repr(
-            intf_name, vif_number, interface_list)
-
-        current_vrrp_namespace: str = util.get_namespace(
-            insertion_point, util.VRRP_YANG_NAMESPACES
-        )
-        if current_vrrp_namespace == "":
-            continue
-        insertion_point[current_vrrp_namespace][util.YANG_VRRP_GROUP].append(
-            instance_dict
-        )
-        if util.YANG_START_DELAY in insertion_point[current_vrrp_namespace]:
-            del insertion_point[current_vrrp_namespace][util.YANG_START_DELAY]
-
+    instance_name: str
+    instance_dict: Optional[Dict]
+    for instance_name, instance_dict in iter_stats_file(
+            lines, filter_intf, filter_grp):
+        _insert_instance_into_yang(
+            yang_representation, instance_name, instance_dict)
     return yang_representation
 
 
@@ -2,38 +2,63 @@
 # All rights reserved.
 # SPDX-License-Identifier: GPL-2.0-only
 
+import contextlib
 import json
 import logging
 import subprocess
-from typing import Any, Dict, List
-
-import pydbus
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 
 import vci  # pylint: disable=import-error
 
 
+import vyatta.vrrp_vci.keepalived.dbus.system_bus as system_bus
 import vyatta.vrrp_vci.keepalived.util as util
 from vyatta.vrrp_vci.abstract_vrrp_classes import ConfigFile
 from vyatta.vrrp_vci.keepalived.dbus.process_control import ProcessControl
+from vyatta.vrrp_vci.keepalived.dbus.state_cache import StateCache
 from vyatta.vrrp_vci.keepalived.dbus.vrrp_group_connection import (
-    VrrpConnection
+    VrrpConnection, get_instance_states, send_garps
+)
+from vyatta.vrrp_vci.keepalived.instance_registry import RegisteredInstance
+from vyatta.vrrp_vci.keepalived.instrumentation import (
+    Instrumentation, get_instrumentation
 )
 
 
-def send_garp(rpc_input: Dict[str, str]) -> None:
+def send_garp(
+    rpc_input: Dict[str, str], config_impl: Optional[ConfigFile] = None
+) -> None:
+    """
+    Send a GARP from the group, found in the groups config_impl was last
+    updated with. Without config_impl the group is assumed to be IPv4.
+    """
     intf: str = rpc_input[util.RPC_GARP_INTERFACE]
     group: str = str(rpc_input[util.RPC_GARP_GROUP])
+    log = logging.getLogger(util.LOGGING_MODULE_NAME)
+    vrrp_conn: VrrpConnection
+    if config_impl is not None:
+        instance: Optional[RegisteredInstance] = \
+            config_impl.instances.find(intf, group)
+        if instance is None:
+            log.info(
+                f"Can't send GARP for VRRP group {group} on {intf}, "
+                f"the group isn't configured"
+            )
+            return
+        vrrp_conn = instance.connection
+    else:
+        vrrp_conn = VrrpConnection(
+            intf, group, 4, system_bus.get_system_bus()
+        )
     pc = ProcessControl()
     if not pc.is_running():
         return
     try:
-        vrrp_conn = VrrpConnection(
-            intf, group, 4, pydbus.SystemBus()
-        )
         vrrp_conn.garp()
     except Exception as e:
         # Horrible but pydbus doesn't actually export any Exceptions
-        log = logging.getLogger(util.LOGGING_MODULE_NAME)
         log.info(
             f"Error trying to send GARP for VRRP group "
             f"{group} on {intf}, does the group/intf combination exist?"
@@ -42,17 +67,169 @@ def send_garp(rpc_input: Dict[str, str]) -> None:
     return
 
 
-def rfc_intf_map(rpc_input: Dict[str, str]) -> Dict[str, str]:
+# Held while a queued bulk GARP is being sent so overlapping requests
+# are sent one after the other, never more than the rate asked for
+_garp_lock: threading.Lock = threading.Lock()
+
+
+def _send_queued_garps(
+    connections: List[VrrpConnection], rate: float
+) -> None:
+    log = logging.getLogger(util.LOGGING_MODULE_NAME)
+    with _garp_lock:
+        errors: List[Optional[str]] = send_garps(connections, rate)
+    conn: VrrpConnection
+    error: Optional[str]
+    for conn, error in zip(connections, errors):
+        if error is not None:
+            log.info(f"Failed to send GARP for {conn.instance_name}: {error}")
+
+
+def garp_instances(
+    instances: List[RegisteredInstance], sync_group: str = "",
+    rate: float = util.GARP_BULK_RATE, wait: bool = True
+) -> List[Dict[str, Union[str, int]]]:
+    """
+    Send a GARP from every group in instances that is master, and in
+    sync_group if one is given, paced at rate GARPs per second.
+
+    Without wait the GARPs are sent from a background thread, master
+    groups are reported as queued and any failures are only logged.
+
+    Return:
+        The result for each group in the order of instances, groups that
+        aren't in sync_group are left out. Each result has the interface,
+        group and status, along with the error for groups that failed.
+    """
+
+    states: List[Optional[Dict]] = get_instance_states(
+        [instance.connection for instance in instances]
+    )
+    results: List[Dict[str, Union[str, int]]] = []
+    masters: List[Dict[str, Union[str, int]]] = []
+    connections: List[VrrpConnection] = []
+    instance: RegisteredInstance
+    state: Optional[Dict]
+    for instance, state in zip(instances, states):
+        result: Dict[str, Union[str, int]] = {
+            util.YANG_INTERFACE_CONST: instance.intf,
+            util.GARP_RESULT_GROUP: instance.vrid,
+        }
+        if state is None:
+            if sync_group != "":
+                # Can't tell which sync group it's in
+                continue
+            result[util.GARP_RESULT_STATUS] = util.GARP_STATUS_FAILED
+            result[util.GARP_RESULT_ERROR] = "No response from the group"
+            results.append(result)
+            continue
+        instance_state: Dict = state[util.YANG_INSTANCE_STATE]
+        if sync_group != "" and \
+                instance_state[util.YANG_SYNC_GROUP] != sync_group:
+            continue
+        if instance_state[util.YANG_STATE] != util.VrrpState.MASTER.name:
+            result[util.GARP_RESULT_STATUS] = util.GARP_STATUS_NOT_MASTER
+        else:
+            masters.append(result)
+            connections.append(instance.connection)
+        results.append(result)
+    if not wait:
+        for result in masters:
+            result[util.GARP_RESULT_STATUS] = util.GARP_STATUS_QUEUED
+        if connections:
+            threading.Thread(
+                target=_send_queued_garps, args=(connections, rate),
+                daemon=True
+            ).start()
+        return results
+    error: Optional[str]
+    for result, error in zip(masters, send_garps(connections, rate)):
+        if error is None:
+            result[util.GARP_RESULT_STATUS] = util.GARP_STATUS_SENT
+        else:
+            result[util.GARP_RESULT_STATUS] = util.GARP_STATUS_FAILED
+            result[util.GARP_RESULT_ERROR] = error
+    return results
+
+
+def send_bulk_garp(
+    rpc_input: Dict[str, Any], config_impl: ConfigFile
+) -> Dict[str, List[Dict[str, Union[str, int]]]]:
+    """
+    Send a GARP from every master group on an interface, in a sync group
+    or, without either filter, on the whole box. Groups are found in the
+    groups config_impl was last updated with. Only the group states are
+    waited for, the paced sends run in the background so the RPC doesn't
+    take as many seconds as there are groups divided by the rate.
+    """
+    intf: str = rpc_input.get(util.RPC_GARP_INTERFACE, "")
+    sync_group: str = rpc_input.get(util.RPC_GARP_SYNC_GROUP, "")
+    rate: float = float(
+        rpc_input.get(util.RPC_GARP_RATE, util.GARP_BULK_RATE)
+    )
+    instances: List[RegisteredInstance]
+    if intf != "":
+        instances = config_impl.instances.on_interface(intf)
+    else:
+        instances = list(config_impl.instances)
+    pc = ProcessControl()
+    if not instances or not pc.is_running():
+        return {util.RPC_GARP_RESULT: []}
+    return {
+        util.RPC_GARP_RESULT: garp_instances(
+            instances, sync_group, rate, wait=False
+        )
+    }
+
+
+def rfc_intf_map(
+    rpc_input: Dict[str, str], config_impl: Optional[ConfigFile] = None
+) -> Dict[str, str]:
+    """
+    Answer from the groups config_impl was last updated with, only asking
+    keepalived over DBus if it hasn't been given any config yet.
+    """
+    transmit_intf: str = rpc_input[util.RPC_RFC_INTERFACE]
+    if config_impl is not None:
+        mapping: Optional[Tuple[str, int]] = \
+            config_impl.get_rfc_mapping(transmit_intf)
+        if mapping is not None:
+            return {
+                util.RPC_RFC_MAPPING_RECEIVE: mapping[0],
+                util.RPC_RFC_MAPPING_GROUP: mapping[1]
+            }
     pc = ProcessControl()
-    return pc.get_rfc_mapping(rpc_input[util.RPC_RFC_INTERFACE])
+    return pc.get_rfc_mapping(transmit_intf)
 
 
 class Config(vci.Config):
 
     # Class attributes that will be the same across all instances
-    def __init__(self, config_impl) -> None:
+    def __init__(
+        self, config_impl,
+        coalesce_window: float = util.CONFIG_COALESCE_WINDOW
+    ) -> None:
+        """
+        Arguments:
+            config_impl:
+                The ConfigFile implementation to configure.
+            coalesce_window (float):
+                A commit arriving within this many seconds of the last
+                applied one is held back, along with any others that
+                follow it, and only the latest is applied once the window
+                closes. 0 turns this off. If applying it fails the error
+                is raised by the next set or flush.
+        """
         super().__init__()
         self._conf_obj = config_impl
+        self.coalesce_window: float = coalesce_window
+        self._pending_lock: threading.RLock = threading.RLock()
+        self._pending_conf: Optional[Dict[str, Any]] = None
+        self._pending_timer: Optional[threading.Timer] = None
+        self._last_applied: Optional[float] = None
+        # Failure applying held back config once the window closed, kept
+        # for the next set or flush as the timer has nobody to tell
+        self._timer_error: Optional[Exception] = None
         if not isinstance(self._conf_obj, ConfigFile):
             raise TypeError("Implementation of config object does not "
                             "inherit from abstract class, developer needs "
@@ -62,14 +239,95 @@ class Config(vci.Config):
         self.pc = ProcessControl()
 
     def set(self, conf: Dict[str, Any]) -> None:
-        conf = util.sanitize_vrrp_config(conf)
+        with self._pending_lock:
+            self._raise_timer_error()
+            if self.coalesce_window <= 0:
+                self._apply(conf)
+                return
+            now: float = time.monotonic()
+            if self._pending_timer is None and (
+                self._last_applied is None or
+                now - self._last_applied >= self.coalesce_window
+            ):
+                self._apply(conf)
+                self._last_applied = now
+                return
+            # Every commit carries the complete config so the latest one
+            # replaces anything that is still waiting
+            self._pending_conf = conf
+            if self._pending_timer is None:
+                self.log.debug(
+                    f"Holding config for {self.coalesce_window} seconds "
+                    f"to merge with following commits"
+                )
+                self._pending_timer = threading.Timer(
+                    self.coalesce_window, self._flush_from_timer)
+                self._pending_timer.daemon = True
+                self._pending_timer.start()
+
+    def flush(self) -> None:
+        """
+        Apply any config that is being held back by the coalescing window
+        straight away. Raises the error from applying held back config
+        when the window closed, if there was one.
+        """
+        with self._pending_lock:
+            self._raise_timer_error()
+            self._flush_pending()
+
+    def _flush_pending(self) -> None:
+        with self._pending_lock:
+            if self._pending_timer is not None:
+                self._pending_timer.cancel()
+                self._pending_timer = None
+            conf: Optional[Dict[str, Any]] = self._pending_conf
+            self._pending_conf = None
+            if conf is not None:
+                self._apply(conf)
+                self._last_applied = time.monotonic()
+
+    @contextlib.contextmanager
+    def locked(self) -> Iterator[None]:
+        """
+        Apply any config being held back and keep further commits from
+        being applied until the body of the with statement is done. Used
+        by anything reading the config object from another thread, like
+        the show query server, so it never sees an update half done.
+        """
+        with self._pending_lock:
+            self._flush_pending()
+            yield
+
+    def _flush_from_timer(self) -> None:
+        with self._pending_lock:
+            try:
+                self._flush_pending()
+            except Exception as e:
+                self.log.exception("Failed to apply coalesced VRRP config")
+                self._timer_error = e
+
+    def _raise_timer_error(self) -> None:
+        error: Optional[Exception] = self._timer_error
+        self._timer_error = None
+        if error is not None:
+            raise error
+
+    def _apply(self, conf: Dict[str, Any]) -> None:
+        with get_instrumentation().timer("config.set"):
+            self._apply_phases(conf)
+
+    def _apply_phases(self, conf: Dict[str, Any]) -> None:
+        metrics: Instrumentation = get_instrumentation()
+        with metrics.timer("config.sanitize"):
+            conf = util.sanitize_vrrp_config(conf)
 
         # If all the default config has been removed and
         # there's nothing left in the interfaces dictionary
         # just return as we have nothing left to do
         if {} == conf[util.INTERFACE_YANG_NAME]:
             if self.pc.is_running():
-                self.pc.shutdown_process()
+                with metrics.timer("config.reload"):
+                    self.pc.shutdown_process()
                 self._conf_obj.shutdown()
             return
         self.log.debug(
@@ -77,13 +335,23 @@ class Config(vci.Config):
             f"{json.dumps(conf, indent=4, sort_keys=True)}"
         )
 
-        self._conf_obj.update(conf)
-        self._conf_obj.write_config()
+        with metrics.timer("config.update"):
+            self._conf_obj.update(conf)
+        with metrics.timer("config.write"):
+            needs_reload: bool = self._conf_obj.write_config()
         if self.pc.is_running():
-            self.pc.reload_process_config()
+            if not needs_reload:
+                self.log.info(
+                    f"{self._conf_obj.impl_name()} running config doesn't "
+                    f"need updated, skipping reload"
+                )
+                return
+            with metrics.timer("config.reload"):
+                self.pc.reload_process_config()
         else:
             subprocess.Popen([util.DBUS_NOTIFY_SCRIPT]).pid
-            self.pc.start_process()
+            with metrics.timer("config.reload"):
+                self.pc.start_process()
         self.log.info(
             f"{self._conf_obj.impl_name()} config written to "
             f"{self._conf_obj.config_file_path()}"
@@ -91,15 +359,18 @@ class Config(vci.Config):
         return
 
     def get(self) -> Dict[str, Any]:
-        file_config: str = self._conf_obj.read_config()
-        yang_repr: Dict[str, Any] = \
-            self._conf_obj.convert_to_vci_format(file_config)
+        with self.locked(), get_instrumentation().timer("config.get"):
+            yang_repr: Dict[str, Any] = self._conf_obj.get_vci_format()
         self.log.info(
             f"{yang_repr} yang repr returned to vci infra"
         )
         return yang_repr
 
     def check(self, conf: Dict[str, Any]) -> None:
+        with get_instrumentation().timer("config.check"):
+            self._check(conf)
+
+    def _check(self, conf: Dict[str, Any]) -> None:
         if conf == {}:
             return
         conf = util.sanitize_vrrp_config(conf)
@@ -130,11 +401,30 @@ class Config(vci.Config):
         return
 
 
+# The VRRP config of an interface, its groups and each group's connection
+_PendingInterface = Tuple[Dict, List[Dict], List[Optional[VrrpConnection]]]
+
+
 class State(vci.State):
 
-    def __init__(self, config_impl) -> None:
+    def __init__(
+        self, config_impl, state_cache: Optional[StateCache] = None,
+        config: Optional[Config] = None
+    ) -> None:
+        """
+        Arguments:
+            config_impl:
+                The ConfigFile implementation to report state for.
+            state_cache (StateCache):
+                Optional cache of group state kept up to date by signals.
+            config (Config):
+                The Config object applying commits, any commit it is
+                holding back is applied before state is read.
+        """
         super().__init__()
         self._conf_obj = config_impl
+        self._state_cache: Optional[StateCache] = state_cache
+        self._config: Optional[Config] = config
         if not isinstance(self._conf_obj, ConfigFile):
             raise TypeError("Implementation of config object does not "
                             "inherit from abstract class, developer needs "
@@ -144,12 +434,43 @@ class State(vci.State):
         self.pc = ProcessControl()
 
     def get(self) -> Dict[str, Any]:
+        with get_instrumentation().timer("state.get"):
+            return self._get()
+
+    @contextlib.contextmanager
+    def _config_locked(self) -> Iterator[None]:
+        if self._config is None:
+            yield
+            return
+        with self._config.locked():
+            yield
+
+    def _get(self) -> Dict[str, Any]:
+        metrics: Instrumentation = get_instrumentation()
         if not self.pc.is_running():
             return {}
-        file_config: str = self._conf_obj.read_config()
-        yang_repr: Dict[str, Any] = self._conf_obj.convert_to_vci_format_dict(
-            file_config)
-        sysbus = pydbus.SystemBus()
+        # Only the config object is read under the lock, commits can go
+        # ahead while the groups are asked for their state
+        with self._config_locked():
+            yang_repr: Dict[str, Any]
+            pending: List[_PendingInterface]
+            yang_repr, pending = self._find_instances()
+        with metrics.timer("state.dbus"):
+            self._collect_instance_states(pending)
+        return yang_repr
+
+    def _find_instances(
+        self
+    ) -> Tuple[Dict[str, Any], List[_PendingInterface]]:
+        """
+        The YANG model of the running config along with the connection for
+        every group in it, grouped by interface for _collect_instance_states.
+        """
+
+        with get_instrumentation().timer("state.parse"):
+            yang_repr: Dict[str, Any] = \
+                self._conf_obj.get_vci_format_dict()
+        pending: List[_PendingInterface] = []
         for intf_type in yang_repr[util.INTERFACE_YANG_NAME]:
             intf_list: List = yang_repr[util.INTERFACE_YANG_NAME][intf_type]
             for intf in intf_list:
@@ -160,18 +481,25 @@ class State(vci.State):
                     continue
                 transmit_intf: str = intf[intf_name_key]
                 self._generate_interfaces_vrrp_connection_list(
-                    intf, transmit_intf, sysbus)
+                    intf, transmit_intf, pending)
                 if util.VIF_YANG_NAME in intf:
                     for vif_intf in intf[util.VIF_YANG_NAME]:
                         vif_transmit_intf: str = \
                             f"{transmit_intf}.{vif_intf[util.YANG_TAGNODE]}"
                         self._generate_interfaces_vrrp_connection_list(
-                            vif_intf, vif_transmit_intf, sysbus)
-        return yang_repr
+                            vif_intf, vif_transmit_intf, pending)
+        return yang_repr, pending
 
     def _generate_interfaces_vrrp_connection_list(
-        self, intf: Dict, transmit_intf: str, sysbus
+        self, intf: Dict, transmit_intf: str,
+        pending: List[_PendingInterface]
     ) -> None:
+        """
+        Find the connection for every group on the interface and add them
+        to pending, the state for all of them is queried in one go by
+        _collect_instance_states.
+        """
+
         current_vrrp_namespace: str = util.get_namespace(
             intf, util.VRRP_YANG_NAMESPACES
         )
@@ -181,45 +509,71 @@ class State(vci.State):
             del intf[current_vrrp_namespace][util.YANG_START_DELAY]
         vrrp_instances: List[Dict] = \
             intf[current_vrrp_namespace][util.YANG_VRRP_GROUP]
-        state_instances = []
-        for vrrp_instance in vrrp_instances:
-            vrrp_conn: VrrpConnection
-            vrrp_conn = self._generate_vrrp_connection(
-                vrrp_instance, transmit_intf, sysbus
-            )
-            try:
-                state_future = vrrp_conn.get_instance_state()
-            except KeyError:
-                state_future = {
-                    util.YANG_INSTANCE_STATE:
-                        {
-                            util.YANG_IPAO: False,
-                            util.YANG_LAST_TRANSITION: 0,
-                            util.YANG_RFC_INTF: "",
-                            util.YANG_STATE: "FAULT",
-                            util.YANG_SYNC_GROUP: ""
-                        },
-                    util.YANG_TAGNODE: f"{vrrp_instance['tagnode']}"
-                }
-            state_instances.append(state_future)
-        intf[current_vrrp_namespace][util.YANG_VRRP_GROUP] = \
-            state_instances
+        connections: List[Optional[VrrpConnection]] = [
+            self._generate_vrrp_connection(vrrp_instance, transmit_intf)
+            for vrrp_instance in vrrp_instances
+        ]
+        pending.append(
+            (intf[current_vrrp_namespace], vrrp_instances, connections))
+
+    def _collect_instance_states(
+        self, pending: List[_PendingInterface]
+    ) -> None:
+        """
+        Query the state of every pending group concurrently, or read it
+        from the state cache when there is one, and replace each
+        interface's group list with the state that was found. Groups
+        that don't answer or aren't registered are reported as FAULT.
+        """
+
+        all_connections: List[VrrpConnection] = [
+            conn for _, _, connections in pending for conn in connections
+            if conn is not None
+        ]
+        get_instrumentation().count("groups-queried", len(all_connections))
+        found: List[Optional[Dict]]
+        if self._state_cache is not None:
+            found = self._state_cache.get_states(all_connections)
+        else:
+            found = get_instance_states(all_connections)
+        states: Iterator[Optional[Dict]] = iter(found)
+        for vrrp_dict, vrrp_instances, connections in pending:
+            state_instances: List[Dict] = []
+            for vrrp_instance, conn in zip(vrrp_instances, connections):
+                state: Optional[Dict] = \
+                    None if conn is None else next(states)
+                if state is None:
+                    state = {
+                        util.YANG_INSTANCE_STATE:
+                            {
+                                util.YANG_IPAO: False,
+                                util.YANG_LAST_TRANSITION: 0,
+                                util.YANG_RFC_INTF: "",
+                                util.YANG_STATE: "FAULT",
+                                util.YANG_SYNC_GROUP: ""
+                            },
+                        util.YANG_TAGNODE: f"{vrrp_instance['tagnode']}"
+                    }
+                state_instances.append(state)
+            vrrp_dict[util.YANG_VRRP_GROUP] = state_instances
 
     def _generate_vrrp_connection(
-        self, vrrp_instance, transmit_intf, sysbus
-    ) -> VrrpConnection:
+        self, vrrp_instance, transmit_intf
+    ) -> Optional[VrrpConnection]:
+        """
+        The connection for the group from the config object's registry,
+        None if the config object hasn't been updated with the group. A
+        process that didn't write the config, like the op mode scripts,
+        must call update_from_file on the config object first.
+        """
+
         vrid: str = vrrp_instance[util.YANG_TAGNODE]
-        instance_name: str = f"vyatta-{transmit_intf}-{vrid}"
-        vrrp_conn: VrrpConnection = None
-        if instance_name not in \
-                self._conf_obj.vrrp_connections:
-            af_type: int = util.get_ip_version(
-                vrrp_instance[util.YANG_VIP][0].split("/")[0])
-            vrrp_conn = \
-                VrrpConnection(
-                    transmit_intf, vrid, af_type, sysbus
-                )
-        else:
-            vrrp_conn = \
-                self._conf_obj.vrrp_connections[instance_name]
-        return vrrp_conn
+        instance: Optional[RegisteredInstance] = \
+            self._conf_obj.instances.find(transmit_intf, vrid)
+        if instance is None:
+            self.log.debug(
+                f"VRRP group {vrid} on {transmit_intf} isn't registered, "
+                f"reporting it as FAULT"
+            )
+            return None
+        return instance.connection